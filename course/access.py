@@ -0,0 +1,186 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Course, Enroll
+
+
+@dataclass
+class CourseAccess:
+    """
+    What the requesting user is to a course
+    """
+
+    course_id: int
+    exists: bool = False
+    is_owner: bool = False
+    is_instructor: bool = False
+    is_enrolled: bool = False
+    _course: Optional[Course] = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_staff_member(self):
+        return self.is_owner or self.is_instructor
+
+    @property
+    def course(self) -> Optional[Course]:
+        # Cached access maps carry no course row, load it only if a view asks
+        if self._course is None and self.exists:
+            self._course = Course.objects.filter(pk=self.course_id).first()
+        return self._course
+
+
+def resolve_course_access(user, course_id) -> CourseAccess:
+    """
+    Fetch a course together with the user's relation to it in one query
+
+    Args:
+        user (User): Accepts user object, may be anonymous
+        course_id (int): primary key of the course
+
+    Returns:
+        CourseAccess: the course (None if missing) and the user's access flags
+    """
+
+    queryset = Course.objects.filter(pk=course_id)
+    if not user.is_authenticated:
+        course = queryset.first()
+        return CourseAccess(course_id, exists=course is not None, _course=course)
+
+    instructors = Course.instructors.through.objects.filter(
+        course_id=OuterRef("pk"), customuser_id=user.pk
+    )
+    enrollments = Enroll.objects.filter(course_id=OuterRef("pk"), student_id=user.pk)
+    course = queryset.annotate(
+        is_instructor=Exists(instructors), is_enrolled=Exists(enrollments)
+    ).first()
+
+    if course is None:
+        return CourseAccess(course_id)
+
+    return CourseAccess(
+        course_id,
+        exists=True,
+        is_owner=course.owner_id == user.pk,
+        is_instructor=course.is_instructor,
+        is_enrolled=course.is_enrolled,
+        _course=course,
+    )
+
+
+def taught_courses(user):
+    """
+    Ids of the courses a user owns or instructs, as a subquery
+    """
+
+    instructed = Course.instructors.through.objects.filter(
+        customuser_id=user.pk
+    ).values("course_id")
+    return Course.objects.filter(Q(owner_id=user.pk) | Q(pk__in=instructed)).values(
+        "pk"
+    )
+
+
+class AccessCacheStats:
+    """
+    Hit/miss counters of the cross-request access cache, per process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+access_cache_stats = AccessCacheStats()
+
+
+def _version_key(course_id):
+    return f"course-access:{course_id}:version"
+
+
+def _access_key(course_id, user_id, version):
+    return f"course-access:{course_id}:v{version}:user:{user_id}"
+
+
+def _course_version(course_id):
+    # Seeded from the clock so a lost version key never revives stale entries
+    return cache.get_or_set(
+        _version_key(course_id), time.time_ns, timeout=None
+    )
+
+
+def get_cached_course_access(user, course_id) -> CourseAccess:
+    """
+    resolve_course_access backed by Django's cache framework. Entries are
+    dropped by the Enroll, Course and instructor signals in course.signals.
+    """
+
+    if not user.is_authenticated:
+        return resolve_course_access(user, course_id)
+
+    key = _access_key(course_id, user.pk, _course_version(course_id))
+    flags = cache.get(key)
+    access_cache_stats.record(hit=flags is not None)
+    if flags is not None:
+        return CourseAccess(course_id, *flags)
+
+    access = resolve_course_access(user, course_id)
+    cache.set(
+        key,
+        (access.exists, access.is_owner, access.is_instructor, access.is_enrolled),
+        settings.COURSE_ACCESS_CACHE_TIMEOUT,
+    )
+    return access
+
+
+def invalidate_course_access(course_id, user_ids=None):
+    """
+    Drop cached access maps of a course, for the given users or for everyone
+    """
+
+    if user_ids is None:
+        try:
+            cache.incr(_version_key(course_id))
+        except ValueError:
+            # No version stored yet, so nothing has been cached either
+            pass
+        return
+
+    version = _course_version(course_id)
+    cache.delete_many([_access_key(course_id, pk, version) for pk in user_ids])
+
+
+def get_course_access(request, course_id) -> CourseAccess:
+    """
+    Same as get_cached_course_access, memoized for the lifetime of the
+    request so permissions and the view share one lookup.
+    """
+
+    memo = getattr(request, "_course_access", None)
+    if memo is None:
+        memo = request._course_access = {}
+    key = str(course_id)
+    if key not in memo:
+        memo[key] = get_cached_course_access(request.user, course_id)
+    return memo[key]
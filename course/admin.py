@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import Course, Lecture, Enroll, Discussion, Review
+from .models import (
+    Course,
+    Lecture,
+    Enroll,
+    Discussion,
+    Review,
+    RatingHistogram,
+    CourseDailyStats,
+)
 
 
 @admin.register(Course)
@@ -49,3 +57,16 @@ class ReviewAdmin(admin.ModelAdmin):
     list_display = ("pk", "review", "rating", "owner", "course")
     list_display_links = ("pk", "review")
     search_fields = ("onwer__username", "course__pk")
+
+
+@admin.register(RatingHistogram)
+class RatingHistogramAdmin(admin.ModelAdmin):
+    list_display = ("course", "stars_1", "stars_2", "stars_3", "stars_4", "stars_5")
+    search_fields = ("course__title",)
+
+
+@admin.register(CourseDailyStats)
+class CourseDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("course", "day", "enrollments", "payments", "revenue", "reviews")
+    list_filter = ("day",)
+    search_fields = ("course__title",)
@@ -0,0 +1,310 @@
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from payments.models import Payment
+
+from .models import CourseDailyStats, Discussion, Enroll, Review, RollupWatermark
+
+logger = logging.getLogger(__name__)
+
+# Source rows counted per transaction
+ROLLUP_BATCH_SIZE = 10000
+
+STAT_FIELDS = ("enrollments", "payments", "revenue", "reviews", "rating_total", "discussions")
+
+
+@dataclass
+class RollupSource:
+    """
+    A table rolled up into CourseDailyStats, ``aggregates`` maps stat fields
+    to the aggregate adding to them
+    """
+
+    name: str
+    queryset: QuerySet
+    date_field: str
+    course_field: str
+    aggregates: dict
+
+
+ROLLUP_SOURCES = (
+    RollupSource(
+        "enrollments",
+        Enroll.objects.all(),
+        "enrolled_at",
+        "course_id",
+        {"enrollments": Count("pk")},
+    ),
+    RollupSource(
+        "payments",
+        Payment.objects.filter(payment_status="paid"),
+        "created_at",
+        "course_id",
+        {"payments": Count("pk"), "revenue": Sum("amount")},
+    ),
+    RollupSource(
+        "reviews",
+        Review.objects.all(),
+        "created_at",
+        "course_id",
+        {"reviews": Count("pk"), "rating_total": Sum("rating")},
+    ),
+    RollupSource(
+        "discussions",
+        Discussion.objects.all(),
+        "created_at",
+        "lecture__course_id",
+        {"discussions": Count("pk")},
+    ),
+)
+
+
+def _add_to_stats(rows, fields):
+    CourseDailyStats.objects.bulk_create(
+        (
+            CourseDailyStats(course_id=row["rollup_course"], day=row["rollup_day"])
+            for row in rows
+        ),
+        ignore_conflicts=True,
+    )
+    for row in rows:
+        CourseDailyStats.objects.filter(
+            course_id=row["rollup_course"], day=row["rollup_day"]
+        ).update(**{name: F(name) + (row[name] or 0) for name in fields})
+
+
+def roll_up(source, batch_size=ROLLUP_BATCH_SIZE) -> int:
+    """
+    Add the rows of ``source`` created since its watermark to the daily
+    stats. Each batch and the watermark move commit together, so a row is
+    counted exactly once even if the run is interrupted.
+
+    Returns:
+        int: number of source rows counted
+    """
+
+    settled = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG)
+    RollupWatermark.objects.get_or_create(source=source.name)
+
+    counted = 0
+    while True:
+        with transaction.atomic():
+            # Concurrent runs wait here instead of counting the same rows
+            watermark = RollupWatermark.objects.select_for_update().get(
+                source=source.name
+            )
+            pending = source.queryset.filter(pk__gt=watermark.last_id)
+            # Primary keys and timestamps don't come in the same order, the
+            # watermark must stop below the first row still within the lag
+            unsettled = (
+                pending.filter(**{f"{source.date_field}__gte": settled})
+                .order_by("pk")
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if unsettled is not None:
+                pending = pending.filter(pk__lt=unsettled)
+            ids = list(pending.order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return counted
+
+            rows = list(
+                pending.filter(pk__lte=ids[-1])
+                .order_by()
+                .values(
+                    rollup_course=F(source.course_field),
+                    rollup_day=TruncDate(source.date_field),
+                )
+                .annotate(**source.aggregates)
+            )
+            _add_to_stats(rows, source.aggregates)
+
+            watermark.last_id = ids[-1]
+            watermark.save(update_fields=["last_id", "updated_at"])
+        counted += len(ids)
+
+
+def _source_stats(source, queryset):
+    rows = (
+        queryset.order_by()
+        .values(
+            rollup_course=F(source.course_field),
+            rollup_day=TruncDate(source.date_field),
+        )
+        .annotate(**source.aggregates)
+    )
+    return {
+        (row["rollup_course"], row["rollup_day"]): {
+            name: row[name] or 0 for name in source.aggregates
+        }
+        for row in rows
+    }
+
+
+def reconcile(source, days=None) -> int:
+    """
+    Count the rows of ``source`` from the last ``days`` days again and
+    correct the daily stats that differ. Catches rows committed after the
+    watermark passed them, which roll_up never sees.
+
+    Only rows below the watermark are counted, the others are left to
+    roll_up, so the two never count a row twice.
+
+    Returns:
+        int: number of daily stats corrected
+    """
+
+    if days is None:
+        days = settings.ANALYTICS_RECONCILE_DAYS
+    since = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    since -= timedelta(days=days)
+    RollupWatermark.objects.get_or_create(source=source.name)
+
+    with transaction.atomic():
+        watermark = RollupWatermark.objects.select_for_update().get(source=source.name)
+        counted = _source_stats(
+            source,
+            source.queryset.filter(
+                pk__lte=watermark.last_id, **{f"{source.date_field}__gte": since}
+            ),
+        )
+        zero = dict.fromkeys(source.aggregates, 0)
+
+        corrected = []
+        # Days with counted rows but no stats yet are left in missing
+        missing = set(counted)
+        stored = CourseDailyStats.objects.filter(day__gte=since.date()).values(
+            "course_id", "day", *source.aggregates
+        )
+        for row in stored:
+            key = (row.pop("course_id"), row.pop("day"))
+            missing.discard(key)
+            if counted.get(key, zero) != row:
+                corrected.append(key)
+        corrected.extend(missing)
+
+        CourseDailyStats.objects.bulk_create(
+            (
+                CourseDailyStats(course_id=course_id, day=day)
+                for course_id, day in corrected
+            ),
+            ignore_conflicts=True,
+        )
+        for course_id, day in corrected:
+            CourseDailyStats.objects.filter(course_id=course_id, day=day).update(
+                **counted.get((course_id, day), zero)
+            )
+
+    if corrected:
+        logger.warning(
+            f"Corrected {len(corrected)} daily {source.name} stats counted "
+            "before all their rows were committed"
+        )
+    return len(corrected)
+
+
+def roll_up_all(batch_size=ROLLUP_BATCH_SIZE) -> dict:
+    """
+    Roll up every source, then reconcile its recent days
+
+    Returns:
+        dict: rows counted per source
+    """
+
+    counted = {}
+    for source in ROLLUP_SOURCES:
+        counted[source.name] = roll_up(source, batch_size)
+        reconcile(source)
+    return counted
+
+
+def rebuild_rollups(batch_size=ROLLUP_BATCH_SIZE) -> dict:
+    """
+    Drop the daily stats and count every source row again
+    """
+
+    with transaction.atomic():
+        CourseDailyStats.objects.all().delete()
+        RollupWatermark.objects.all().delete()
+    return roll_up_all(batch_size)
+
+
+def _average_rating(stats):
+    if not stats["reviews"]:
+        return None
+    return round(stats["rating_total"] / stats["reviews"], 2)
+
+
+def instructor_analytics(owner, since, until, course_id=None):
+    """
+    Activity of the courses of ``owner`` read from the daily rollups
+
+    Args:
+        owner (User): course owner
+        since (date): first day, inclusive
+        until (date): last day, inclusive
+        course_id (int): only this course
+
+    Returns:
+        dict: totals over all courses and per course totals and daily series.
+            Revenue is in the course's currency, totals group it by currency.
+    """
+
+    rows = CourseDailyStats.objects.filter(
+        course__owner=owner, day__gte=since, day__lte=until
+    )
+    if course_id:
+        rows = rows.filter(course_id=course_id)
+    rows = rows.order_by("course_id", "day").values(
+        "course_id", "course__title", "course__currency", "day", *STAT_FIELDS
+    )
+
+    totals = {name: 0 for name in STAT_FIELDS if name != "revenue"}
+    revenue = {}
+    courses = {}
+    for row in rows:
+        course = courses.get(row["course_id"])
+        if course is None:
+            course = courses[row["course_id"]] = {
+                "id": row["course_id"],
+                "title": row["course__title"],
+                "currency": row["course__currency"],
+                "totals": {name: 0 for name in STAT_FIELDS},
+                "days": [],
+            }
+
+        for name in STAT_FIELDS:
+            course["totals"][name] += row[name]
+            if name != "revenue":
+                totals[name] += row[name]
+        currency = row["course__currency"]
+        revenue[currency] = revenue.get(currency, 0) + row["revenue"]
+
+        day = {name: row[name] for name in STAT_FIELDS if name != "rating_total"}
+        day["day"] = row["day"]
+        day["revenue"] = str(row["revenue"])
+        day["average_rating"] = _average_rating(row)
+        course["days"].append(day)
+
+    for course in courses.values():
+        course["totals"]["average_rating"] = _average_rating(course["totals"])
+        course["totals"]["revenue"] = str(course["totals"]["revenue"])
+        del course["totals"]["rating_total"]
+    totals["average_rating"] = _average_rating(totals)
+    del totals["rating_total"]
+    # Money is rendered as strings like serializer DecimalFields do
+    totals["revenue"] = {currency: str(amount) for currency, amount in revenue.items()}
+
+    return {
+        "since": since,
+        "until": until,
+        "totals": totals,
+        "courses": list(courses.values()),
+    }
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+# Numbers handed out per reservation. The Postgres sequence created in
+# migration 0022 increments by this amount, keep them equal.
+BLOCK_SIZE = 100
+SEQUENCE_NAME = "course_enroll_number_seq"
+
+# New numbers are 12 digits long. Numbers issued before this allocator
+# were 10 or 6 random digits, so the two ranges can never collide.
+DIGITS = 12
+HALF = 10 ** (DIGITS // 2)
+ROUNDS = 4
+
+
+def _round_value(round_no, value):
+    digest = hashlib.blake2b(
+        f"{round_no}:{value}".encode(),
+        key=settings.ENROLLMENT_NUMBER_KEY.encode()[:64],
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "big") % HALF
+
+
+def obfuscate(value: int) -> str:
+    """
+    Map a sequence value to an enrollment number with a keyed Feistel
+    network over 10**12, a bijection, so distinct values give distinct
+    numbers while consecutive enrollments don't get consecutive numbers.
+
+    Args:
+        value (int): sequence value, 0 <= value < 10**12
+
+    Returns:
+        str: zero padded 12 digit enrollment number
+    """
+
+    left, right = divmod(value, HALF)
+    for round_no in range(ROUNDS):
+        left, right = right, (left + _round_value(round_no, right)) % HALF
+    return str(left * HALF + right).zfill(DIGITS)
+
+
+def deobfuscate(enrollment_no: str) -> int:
+    """
+    Inverse of obfuscate
+    """
+
+    left, right = divmod(int(enrollment_no), HALF)
+    for round_no in reversed(range(ROUNDS)):
+        left, right = (right - _round_value(round_no, left)) % HALF, left
+    return left * HALF + right
+
+
+def _reserve_block(size=BLOCK_SIZE) -> int:
+    """
+    Returns the first value of a fresh block of ``size`` sequence values,
+    always BLOCK_SIZE on Postgres
+    """
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [SEQUENCE_NAME])
+            return cursor.fetchone()[0]
+
+    EnrollmentSequence = apps.get_model("course", "EnrollmentSequence")
+    with transaction.atomic():
+        sequence, _ = EnrollmentSequence.objects.select_for_update().get_or_create(
+            pk=1
+        )
+        start = sequence.next_value
+        sequence.next_value = start + size
+        sequence.save(update_fields=["next_value"])
+    return start
+
+
+def _reservation_is_durable() -> bool:
+    """
+    Whether a block reserved now stays reserved whatever the caller's
+    transaction does. nextval is never rolled back, the counter row of other
+    backends is when the reservation ran inside that transaction.
+    """
+
+    return connection.vendor == "postgresql" or not connection.in_atomic_block
+
+
+class BlockAllocator:
+    """
+    Hands out sequence values from an in-process block, going back to the
+    database once every BLOCK_SIZE allocations.
+
+    A block is only kept for later calls if its reservation is durable.
+    Otherwise a rollback would give the counter back while the block is
+    still handed out, and the same values would be reserved again.
+    """
+
+    def __init__(
+        self,
+        reserve=_reserve_block,
+        block_size=BLOCK_SIZE,
+        is_durable=_reservation_is_durable,
+    ):
+        self._reserve = reserve
+        self._block_size = block_size
+        self._is_durable = is_durable
+        self._lock = threading.Lock()
+        self._next = self._limit = 0
+
+    def __call__(self) -> int:
+        with self._lock:
+            if self._next >= self._limit:
+                if not self._is_durable():
+                    # Rolled back along with the caller's writes, if at all
+                    return self._reserve(1)
+                self._next = self._reserve(self._block_size)
+                self._limit = self._next + self._block_size
+            value = self._next
+            self._next += 1
+            return value
+
+
+allocate_sequence_value = BlockAllocator()
+
+
+def next_enrollment_no() -> str:
+    return obfuscate(allocate_sequence_value())
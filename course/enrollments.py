@@ -0,0 +1,145 @@
+import csv
+import io
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from .access import invalidate_course_access
+from .enrollment_numbers import next_enrollment_no
+from .models import Course, Enroll, User
+
+
+def bulk_enroll(pairs):
+    """
+    Enroll many students at once with set-based inserts.
+
+    bulk_create skips the Enroll signals, so this also updates the stored
+    counters and the access cache the signals would have kept in sync.
+
+    Args:
+        pairs (iterable): (student_id, course_id) tuples
+
+    Returns:
+        tuple: ({(student_id, course_id): Enroll} for every pair,
+            list of the Enroll rows created, not those enrolled concurrently)
+    """
+
+    pairs = set(pairs)
+    if not pairs:
+        return {}, []
+
+    student_ids = {student_id for student_id, _ in pairs}
+    course_ids = {course_id for _, course_id in pairs}
+
+    with transaction.atomic():
+        enrollments = {
+            (enroll.student_id, enroll.course_id): enroll
+            for enroll in Enroll.objects.filter(
+                student_id__in=student_ids, course_id__in=course_ids
+            )
+            if (enroll.student_id, enroll.course_id) in pairs
+        }
+
+        missing = sorted(pairs - enrollments.keys())
+        if not missing:
+            return enrollments, []
+
+        # Pairs enrolled concurrently since the read above are skipped by
+        # the database instead of failing the whole batch, the rows are read
+        # back to tell ours from theirs
+        numbers = [next_enrollment_no() for _ in missing]
+        Enroll.objects.bulk_create(
+            (
+                Enroll(student_id=student_id, course_id=course_id, enrollment_no=number)
+                for (student_id, course_id), number in zip(missing, numbers)
+            ),
+            ignore_conflicts=True,
+        )
+        numbers = set(numbers)
+        created = []
+        for enroll in Enroll.objects.filter(
+            student_id__in={student_id for student_id, _ in missing},
+            course_id__in={course_id for _, course_id in missing},
+        ):
+            pair = (enroll.student_id, enroll.course_id)
+            if pair in pairs and pair not in enrollments:
+                enrollments[pair] = enroll
+                if enroll.enrollment_no in numbers:
+                    created.append(enroll)
+        if not created:
+            return enrollments, created
+
+        per_course = Counter(enroll.course_id for enroll in created)
+        owners = dict(
+            Course.objects.filter(pk__in=per_course).values_list("pk", "owner_id")
+        )
+        per_owner = Counter()
+        for course_id, count in per_course.items():
+            Course.objects.filter(pk=course_id).update(
+                enrollments_count=F("enrollments_count") + count
+            )
+            per_owner[owners[course_id]] += count
+        for owner_id, count in per_owner.items():
+            User.objects.filter(pk=owner_id).update(
+                total_enrollments=F("total_enrollments") + count
+            )
+
+        students = {}
+        for enroll in created:
+            students.setdefault(enroll.course_id, []).append(enroll.student_id)
+
+        def invalidate():
+            for course_id, student_ids in students.items():
+                invalidate_course_access(course_id, student_ids)
+
+        transaction.on_commit(invalidate)
+
+    return enrollments, created
+
+
+def read_student_csv(file):
+    """
+    Returns the student emails of an uploaded CSV, one per row. The first
+    column is used unless a header row names an "email" column.
+    """
+
+    rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig"))
+    header = next(rows, None)
+    if header is None:
+        return []
+
+    names = [name.strip().lower() for name in header]
+    if "email" in names:
+        column = names.index("email")
+    else:
+        column = 0
+        rows = [header, *rows]
+
+    return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+
+def enroll_students(course, emails):
+    """
+    Enroll the users with the given emails into a course
+
+    Args:
+        course (Course): Accepts course object
+        emails (list): student emails, unknown ones are reported back
+
+    Returns:
+        dict: created and skipped counts and the unknown emails
+    """
+
+    emails = {email.lower() for email in emails}
+    students = dict(
+        User.objects.filter(email__in=emails).values_list("email", "pk")
+    )
+    unknown = sorted(emails - {email.lower() for email in students})
+
+    _, created = bulk_enroll((pk, course.pk) for pk in students.values())
+    return {
+        "created": len(created),
+        "skipped": len(students) - len(created),
+        "unknown": unknown,
+    }
@@ -0,0 +1,35 @@
+from .models import Enroll
+
+ENROLLMENT_COLUMNS = (
+    ("enrollment_no", "enrollment_no"),
+    ("enrolled_at", "enrolled_at"),
+    ("course_id", "course_id"),
+    ("course_title", "course__title"),
+    ("student_id", "student_id"),
+    ("student_email", "student__email"),
+    ("first_name", "student__first_name"),
+    ("last_name", "student__last_name"),
+)
+
+
+def export_enrollments(course=None, since=None, until=None):
+    """
+    Enrollments to export, oldest first
+
+    Args:
+        course (int): only enrollments in this course
+        since (datetime): only enrollments made at or after this moment
+        until (datetime): only enrollments made before this moment
+
+    Returns:
+        QuerySet: enrollments to be read with ENROLLMENT_COLUMNS
+    """
+
+    queryset = Enroll.objects.all()
+    if course:
+        queryset = queryset.filter(course_id=int(course))
+    if since:
+        queryset = queryset.filter(enrolled_at__gte=since)
+    if until:
+        queryset = queryset.filter(enrolled_at__lt=until)
+    return queryset.order_by("pk")
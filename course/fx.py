@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from moneyed import Money, get_currency
+
+from .models import AvailableCurrency
+
+logger = logging.getLogger(__name__)
+
+
+def _minor_unit(currency) -> Decimal:
+    # sub_unit is 100 for cents, 1 for currencies like JPY
+    return Decimal(1) / get_currency(currency).sub_unit
+
+
+@dataclass(frozen=True)
+class RateTable:
+    """
+    Exchange rates against ``base``, one unit of base buys ``rates[code]``
+    """
+
+    base: str
+    rates: dict
+    as_of: str = ""
+
+    @cached_property
+    def version(self) -> str:
+        """
+        Digest of the rates, it changes when they are corrected without a
+        new ``as_of``
+        """
+
+        rates = ",".join(f"{code}={rate}" for code, rate in sorted(self.rates.items()))
+        raw = f"{self.base}:{self.as_of}:{rates}"
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def rate(self, source, target) -> Decimal:
+        return self.rates[target] / self.rates[source]
+
+    def convert(self, money, currency) -> Money:
+        """
+        Convert ``money`` to ``currency``, rounded to its minor unit
+
+        Raises:
+            KeyError: if either currency has no rate
+        """
+
+        if money.currency.code == currency:
+            return money
+        amount = money.amount * self.rate(money.currency.code, currency)
+        return Money(amount.quantize(_minor_unit(currency), ROUND_HALF_UP), currency)
+
+
+def load_rate_table(path) -> RateTable:
+    """
+    Read a rate table from a JSON file like
+    ``{"base": "USD", "as_of": "2026-10-01", "rates": {"EUR": "0.85", ...}}``
+
+    Raises:
+        ImproperlyConfigured: if the file is unreadable, or misses a rate of
+            an available currency
+    """
+
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        rates = {code: Decimal(str(rate)) for code, rate in data["rates"].items()}
+        rates[data["base"]] = Decimal(1)
+    except (OSError, ValueError, KeyError, InvalidOperation) as e:
+        raise ImproperlyConfigured(f"Invalid exchange rates file {path}: {e}")
+
+    missing = [code for code in AvailableCurrency.values if rates.get(code, 0) <= 0]
+    if missing:
+        raise ImproperlyConfigured(
+            f"Exchange rates file {path} has no rate for {', '.join(missing)}"
+        )
+    return RateTable(data["base"], rates, data.get("as_of", ""))
+
+
+class RateTableCache:
+    """
+    The rate table of FX_RATES_FILE, read again once FX_RATES_TTL passed.
+    A file that became unreadable is logged and the last table kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+        self._loaded_at = 0.0
+
+    def get(self) -> RateTable:
+        with self._lock:
+            now = time.monotonic()
+            if self._table is None or now - self._loaded_at >= settings.FX_RATES_TTL:
+                try:
+                    self._table = load_rate_table(settings.FX_RATES_FILE)
+                except ImproperlyConfigured:
+                    if self._table is None:
+                        raise
+                    logger.exception("Keeping the previous exchange rates")
+                self._loaded_at = now
+            return self._table
+
+    def clear(self):
+        with self._lock:
+            self._table = None
+
+
+rate_tables = RateTableCache()
+
+
+def convert_prices(courses, currency=None) -> dict:
+    """
+    Prices of ``courses`` in ``currency``, all converted with one rate table
+
+    Args:
+        courses (iterable): Course instances with price and currency loaded
+        currency (str): target currency, None keeps each course's own
+
+    Returns:
+        dict: Money per course primary key
+    """
+
+    table = rate_tables.get() if currency else None
+    prices = {}
+    for course in courses:
+        price = Money(course.price, course.currency)
+        prices[course.pk] = table.convert(price, currency) if table else price
+    return prices
@@ -0,0 +1,200 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from course.enrollment_numbers import (
+    BLOCK_SIZE,
+    SEQUENCE_NAME,
+    BlockAllocator,
+    deobfuscate,
+    next_enrollment_no,
+    obfuscate,
+)
+from course.models import Course, Enroll, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with enrollments and measure how "
+        "enrollment numbers are allocated at that size: throughput, "
+        "uniqueness, concurrent block reservations and the queries of a "
+        "single enrollment"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enrollments", type=int, default=1_000_000)
+        parser.add_argument("--courses", type=int, default=100)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--saves", type=int, default=1000, help="Single enrollments timed"
+        )
+
+    def handle(self, *args, **options):
+        self.check_permutation(options["enrollments"])
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            students = self.seed(options["enrollments"], options["courses"])
+            self.insert(students, options["enrollments"], options["batch_size"])
+            self.reserve_concurrently(options["threads"])
+            self.save_single(options["saves"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def report(self, label, text):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f"  {text}")
+
+    def check_permutation(self, count):
+        start = time.perf_counter()
+        numbers = {obfuscate(value) for value in range(count)}
+        elapsed = time.perf_counter() - start
+        if len(numbers) != count:
+            raise AssertionError(f"{count - len(numbers)} duplicate numbers")
+        sample = range(0, count, max(1, count // 1000))
+        if any(deobfuscate(obfuscate(value)) != value for value in sample):
+            raise AssertionError("deobfuscate doesn't invert obfuscate")
+        self.report(
+            "Permutation",
+            f"{count} values to unique numbers in {elapsed:.2f} s, "
+            f"{elapsed / count * 10**6:.2f} us each",
+        )
+
+    def seed(self, enrollments, courses):
+        students = -(-enrollments // courses)
+        self.stdout.write(f"Seeding {students} students and {courses} courses...")
+        owner = User.objects.create(
+            email="owner@benchmark.local", username="benchmark-owner", role="TR"
+        )
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f"s{i}@benchmark.local", username=f"benchmark-{i}", password="!"
+                )
+                for i in range(students)
+            ),
+            batch_size=5000,
+        )
+        Course.objects.bulk_create(
+            Course(
+                title=f"Course {i}",
+                description="benchmark",
+                outcomes="benchmark",
+                price=10,
+                cover_img="https://benchmark.local/cover.png",
+                owner=owner,
+                languages="English",
+            )
+            for i in range(courses)
+        )
+        return list(User.objects.exclude(pk=owner.pk).values_list("pk", flat=True))
+
+    def insert(self, students, total, batch_size):
+        course_ids = list(Course.objects.values_list("pk", flat=True))
+        pairs = [
+            (student_id, course_id)
+            for course_id in course_ids
+            for student_id in students
+        ][:total]
+
+        # The numbers of each batch are allocated without a query, timings
+        # of the first and last tenth show whether the cost grows with size
+        allocation = insertion = 0.0
+        tenths = []
+        for offset in range(0, total, batch_size):
+            batch = pairs[offset : offset + batch_size]
+            start = time.perf_counter()
+            numbers = [next_enrollment_no() for _ in batch]
+            allocated = time.perf_counter()
+            Enroll.objects.bulk_create(
+                Enroll(student_id=student_id, course_id=course_id, enrollment_no=number)
+                for (student_id, course_id), number in zip(batch, numbers)
+            )
+            done = time.perf_counter()
+            allocation += allocated - start
+            insertion += done - allocated
+            tenths.append((offset * 10 // total, (allocated - start) / len(batch)))
+
+        first = [cost for tenth, cost in tenths if tenth == 0]
+        last = [cost for tenth, cost in tenths if tenth == 9] or first
+        self.report(
+            f"{total} enrollments",
+            f"allocation {allocation:.2f} s, insertion {insertion:.2f} s; "
+            f"allocation per number {sum(first) / len(first) * 10**6:.2f} us in "
+            f"the first tenth, {sum(last) / len(last) * 10**6:.2f} us in the last",
+        )
+
+    def reserve_concurrently(self, threads):
+        if connection.vendor != "postgresql":
+            # The in-memory SQLite test database fails concurrent writers
+            # instead of making them wait
+            self.report(f"{threads} concurrent allocators", "skipped, needs Postgres")
+            return
+
+        # One allocator per thread stands in for one per worker process,
+        # each reserving its own blocks from the database
+        per_thread = BLOCK_SIZE * 20
+        results = [None] * threads
+        errors = []
+
+        def allocate(index):
+            allocator = BlockAllocator()
+            try:
+                results[index] = [obfuscate(allocator()) for _ in range(per_thread)]
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=allocate, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+
+        numbers = [number for result in results for number in result]
+        existing = Enroll.objects.filter(enrollment_no__in=numbers[:10000]).count()
+        self.report(
+            f"{threads} concurrent allocators",
+            f"{len(numbers)} numbers in {elapsed:.2f} s, "
+            f"{len(numbers) - len(set(numbers))} duplicates, "
+            f"{existing} already taken by the enrollments above",
+        )
+
+    def save_single(self, saves):
+        # Enroll.save used to probe random numbers with EXISTS until a free
+        # one was found, its cost grew with the table
+        User.objects.bulk_create(
+            User(email=f"x{i}@benchmark.local", username=f"extra-{i}", password="!")
+            for i in range(saves)
+        )
+        student_ids = User.objects.filter(username__startswith="extra-").values_list(
+            "pk", flat=True
+        )
+        course_id = Course.objects.values_list("pk", flat=True).first()
+
+        # The log keeps the last 9000 queries, the seeding filled it up
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for student_id in student_ids:
+                Enroll.objects.create(student_id=student_id, course_id=course_id)
+            elapsed = time.perf_counter() - start
+        numbering = [
+            query
+            for query in queries
+            if SEQUENCE_NAME in query["sql"] or "enrollmentsequence" in query["sql"]
+        ]
+        self.report(
+            f"{saves} single enrollments",
+            f"{elapsed / saves * 1000:.3f} ms and {len(queries) / saves:.2f} "
+            f"queries each, {len(numbering) / saves:.3f} of them for numbers",
+        )
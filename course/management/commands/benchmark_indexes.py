@@ -0,0 +1,193 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from course.models import Course, Enroll, Lecture, Review, User
+from payments.models import Payment
+
+# Schema before the composite indexes and constraints were added
+BEFORE = [("course", "0023_merge_enrollments"), ("payments", "0007_webhookevent")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare query plans and latency of "
+        "the hot lookups before and after the composite indexes migrations"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=20000)
+        parser.add_argument("--courses", type=int, default=500)
+        parser.add_argument("--lectures", type=int, default=20, help="Per course")
+        parser.add_argument("--enrollments", type=int, default=5, help="Per student")
+        parser.add_argument("--repeat", type=int, default=50, help="Probes per query")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for app, migration in BEFORE:
+                call_command("migrate", app, migration, verbosity=0)
+            self.seed(**options)
+            self.analyze()
+            before = self.measure(options["repeat"])
+
+            call_command("migrate", verbosity=0)
+            self.analyze()
+            after = self.measure(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for label, (before_ms, before_plan) in before.items():
+            after_ms, after_plan = after[label]
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(f"  before: {before_ms:.3f} ms  after: {after_ms:.3f} ms")
+            self.stdout.write(f"  plan before:\n{self.indent(before_plan)}")
+            self.stdout.write(f"  plan after:\n{self.indent(after_plan)}")
+
+    def indent(self, plan):
+        return "\n".join(f"    {line}" for line in plan.splitlines())
+
+    def seed(self, students, courses, lectures, enrollments, **options):
+        self.stdout.write(f"Seeding {students} students and {courses} courses...")
+        now = timezone.now()
+
+        owner = User.objects.create(
+            email="owner@benchmark.local", username="benchmark-owner", role="TR"
+        )
+        User.objects.bulk_create(
+            User(email=f"s{i}@benchmark.local", username=f"benchmark-{i}", password="!")
+            for i in range(students)
+        )
+        student_ids = list(
+            User.objects.exclude(pk=owner.pk).values_list("pk", flat=True)
+        )
+
+        Course.objects.bulk_create(
+            Course(
+                title=f"Course {i}",
+                description="benchmark",
+                outcomes="benchmark",
+                price=10,
+                cover_img="https://benchmark.local/cover.png",
+                owner=owner,
+                languages="English",
+            )
+            for i in range(courses)
+        )
+        course_ids = list(Course.objects.values_list("pk", flat=True))
+
+        Lecture.objects.bulk_create(
+            (
+                Lecture(
+                    title=f"Lecture {chapter}",
+                    lecture_url="https://benchmark.local/lecture",
+                    chapter=chapter,
+                    course_id=course_id,
+                )
+                for course_id in course_ids
+                for chapter in range(lectures)
+            ),
+            batch_size=5000,
+        )
+
+        pairs = [
+            (student_id, course_id)
+            for student_id in student_ids
+            for course_id in self.random.sample(course_ids, min(enrollments, len(course_ids)))
+        ]
+        Enroll.objects.bulk_create(
+            (
+                Enroll(student_id=student_id, course_id=course_id, enrollment_no=f"B{i:011d}")
+                for i, (student_id, course_id) in enumerate(pairs)
+            ),
+            batch_size=5000,
+        )
+        Review.objects.bulk_create(
+            (
+                Review(review="benchmark", rating=5, owner_id=student_id, course_id=course_id)
+                for student_id, course_id in pairs[::2]
+            ),
+            batch_size=5000,
+        )
+        Payment.objects.bulk_create(
+            (
+                Payment(
+                    transaction_id=f"pi_benchmark_{i}",
+                    session_id=f"cs_benchmark_{i}",
+                    payment_status="paid",
+                    amount=10,
+                    user_id=student_id,
+                    course_id=course_id,
+                )
+                for i, (student_id, course_id) in enumerate(pairs)
+            ),
+            batch_size=5000,
+        )
+        # auto_now_add stamps every row alike, spread them so ordering matters
+        for model in (Review, Payment):
+            for pk in model.objects.values_list("pk", flat=True)[::100]:
+                model.objects.filter(pk__gte=pk, pk__lt=pk + 100).update(
+                    created_at=now - timedelta(minutes=self.random.randrange(10**6))
+                )
+
+        self.pairs = pairs
+        self.lectures = lectures
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def cases(self):
+        """
+        The lookups the API issues, each returning a queryset for a random
+        existing key
+        """
+
+        def lecture():
+            _, course_id = self.random.choice(self.pairs)
+            chapter = self.random.randrange(self.lectures)
+            return Lecture.objects.filter(course_id=course_id, chapter=chapter)
+
+        def enrollment():
+            student_id, course_id = self.random.choice(self.pairs)
+            return Enroll.objects.filter(student_id=student_id, course_id=course_id)
+
+        def reviews():
+            _, course_id = self.random.choice(self.pairs)
+            return Review.objects.filter(course_id=course_id).order_by("-created_at")[:20]
+
+        def payments():
+            student_id, _ = self.random.choice(self.pairs)
+            return Payment.objects.filter(user_id=student_id).order_by("-created_at")[:20]
+
+        def payment():
+            i = self.random.randrange(len(self.pairs))
+            return Payment.objects.filter(transaction_id=f"pi_benchmark_{i}")
+
+        return {
+            "Lecture by course and chapter": lecture,
+            "Enroll by student and course": enrollment,
+            "Latest reviews of a course": reviews,
+            "Latest payments of a user": payments,
+            "Payment by transaction id": payment,
+        }
+
+    def measure(self, repeat):
+        results = {}
+        for label, make_queryset in self.cases().items():
+            plan = make_queryset().explain()
+            elapsed = 0.0
+            for _ in range(repeat):
+                queryset = make_queryset()
+                start = time.perf_counter()
+                list(queryset)
+                elapsed += time.perf_counter() - start
+            results[label] = (elapsed / repeat * 1000, plan)
+        return results
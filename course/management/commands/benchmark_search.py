@@ -0,0 +1,130 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from course.models import Course, User
+from course.search import course_index, search_courses
+
+SUBJECTS = [
+    "python", "django", "algebra", "calculus", "statistics", "physics",
+    "mechanics", "economics", "finance", "marketing", "accounting", "design",
+    "javascript", "react", "databases", "postgres", "machine", "learning",
+    "networks", "security", "geometry", "probability", "chemistry", "writing",
+]
+WORDS = [
+    "introduction", "advanced", "practical", "complete", "guide", "bootcamp",
+    "fundamentals", "projects", "beginners", "masterclass", "theory", "applied",
+    "modern", "essentials", "workshop", "analysis", "hands", "build", "real",
+    "world", "exercises", "interview", "preparation", "certification",
+]
+LANGUAGES = ["English", "Hindi", "Spanish", "French", "German", "Japanese"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with courses and measure course search "
+        "latency and query counts on the current database, through the "
+        "Postgres indexes or the in-process fallback index elsewhere"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options["courses"])
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+            else:
+                self.build_index()
+            self.measure(options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            course_index.invalidate()
+
+    def report(self, label, text):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f"  {text}")
+
+    def sentence(self, subjects, words):
+        return " ".join(
+            self.random.sample(SUBJECTS, subjects) + self.random.sample(WORDS, words)
+        )
+
+    def seed(self, courses):
+        self.stdout.write(f"Seeding {courses} courses...")
+        owner = User.objects.create(
+            email="owner@benchmark.local", username="benchmark-owner", role="TR"
+        )
+        Course.objects.bulk_create(
+            (
+                Course(
+                    # A unique code per title keeps the vocabulary as large
+                    # as a real catalogue's
+                    title=f"{self.sentence(1, 2)} c{i}".title(),
+                    description=self.sentence(2, 12),
+                    outcomes=self.sentence(1, 6),
+                    price=10,
+                    cover_img="https://benchmark.local/cover.png",
+                    owner=owner,
+                    languages=self.random.choice(LANGUAGES),
+                )
+                for i in range(courses)
+            ),
+            batch_size=5000,
+        )
+        self.courses = courses
+
+    def build_index(self):
+        course_index.invalidate()
+        start = time.perf_counter()
+        course_index.search("python")
+        elapsed = time.perf_counter() - start
+        self.report(
+            "Fallback index",
+            f"built over {self.courses} courses in {elapsed:.2f} s, "
+            "after every course write",
+        )
+
+    def cases(self):
+        rare = f"c{self.courses // 2}"
+        return {
+            "Common term": "python",
+            "Two terms": "python projects",
+            "Rare term": rare,
+            "Misspelt term": "pyhton",
+            "Misspelt rare term": f"{rare}x",
+            "No match": "zzzzqqq",
+        }
+
+    def measure(self, repeat):
+        for label, q in self.cases().items():
+            # The first page, as CourseSearchView serves it
+            queryset = search_courses(Course.objects.all(), q)
+            count = queryset.count()
+
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                list(search_courses(Course.objects.all(), q)[:12])
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(search_courses(Course.objects.all(), q)[:12])
+            elapsed = (time.perf_counter() - start) / repeat
+
+            self.report(
+                f"{label} {q!r}",
+                f"{count} matches, first page in {elapsed * 1000:.2f} ms "
+                f"and {len(queries)} queries",
+            )
+            if connection.vendor == "postgresql":
+                plan = queryset[:12].explain()
+                self.stdout.write("\n".join(f"    {line}" for line in plan.splitlines()))
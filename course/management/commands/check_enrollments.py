@@ -0,0 +1,60 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from course.models import Course, Enroll, User
+
+
+class Command(BaseCommand):
+    help = "Report enrollment counters that drifted from the Enroll rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the counters when drift is found",
+        )
+
+    def handle(self, *args, **options):
+        course_counts = (
+            Enroll.objects.filter(course=OuterRef("pk"))
+            .order_by()
+            .values("course")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        courses = (
+            Course.objects.annotate(actual=Coalesce(Subquery(course_counts), 0))
+            .exclude(enrollments_count=F("actual"))
+            .values_list("pk", "enrollments_count", "actual")
+        )
+
+        owner_counts = (
+            Enroll.objects.filter(course__owner=OuterRef("pk"))
+            .order_by()
+            .values("course__owner")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        users = (
+            User.objects.annotate(actual=Coalesce(Subquery(owner_counts), 0))
+            .exclude(total_enrollments=F("actual"))
+            .values_list("pk", "total_enrollments", "actual")
+        )
+
+        drift = 0
+        for pk, stored, actual in courses:
+            drift += 1
+            self.stdout.write(f"Course {pk}: enrollments_count={stored}, enrolled={actual}")
+        for pk, stored, actual in users:
+            drift += 1
+            self.stdout.write(f"User {pk}: total_enrollments={stored}, enrolled={actual}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Enrollment counters are consistent."))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{drift} counters drifted."))
+        if options["fix"]:
+            call_command("rebuild_enrollment_counts", stdout=self.stdout)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from course.exports import ENROLLMENT_COLUMNS, export_enrollments
+from gen.exports import CONTENT_TYPES, CSV, export_lines, parse_moment
+
+
+class Command(BaseCommand):
+    help = "Stream enrollments to a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="File to write, - for stdout")
+        parser.add_argument("--format", choices=list(CONTENT_TYPES), default=CSV)
+        parser.add_argument("--course", type=int, help="Only enrollments in this course")
+        parser.add_argument("--since", help="ISO date or datetime, inclusive")
+        parser.add_argument("--until", help="ISO date or datetime, a date includes that day")
+
+    def handle(self, *args, **options):
+        try:
+            queryset = export_enrollments(
+                course=options["course"],
+                since=options["since"] and parse_moment(options["since"]),
+                until=options["until"] and parse_moment(options["until"], end=True),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        lines = export_lines(queryset, ENROLLMENT_COLUMNS, options["format"])
+        if options["output"] == "-":
+            for chunk in lines:
+                self.stdout.write(chunk, ending="")
+        else:
+            with open(options["output"], "w", newline="", encoding="utf-8") as file:
+                file.writelines(lines)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from course.models import Course, Enroll, User
+
+
+class Command(BaseCommand):
+    help = "Recompute Course.enrollments_count and CustomUser.total_enrollments from Enroll rows"
+
+    def handle(self, *args, **options):
+        course_counts = (
+            Enroll.objects.filter(course=OuterRef("pk"))
+            .order_by()
+            .values("course")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        owner_counts = (
+            Course.objects.filter(owner=OuterRef("pk"))
+            .order_by()
+            .values("owner")
+            .annotate(total=Sum("enrollments_count"))
+            .values("total")
+        )
+
+        with transaction.atomic():
+            courses = Course.objects.update(
+                enrollments_count=Coalesce(Subquery(course_counts), 0)
+            )
+            users = User.objects.update(
+                total_enrollments=Coalesce(Subquery(owner_counts), 0)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt enrollment counts for {courses} courses and {users} users."
+            )
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from course.models import Course
+from course.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute Course.rating, totalRatings and rating histograms from Review rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=int,
+            action="append",
+            dest="courses",
+            help="Only reconcile the course with this id (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options["courses"]:
+            courses = courses.filter(pk__in=options["courses"])
+
+        drifted = reconcile_ratings(courses)
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled ratings, {drifted} courses had drifted.")
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from course.analytics import ROLLUP_BATCH_SIZE, rebuild_rollups, roll_up_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Add enrollments, payments, reviews and discussions created since the "
+        "last run to the daily course analytics. Meant to run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the rollups and count every row again",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            counted = rebuild_rollups(options["batch_size"])
+        else:
+            counted = roll_up_all(options["batch_size"])
+
+        summary = ", ".join(f"{count} {source}" for source, count in counted.items())
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {summary}."))
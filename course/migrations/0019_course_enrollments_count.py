@@ -0,0 +1,46 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:01
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_enrollment_counts(apps, schema_editor):
+    Course = apps.get_model("course", "Course")
+    Enroll = apps.get_model("course", "Enroll")
+    User = apps.get_model("user", "CustomUser")
+
+    course_counts = (
+        Enroll.objects.filter(course=OuterRef("pk"))
+        .order_by()
+        .values("course")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Course.objects.update(enrollments_count=Coalesce(Subquery(course_counts), 0))
+
+    owner_counts = (
+        Course.objects.filter(owner=OuterRef("pk"))
+        .order_by()
+        .values("owner")
+        .annotate(total=Sum("enrollments_count"))
+        .values("total")
+    )
+    User.objects.update(total_enrollments=Coalesce(Subquery(owner_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0018_lecture_description'),
+        ('user', '0006_customuser_total_enrollments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollments_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(populate_enrollment_counts, migrations.RunPython.noop),
+    ]
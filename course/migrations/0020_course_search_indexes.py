@@ -0,0 +1,49 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:02
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Must match course.search.search_vector() for the planner to pick the index
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('english'::regconfig, COALESCE("title", '')), 'A')
+    || setweight(to_tsvector('english'::regconfig, COALESCE("description", '')), 'B')
+    || setweight(to_tsvector('english'::regconfig, COALESCE("outcomes", '')), 'C')
+    || setweight(to_tsvector('english'::regconfig, COALESCE("languages", '')), 'D')
+"""
+
+
+def create_search_indexes(apps, schema_editor):
+    # Full-text and trigram indexes only exist on Postgres; other backends
+    # use the in-process index from course.search
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX course_course_search_idx ON course_course USING gin (({SEARCH_VECTOR_SQL}))"
+    )
+    schema_editor.execute(
+        "CREATE INDEX course_course_title_trgm_idx ON course_course USING gin (title gin_trgm_ops)"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS course_course_search_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS course_course_title_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0019_course_enrollments_count'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='category',
+            field=models.CharField(choices=[('MA', 'Mathematics'), ('PH', 'Physics'), ('EC', 'Economics'), ('FM', 'Finance & Marketing'), ('CS', 'Computer Science'), ('NC', 'Not Categorized')], db_index=True, default='NC', max_length=32),
+        ),
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+def create_sequence(apps, schema_editor):
+    # Must increment by course.enrollment_numbers.BLOCK_SIZE
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE SEQUENCE IF NOT EXISTS course_enroll_number_seq "
+            "INCREMENT BY 100 MINVALUE 0 START WITH 0"
+        )
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP SEQUENCE IF EXISTS course_enroll_number_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0021_ratinghistogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
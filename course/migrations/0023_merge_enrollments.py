@@ -0,0 +1,72 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:20
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def merge_enrollments(apps, schema_editor):
+    """
+    Make Enroll the single record of who is enrolled where: create Enroll
+    rows for enrollments only present in the old M2M table, fold duplicate
+    Enroll rows into the oldest one and recount the stored counters.
+    """
+
+    from course.enrollment_numbers import next_enrollment_no
+
+    Course = apps.get_model("course", "Course")
+    Enroll = apps.get_model("course", "Enroll")
+    Payment = apps.get_model("payments", "Payment")
+    User = apps.get_model("user", "CustomUser")
+
+    enrolled = set(Enroll.objects.values_list("student_id", "course_id"))
+    mirrored = set(
+        Course.enrollments.through.objects.values_list("customuser_id", "course_id")
+    )
+    Enroll.objects.bulk_create(
+        Enroll(student_id=student_id, course_id=course_id, enrollment_no=next_enrollment_no())
+        for student_id, course_id in sorted(mirrored - enrolled)
+    )
+
+    duplicates = (
+        Enroll.objects.values("student_id", "course_id")
+        .annotate(copies=Count("pk"), keep=Min("pk"))
+        .filter(copies__gt=1)
+    )
+    for row in duplicates:
+        extra = Enroll.objects.filter(
+            student_id=row["student_id"], course_id=row["course_id"]
+        ).exclude(pk=row["keep"])
+        Payment.objects.filter(enrollment__in=extra).update(enrollment_id=row["keep"])
+        extra.delete()
+
+    course_counts = (
+        Enroll.objects.filter(course=OuterRef("pk"))
+        .order_by()
+        .values("course")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Course.objects.update(enrollments_count=Coalesce(Subquery(course_counts), 0))
+    owner_counts = (
+        Course.objects.filter(owner=OuterRef("pk"))
+        .order_by()
+        .values("owner")
+        .annotate(total=Sum("enrollments_count"))
+        .values("total")
+    )
+    User.objects.update(total_enrollments=Coalesce(Subquery(owner_counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0022_enrollmentsequence'),
+        ('payments', '0007_webhookevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_enrollments, migrations.RunPython.noop),
+    ]
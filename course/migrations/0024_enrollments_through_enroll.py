@@ -0,0 +1,40 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0023_merge_enrollments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='enroll',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_student_enrollment'),
+        ),
+        # Django can't switch an M2M to a custom through model in place: drop
+        # the old join table, then declare the field again on top of Enroll
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RemoveField(
+                    model_name='course',
+                    name='enrollments',
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='course',
+                    name='enrollments',
+                ),
+                migrations.AddField(
+                    model_name='course',
+                    name='enrollments',
+                    field=models.ManyToManyField(blank=True, related_name='enrolled_students', through='course.Enroll', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
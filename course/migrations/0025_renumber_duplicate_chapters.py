@@ -0,0 +1,41 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:18
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def renumber_duplicate_chapters(apps, schema_editor):
+    """
+    Lectures that slipped past the old chapter pre-check share a chapter
+    with an older lecture of the same course. Keep the oldest one in place
+    and move the others to the end of the course.
+    """
+
+    Lecture = apps.get_model("course", "Lecture")
+
+    duplicates = (
+        Lecture.objects.values("course_id", "chapter")
+        .annotate(copies=Count("pk"))
+        .filter(copies__gt=1)
+    )
+    for row in duplicates:
+        lectures = Lecture.objects.filter(
+            course_id=row["course_id"], chapter=row["chapter"]
+        ).order_by("created_at", "pk")
+        last = Lecture.objects.filter(course_id=row["course_id"]).aggregate(
+            last=Max("chapter")
+        )["last"]
+        for lecture in lectures[1:]:
+            last += 1
+            Lecture.objects.filter(pk=lecture.pk).update(chapter=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0024_enrollments_through_enroll'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_duplicate_chapters, migrations.RunPython.noop),
+    ]
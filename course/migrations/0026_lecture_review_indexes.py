@@ -0,0 +1,21 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0025_renumber_duplicate_chapters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', '-created_at'], name='review_course_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lecture',
+            constraint=models.UniqueConstraint(fields=('course', 'chapter'), name='unique_course_chapter'),
+        ),
+    ]
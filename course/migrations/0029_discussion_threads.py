@@ -0,0 +1,38 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0028_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussion',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='course.discussion'),
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='thread',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='course.discussion'),
+        ),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['thread', 'path'], name='discussion_thread_path_idx'),
+        ),
+    ]
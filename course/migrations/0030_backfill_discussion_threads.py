@@ -0,0 +1,29 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:26
+
+from django.db import migrations
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, LPad
+
+
+def start_threads(apps, schema_editor):
+    """
+    Every existing discussion becomes the first post of its own thread
+    """
+
+    Discussion = apps.get_model("course", "Discussion")
+    Discussion.objects.filter(thread__isnull=True).update(
+        thread_id=F("pk"),
+        path=LPad(Cast("pk", CharField()), 10, fill_text=Value("0")),
+        depth=0,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0029_discussion_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(start_threads, migrations.RunPython.noop),
+    ]
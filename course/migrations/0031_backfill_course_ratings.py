@@ -0,0 +1,57 @@
+# Generated by Django 4.2.2 on 2026-10-18 10:30
+
+from django.db import migrations
+from django.db.models import Avg, Count, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+STARS = range(1, 6)
+
+
+def populate_ratings(apps, schema_editor):
+    """
+    Count the reviews written before course.ratings kept the stored rating,
+    totalRatings and histograms in step with them
+    """
+
+    Course = apps.get_model("course", "Course")
+    Review = apps.get_model("course", "Review")
+    RatingHistogram = apps.get_model("course", "RatingHistogram")
+
+    reviews = Review.objects.filter(course=OuterRef("pk")).order_by().values("course")
+    Course.objects.update(
+        rating=Coalesce(
+            Subquery(reviews.annotate(average=Avg("rating")).values("average")),
+            0.0,
+            output_field=FloatField(),
+        ),
+        totalRatings=Coalesce(
+            Subquery(reviews.annotate(total=Count("pk")).values("total")), 0
+        ),
+    )
+
+    counts = (
+        Review.objects.order_by()
+        .values("course")
+        .annotate(
+            **{f"stars_{n}": Count("pk", filter=Q(rating=n)) for n in STARS}
+        )
+    )
+    RatingHistogram.objects.all().delete()
+    RatingHistogram.objects.bulk_create(
+        (
+            RatingHistogram(course_id=row.pop("course"), **row)
+            for row in counts.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0030_backfill_discussion_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
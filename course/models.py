@@ -1,9 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from user.models import CustomUser as User
-from django.utils.crypto import get_random_string
 from django.utils.translation import gettext_lazy as _
 from datetime import timedelta
 from moneyed import list_all_currencies, get_country_name
+from .enrollment_numbers import next_enrollment_no
 
 
 class AvailableCurrency(models.TextChoices):
@@ -32,6 +32,7 @@ class Course(models.Model):
         choices=CourseCategory.choices,
         default=CourseCategory.NOT_CATEGORIZED,
         max_length=32,
+        db_index=True,
     )
     description = models.CharField(max_length=128)
     outcomes = models.TextField(verbose_name="Outcome of the Course")
@@ -59,17 +60,44 @@ class Course(models.Model):
         User, related_name="course_instructors", blank=True
     )
     enrollments = models.ManyToManyField(
-        User, related_name="enrolled_students", blank=True
+        User, through="Enroll", related_name="enrolled_students", blank=True
     )
+    enrollments_count = models.PositiveIntegerField(default=0, editable=False)
     rating = models.FloatField(blank=True, default=0)
     totalRatings = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # One per CoursePagination ordering, the id breaks ties between pages
+        indexes = [
+            models.Index(fields=["-enrollments_count", "-id"], name="course_popular_idx"),
+            models.Index(fields=["-created_at", "-id"], name="course_newest_idx"),
+            models.Index(fields=["-rating", "-id"], name="course_rating_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
 
+class RatingHistogram(models.Model):
+    """
+    Number of reviews per star for a course, kept next to Course.rating
+    """
+
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, related_name="rating_histogram"
+    )
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.course} ratings"
+
+
 class Lecture(models.Model):
     title = models.CharField(max_length=64, verbose_name="Lecture Title")
     description = models.CharField(
@@ -87,6 +115,13 @@ class Lecture(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["course", "chapter"], name="unique_course_chapter"
+            )
+        ]
+
     def __str__(self):
         return self.title
 
@@ -101,16 +136,17 @@ class Enroll(models.Model):
     )
     enrolled_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "course"], name="unique_student_enrollment"
+            )
+        ]
+
     def save(self, *args, **kwargs):
         if not self.enrollment_no:
-            # Generate a random six-digit number
-            enrollment_no = get_random_string(length=10, allowed_chars="1234567890")
-
-            # Check if the generated number is unique
-            while Enroll.objects.filter(enrollment_no=enrollment_no).exists():
-                enrollment_no = get_random_string(length=6, allowed_chars="1234567890")
-
-            self.enrollment_no = enrollment_no
+            # Unique by construction, see course.enrollment_numbers
+            self.enrollment_no = next_enrollment_no()
 
         super().save(*args, **kwargs)
 
@@ -118,7 +154,65 @@ class Enroll(models.Model):
         return self.enrollment_no
 
 
+class EnrollmentSequence(models.Model):
+    """
+    Counter behind enrollment numbers on databases without sequences
+    """
+
+    next_value = models.BigIntegerField(default=0)
+
+
+class CourseDailyStats(models.Model):
+    """
+    Activity of a course on one day, rolled up from Enroll, Payment, Review
+    and Discussion rows by the rollup_analytics command
+    """
+
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    day = models.DateField()
+    enrollments = models.PositiveIntegerField(default=0)
+    payments = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    reviews = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    discussions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["course", "day"], name="unique_course_day")
+        ]
+        verbose_name_plural = "course daily stats"
+
+    def __str__(self):
+        return f"{self.course} on {self.day}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Highest primary key of a source table already counted in the rollups
+    """
+
+    source = models.CharField(max_length=32, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} up to {self.last_id}"
+
+
 class Discussion(models.Model):
+    """
+    A post under a lecture, or a reply to one. ``path`` holds the zero padded
+    ids from the thread's first post down to this one, so ordering a thread
+    by path lists every reply right after the post it answers.
+    """
+
+    # Replies nested deeper than this are refused, the path must fit its column
+    MAX_DEPTH = 20
+    PATH_SEGMENT = 10
+
     discussion = models.CharField(max_length=100, blank=True)
     lecture = models.ForeignKey(
         Lecture, on_delete=models.CASCADE, related_name="discussion_lecture"
@@ -126,9 +220,51 @@ class Discussion(models.Model):
     student = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name="discussion_student"
     )
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="replies",
+    )
+    thread = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        editable=False,
+        related_name="+",
+    )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["lecture", "-created_at"], name="discussion_lecture_recent_idx"
+            ),
+            models.Index(fields=["thread", "path"], name="discussion_thread_path_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            return super().save(*args, **kwargs)
+
+        # The path ends with our own id, known only once the row exists
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            segment = str(self.pk).zfill(self.PATH_SEGMENT)
+            if self.parent_id is None:
+                self.thread_id, self.path, self.depth = self.pk, segment, 0
+            else:
+                self.thread_id = self.parent.thread_id
+                self.path = f"{self.parent.path}/{segment}"
+                self.depth = self.parent.depth + 1
+            Discussion.objects.filter(pk=self.pk).update(
+                thread_id=self.thread_id, path=self.path, depth=self.depth
+            )
+
     def __str__(self) -> str:
         return self.discussion
 
@@ -143,5 +279,10 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "-created_at"], name="review_course_recent_idx")
+        ]
+
 
-from .signals import add_student_to_course_enrollments, remove_enrollment_from_course
+from .signals import count_new_enrollment, uncount_deleted_enrollment
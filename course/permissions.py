@@ -1,7 +1,8 @@
 from rest_framework import permissions
-from .models import Enroll, Course, Lecture
 from user.models import RoleChoices
 
+from .access import get_course_access
+
 
 class IsTeacherOrReadOnly(permissions.BasePermission):
     """
@@ -16,6 +17,30 @@ class IsTeacherOrReadOnly(permissions.BasePermission):
         return request.user.role == RoleChoices.TEACHER
 
 
+class IsTeacherOrStaff(permissions.BasePermission):
+    """
+    Allow teachers and site staff, e.g. to export course data
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (
+            user.is_staff or user.role == RoleChoices.TEACHER
+        )
+
+
+class IsAccountOwnerOrStaff(permissions.BasePermission):
+    """
+    Allow the user named by the username in the url, and site staff
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (
+            user.is_staff or user.username == view.kwargs.get("username")
+        )
+
+
 class IsCourseOwnerOrInstructorsAndEnrolledStudentReadOnly(permissions.BasePermission):
 
     """
@@ -26,36 +51,21 @@ class IsCourseOwnerOrInstructorsAndEnrolledStudentReadOnly(permissions.BasePermi
 
     def has_permission(self, request, view):
         if request.user.is_authenticated:
-            # Check if the student is enrolled in the course
-            course_id = view.kwargs.get("course_id")
-            course = Course.objects.filter(pk=course_id).first()
-            chapter = view.kwargs.get("chapter")
+            access = get_course_access(request, view.kwargs.get("course_id"))
             if request.method in permissions.SAFE_METHODS:
-                return (
-                    Enroll.objects.filter(
-                        student=request.user, course_id=course_id
-                    ).exists()
-                    or course.owner == request.user
-                    or request.user in course.instructors.all()
-                )
+                return access.is_enrolled or access.is_staff_member
 
-            return course.owner == request.user
+            return access.is_owner
+
+        return False
 
 
 class IsCourseOwnerOrInstructorsOnly(permissions.BasePermission):
     def has_permission(self, request, view):
-        course_id = view.kwargs.get("course_id")
+        access = get_course_access(request, view.kwargs.get("course_id"))
 
-        course = Course.objects.filter(id=course_id).first()
-        print(course)
-
-        if course:
-            # Check if the requesting user is the owner or a teacher of the course
-            return (
-                course.owner == request.user or request.user in course.instructors.all()
-            )
-
-        return False
+        # Check if the requesting user is the owner or a teacher of the course
+        return access.is_staff_member
 
 
 class IsEnrolledStudentsOnly(permissions.BasePermission):
@@ -65,12 +75,8 @@ class IsEnrolledStudentsOnly(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
-        print(request.data)
-        course_id = view.kwargs.get("course_id")
-        course = Course.objects.filter(pk=course_id).first()
-
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if course:
-            return request.user in course.enrollments.all()
+        access = get_course_access(request, view.kwargs.get("course_id"))
+        return access.is_enrolled
@@ -0,0 +1,141 @@
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Course, RatingHistogram, Review
+
+STARS = range(1, 6)
+
+
+def _star_field(stars):
+    return f"stars_{int(stars)}"
+
+
+def _review_histogram(course_id):
+    return Review.objects.filter(course_id=course_id).aggregate(
+        **{_star_field(n): Count("pk", filter=Q(rating=n)) for n in STARS}
+    )
+
+
+def _shift_histogram(course_id, **deltas):
+    """
+    Apply ``deltas`` to the histogram of a course, once the review change
+    they stand for is saved. A course without a histogram gets one counted
+    from its Review rows, which already include the change.
+    """
+
+    shift = {field: F(field) + delta for field, delta in deltas.items()}
+    if RatingHistogram.objects.filter(course_id=course_id).update(**shift):
+        return
+
+    _, created = RatingHistogram.objects.get_or_create(
+        course_id=course_id, defaults=_review_histogram(course_id)
+    )
+    if not created:
+        # Counted by a concurrent review that didn't see ours
+        RatingHistogram.objects.filter(course_id=course_id).update(**shift)
+
+
+def add_rating(course_id, stars):
+    """
+    Fold a new review into the running mean and histogram of a course
+    """
+
+    total = F("totalRatings")
+    with transaction.atomic():
+        Course.objects.filter(pk=course_id).update(
+            rating=(F("rating") * total + stars) / Cast(total + 1, FloatField()),
+            totalRatings=total + 1,
+        )
+        _shift_histogram(course_id, **{_star_field(stars): 1})
+
+
+def change_rating(course_id, old_stars, new_stars):
+    """
+    Replace one review's stars in the running mean and histogram of a course
+    """
+
+    if old_stars == new_stars:
+        return
+
+    with transaction.atomic():
+        Course.objects.filter(pk=course_id, totalRatings__gt=0).update(
+            rating=F("rating")
+            + (new_stars - old_stars) / Cast(F("totalRatings"), FloatField())
+        )
+        _shift_histogram(
+            course_id, **{_star_field(old_stars): -1, _star_field(new_stars): 1}
+        )
+
+
+def remove_rating(course_id, stars):
+    """
+    Take a deleted review out of the running mean and histogram of a course,
+    after the Review row is deleted
+    """
+
+    total = F("totalRatings")
+    with transaction.atomic():
+        Course.objects.filter(pk=course_id, totalRatings__gt=0).update(
+            rating=Case(
+                When(totalRatings=1, then=Value(0.0)),
+                default=(F("rating") * total - stars) / Cast(total - 1, FloatField()),
+                output_field=FloatField(),
+            ),
+            totalRatings=total - 1,
+        )
+        _shift_histogram(course_id, **{_star_field(stars): -1})
+
+
+def reconcile_ratings(courses=None):
+    """
+    Recompute rating, totalRatings and the histogram from Review rows
+
+    Args:
+        courses (QuerySet): courses to reconcile, all of them by default
+
+    Returns:
+        int: number of courses whose stored values had drifted
+    """
+
+    if courses is None:
+        courses = Course.objects.all()
+
+    stats = (
+        Review.objects.filter(course__in=courses)
+        .values("course")
+        .annotate(
+            average=Coalesce(Avg("rating"), 0.0),
+            total=Count("pk"),
+            **{_star_field(n): Count("pk", filter=Q(rating=n)) for n in STARS},
+        )
+    )
+    stats = {row.pop("course"): row for row in stats}
+
+    drifted = 0
+    for course in courses.select_related("rating_histogram").iterator(chunk_size=500):
+        row = stats.get(course.pk, {"average": 0.0, "total": 0})
+        histogram = {_star_field(n): row.get(_star_field(n), 0) for n in STARS}
+
+        try:
+            stored = {field: getattr(course.rating_histogram, field) for field in histogram}
+        except RatingHistogram.DoesNotExist:
+            stored = dict.fromkeys(histogram, 0)
+
+        if (
+            abs(course.rating - row["average"]) < 1e-6
+            and course.totalRatings == row["total"]
+            and stored == histogram
+        ):
+            continue
+
+        drifted += 1
+        with transaction.atomic():
+            Course.objects.filter(pk=course.pk).update(
+                rating=row["average"], totalRatings=row["total"]
+            )
+            RatingHistogram.objects.update_or_create(
+                course_id=course.pk, defaults=histogram
+            )
+
+    return drifted
@@ -0,0 +1,164 @@
+import difflib
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import Course
+
+SEARCH_CONFIG = "english"
+
+# Field -> weight, mirroring the A/B/C/D weights of the Postgres index
+SEARCH_FIELDS = {
+    "title": "A",
+    "description": "B",
+    "outcomes": "C",
+    "languages": "D",
+}
+WEIGHT_VALUES = {"A": 1.0, "B": 0.4, "C": 0.2, "D": 0.1}
+
+# Minimum title similarity for a misspelt query to still match
+TRIGRAM_THRESHOLD = 0.3
+
+
+def search_vector():
+    """
+    Weighted vector over the searchable course columns. Must stay identical
+    to the expression indexed by migration 0020 for the GIN index to be used.
+    """
+
+    from django.contrib.postgres.search import SearchVector
+
+    vector = None
+    for field, weight in SEARCH_FIELDS.items():
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def search_courses(queryset, q):
+    """
+    Returns courses matching q, annotated with ``rank`` and best match first
+
+    Args:
+        queryset (QuerySet): Course queryset to search within
+        q (str): free text entered by the user
+
+    Returns:
+        QuerySet: matching courses ordered by rank
+    """
+
+    if connections[queryset.db].vendor == "postgresql":
+        return _search_postgres(queryset, q)
+    return _search_fallback(queryset, q)
+
+
+def _search_postgres(queryset, q):
+    from django.contrib.postgres.search import (
+        SearchQuery,
+        SearchRank,
+        TrigramSimilarity,
+    )
+
+    query = SearchQuery(q, search_type="websearch", config=SEARCH_CONFIG)
+    # trigram_similar (%) is what the trigram index serves, but it compares
+    # against the server's pg_trgm.similarity_threshold; the explicit
+    # comparison keeps fuzzy title matches at our own threshold
+    similar = Q(title__trigram_similar=q, similarity__gt=TRIGRAM_THRESHOLD)
+    return (
+        queryset.annotate(
+            search=search_vector(),
+            similarity=TrigramSimilarity("title", q),
+            rank=SearchRank(search_vector(), query) + F("similarity"),
+        )
+        .filter(Q(search=query) | similar)
+        .order_by("-rank", "-id")
+    )
+
+
+def _search_fallback(queryset, q):
+    ranked = course_index.search(q)
+    if not ranked:
+        return queryset.none()
+
+    # Scores are sums of a few field weights, so matches share a handful of
+    # distinct values; one branch per score keeps the CASE short
+    by_score = defaultdict(list)
+    for pk, score in ranked.items():
+        by_score[round(score, 6)].append(pk)
+    rank = Case(
+        *[When(pk__in=pks, then=Value(score)) for score, pks in by_score.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=ranked.keys())
+        .annotate(rank=rank)
+        .order_by("-rank", "-id")
+    )
+
+
+def tokenize(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+class CourseSearchIndex:
+    """
+    In-process inverted index used when the database has no full-text search,
+    e.g. SQLite during tests. Rebuilt lazily after any course write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+
+    def _build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+        rows = Course.objects.values_list("pk", *SEARCH_FIELDS)
+        for pk, *values in rows.iterator(chunk_size=2000):
+            for value, weight in zip(values, SEARCH_FIELDS.values()):
+                for term in tokenize(value):
+                    postings[term][pk] += WEIGHT_VALUES[weight]
+        return postings
+
+    def _get_postings(self):
+        with self._lock:
+            if self._postings is None:
+                self._postings = self._build()
+            return self._postings
+
+    def search(self, q):
+        """
+        Returns a {course pk: score} mapping for courses matching every term
+        of q. Unknown terms fall back to their closest indexed spellings.
+        """
+
+        postings = self._get_postings()
+        scores = None
+        for term in set(tokenize(q)):
+            candidates = [term] if term in postings else difflib.get_close_matches(
+                term, postings.keys(), n=3, cutoff=0.8
+            )
+            matches = defaultdict(float)
+            for candidate in candidates:
+                for pk, weight in postings[candidate].items():
+                    matches[pk] += weight
+
+            if scores is None:
+                scores = matches
+            else:
+                scores = {pk: scores[pk] + matches[pk] for pk in scores if pk in matches}
+
+            if not scores:
+                return {}
+
+        return dict(scores or {})
+
+
+course_index = CourseSearchIndex()
@@ -1,10 +1,14 @@
+from django.db import models
+from moneyed import Money
 from rest_framework import serializers
 
-from .models import Course, Lecture, Enroll, Discussion, Review
+from gen.serializers import DynamicFieldsMixin
+from .fx import convert_prices, rate_tables
+from .models import AvailableCurrency, Course, Lecture, Enroll, Discussion, Review, RatingHistogram
 from user.serializers import CustomUserDetailsSerializer
 
 
-class LectureSerializer(serializers.ModelSerializer):
+class LectureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # course = serializers.ReadOnlyField()
     course = serializers.PrimaryKeyRelatedField(read_only=True)
 
@@ -13,27 +17,143 @@ class LectureSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class RatingHistogramSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RatingHistogram
+        exclude = ("id", "course")
+
+
+def display_currency(context):
+    """
+    Currency asked for with ?currency=, None if none was
+    """
+
+    request = context.get("request")
+    currency = request.query_params.get("currency") if request else None
+    if not currency:
+        return None
+    currency = currency.upper()
+    if currency not in AvailableCurrency.values:
+        raise serializers.ValidationError(
+            {"currency": f"Choose one of: {', '.join(AvailableCurrency.values)}."}
+        )
+    return currency
+
+
+def display_rates(context):
+    """
+    Currency asked for with ?currency= and the rate table to convert with,
+    worked out once per response and kept in ``context``
+    """
+
+    if "display_rates" not in context:
+        currency = display_currency(context)
+        context["display_rates"] = (currency, rate_tables.get() if currency else None)
+    return context["display_rates"]
+
+
+class DisplayPriceField(serializers.Field):
+    """
+    Course price in the currency asked for with ?currency=, or in its own
+    """
+
+    # Read by the query planner in place of a source
+    source_columns = ("price", "currency")
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, course):
+        prices = self.context.get("display_prices") or {}
+        price = prices.get(course.pk)
+        if price is None:
+            # Courses nested in other rows, or a single one
+            currency, table = display_rates(self.context)
+            price = Money(course.price, course.currency)
+            if table is not None:
+                price = table.convert(price, currency)
+        return {"amount": str(price.amount), "currency": price.currency.code}
+
+
+class CourseListSerializer(serializers.ListSerializer):
+    """
+    Converts the prices of a whole page in one pass before rendering it, if
+    they are rendered at all
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if "display_price" in self.child.fields:
+            # Columns left out by ?fields= would be loaded a row at a time
+            currency, _ = display_rates(self.context)
+            self.context["display_prices"] = convert_prices(data, currency)
+        return super().to_representation(data)
+
+
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     owner = CustomUserDetailsSerializer(read_only=True)
     lectures = LectureSerializer(many=True, read_only=True)
     instructors = CustomUserDetailsSerializer(read_only=True, many=True)
+    rating_histogram = RatingHistogramSerializer(read_only=True, allow_null=True)
+    display_price = DisplayPriceField()
     created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = Course
         fields = "__all__"
+        read_only_fields = ("rating", "totalRatings")
+        list_serializer_class = CourseListSerializer
 
     def get_category_display(self, obj):
         return obj.get_category_display()
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data["category"] = instance.get_category_display()
+        if "category" in data:
+            data["category"] = instance.get_category_display()
         return data
 
 
-class EnrollSerializer(serializers.ModelSerializer):
+class CourseSummarySerializer(CourseSerializer):
+    """
+    Compact course card for the catalog. Relations are rendered as primary
+    keys unless asked for with ?expand=owner,instructors,lectures
+    """
+
+    owner = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = (
+            "id",
+            "title",
+            "category",
+            "description",
+            "price",
+            "currency",
+            "display_price",
+            "cover_img",
+            "owner",
+            "languages",
+            "enrollments_count",
+            "rating",
+            "totalRatings",
+            "updated_at",
+        )
+        read_only_fields = fields
+        list_serializer_class = CourseListSerializer
+        expandable_fields = {
+            "owner": (CustomUserDetailsSerializer, {}),
+            "instructors": (CustomUserDetailsSerializer, {"many": True}),
+            "lectures": (LectureSerializer, {"many": True}),
+        }
+
+
+class EnrollSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
 
     class Meta:
@@ -56,17 +176,31 @@ class EnrollmentNumberSerializer(serializers.ModelSerializer):
 
 
 class DiscussionSerializer(serializers.ModelSerializer):
-    student = CustomUserDetailsSerializer(read_only=True)
+    student = serializers.CharField(source="student.username", read_only=True)
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Discussion.objects.all(), required=False, allow_null=True
+    )
+    created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = Discussion
-        fields = ("discussion", "student", "updated_at")
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        data["student"] = data["student"]["username"]
-        return data
+        fields = (
+            "id",
+            "discussion",
+            "student",
+            "parent",
+            "depth",
+            "created_at",
+            "updated_at",
+        )
+
+    def validate_parent(self, parent):
+        if parent is not None and parent.depth >= Discussion.MAX_DEPTH:
+            raise serializers.ValidationError(
+                f"Replies can't be nested more than {Discussion.MAX_DEPTH} levels deep."
+            )
+        return parent
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -75,3 +209,18 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = "__all__"
+        # Set from the URL on create, moving a review would leave its stars
+        # counted by the old course
+        read_only_fields = ("course",)
+
+
+class BulkEnrollSerializer(serializers.Serializer):
+    file = serializers.FileField(required=False, help_text="CSV of student emails")
+    students = serializers.ListField(
+        child=serializers.EmailField(), required=False, help_text="Student emails"
+    )
+
+    def validate(self, attrs):
+        if not attrs.get("file") and not attrs.get("students"):
+            raise serializers.ValidationError("Provide a CSV file or a list of students.")
+        return attrs
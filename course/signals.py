@@ -1,18 +1,132 @@
-from django.db.models.signals import post_save, pre_delete
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Enroll
+from django.utils import timezone
+from .models import Enroll, Course, Lecture, Discussion, User
+from .search import course_index
+from .access import invalidate_course_access
+from .streams import discussion_broker
+
+
+def update_enrollment_counts(course, delta):
+    """
+    Shift the stored enrollment counters of a course and its owner by delta
+    """
+
+    with transaction.atomic():
+        Course.objects.filter(pk=course.pk).update(
+            enrollments_count=F("enrollments_count") + delta
+        )
+        User.objects.filter(pk=course.owner_id).update(
+            total_enrollments=F("total_enrollments") + delta
+        )
+
+
+def invalidate_course_access_on_commit(course_id, user_ids=None):
+    """
+    Drop cached access maps once the change is committed. Dropped earlier,
+    a concurrent request could cache the old rows again before the commit.
+    """
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+    transaction.on_commit(lambda: invalidate_course_access(course_id, user_ids))
+
+
+# Enroll is the through table of Course.enrollments, these only keep the
+# stored counters and cached access maps in step with it
 
 
 @receiver(post_save, sender=Enroll)
-def add_student_to_course_enrollments(sender, instance, created, **kwargs):
+def count_new_enrollment(sender, instance, created, **kwargs):
     if created:
-        course = instance.course
-        student = instance.student
-        course.enrollments.add(student)
+        update_enrollment_counts(instance.course, 1)
+        invalidate_course_access_on_commit(instance.course_id, [instance.student_id])
 
 
 @receiver(pre_delete, sender=Enroll)
-def remove_enrollment_from_course(sender, instance, **kwargs):
-    # Remove the enrollment from enrollments field of the associated course
-    instance.course.enrollments.remove(instance.student)
+def uncount_deleted_enrollment(sender, instance, **kwargs):
+    update_enrollment_counts(instance.course, -1)
+    invalidate_course_access_on_commit(instance.course_id, [instance.student_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_search_index(sender, instance, **kwargs):
+    course_index.invalidate()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_access_on_course_change(sender, instance, **kwargs):
+    # The owner may have changed, drop every cached access map of the course
+    invalidate_course_access_on_commit(instance.pk)
+
+
+@receiver(m2m_changed, sender=Course.instructors.through)
+def invalidate_course_access_on_instructors_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
 
+    if reverse:
+        # instance is a user, pk_set holds course ids
+        course_ids = pk_set
+        if action == "pre_clear":
+            course_ids = instance.course_instructors.values_list("pk", flat=True)
+        # Read now, the rows are gone by the time the change is committed
+        for course_id in list(course_ids):
+            invalidate_course_access_on_commit(course_id, [instance.pk])
+    elif action == "pre_clear":
+        invalidate_course_access_on_commit(instance.pk)
+    else:
+        invalidate_course_access_on_commit(instance.pk, pk_set)
+
+
+def touch_courses(course_ids):
+    """
+    Bump updated_at of courses whose nested content changed, so their
+    cached detail payloads and validators are invalidated
+    """
+
+    Course.objects.filter(pk__in=course_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Lecture)
+@receiver(post_delete, sender=Lecture)
+def touch_course_on_lecture_change(sender, instance, **kwargs):
+    touch_courses([instance.course_id])
+
+
+@receiver(m2m_changed, sender=Course.instructors.through)
+def touch_course_on_instructors_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        touch_courses([instance.pk])
+    elif action == "pre_clear":
+        touch_courses(instance.course_instructors.values_list("pk", flat=True))
+    else:
+        touch_courses(pk_set)
+
+
+@receiver(post_save, sender=User)
+def touch_courses_on_profile_change(sender, instance, created, **kwargs):
+    # Course payloads nest the profiles of their owner and instructors
+    if created:
+        return
+    touch_courses(
+        Course.objects.filter(Q(owner=instance) | Q(instructors=instance)).values("pk")
+    )
+
+
+@receiver(post_save, sender=Discussion)
+def publish_new_discussion(sender, instance, created, **kwargs):
+    if created:
+        # Subscribers only hear about rows that made it to the database
+        transaction.on_commit(lambda: discussion_broker.publish(instance))
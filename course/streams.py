@@ -0,0 +1,190 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+
+from .models import Discussion, Lecture
+
+# Events a slow subscriber may have queued before its stream is closed. The
+# client reconnects with Last-Event-ID and catches up from the database.
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def discussion_event(discussion):
+    """
+    Render a discussion as a server-sent event whose id is the discussion's
+    primary key
+    """
+
+    from .serializers import DiscussionSerializer
+
+    data = json.dumps(DiscussionSerializer(discussion).data)
+    return f"id: {discussion.pk}\nevent: discussion\ndata: {data}\n\n"
+
+
+class Subscription:
+    """
+    Queue of events for one stream, owned by the event loop serving it
+    """
+
+    def __init__(self, loop, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def push(self, item):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class DiscussionBroker:
+    """
+    In-process pub/sub of new discussions per lecture.
+
+    Publishing happens in whichever thread saved the discussion, delivery on
+    the event loop of each subscriber. Only streams served by this process
+    are reached, the Last-Event-ID resume covers events published elsewhere
+    once the client reconnects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, lecture_id) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[lecture_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, lecture_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(lecture_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[lecture_id]
+
+    def subscriber_count(self, lecture_id=None) -> int:
+        with self._lock:
+            if lecture_id is not None:
+                return len(self._subscribers.get(lecture_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, discussion):
+        with self._lock:
+            subscribers = list(self._subscribers.get(discussion.lecture_id, ()))
+        if not subscribers:
+            return
+
+        # Rendered once, whatever the number of subscribers
+        item = (discussion.pk, discussion_event(discussion))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, item)
+            except RuntimeError:
+                # The subscriber's loop is closed, its stream is gone
+                self.unsubscribe(discussion.lecture_id, subscription)
+
+
+discussion_broker = DiscussionBroker()
+
+
+async def _discussion_events(lecture_id, last_event_id):
+    loop = asyncio.get_running_loop()
+    # Django 4.2 doesn't notice a client going away, streams end after a
+    # while and EventSource reconnects with Last-Event-ID
+    closes_at = loop.time() + settings.DISCUSSION_STREAM_MAX_AGE
+
+    # Subscribed before reading the backlog, so nothing falls in between
+    subscription = discussion_broker.subscribe(lecture_id)
+    try:
+        yield "retry: 3000\n\n"
+
+        replayed = set()
+        if last_event_id is not None:
+            backlog = (
+                Discussion.objects.filter(lecture_id=lecture_id, pk__gt=last_event_id)
+                .select_related("student")
+                .only(
+                    "pk",
+                    "discussion",
+                    "student__username",
+                    "parent_id",
+                    "depth",
+                    "created_at",
+                    "updated_at",
+                )
+                .order_by("pk")
+            )
+            async for discussion in backlog:
+                replayed.add(discussion.pk)
+                yield discussion_event(discussion)
+
+        while not subscription.overflowed or not subscription.queue.empty():
+            remaining = closes_at - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                pk, event = await asyncio.wait_for(
+                    subscription.queue.get(),
+                    min(remaining, settings.DISCUSSION_STREAM_KEEPALIVE),
+                )
+            except asyncio.TimeoutError:
+                # Comment line, keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if pk not in replayed:
+                yield event
+    finally:
+        discussion_broker.unsubscribe(lecture_id, subscription)
+
+
+async def discussion_stream(request, course_id, chapter):
+    """
+    Server-sent events for discussions posted under a lecture from now on.
+
+    A reconnecting client sends the id of the last event it got in the
+    Last-Event-ID header, or ?last_event_id=, and first receives every
+    discussion posted after it. Needs an ASGI server (gen.asgi), a WSGI
+    server would buffer the endless stream and hold a worker until it
+    ends, so requests served through gen.wsgi (as on Vercel) get a 501.
+    """
+
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Discussion streams are only served by the ASGI application."},
+            status=501,
+        )
+
+    lecture_id = await (
+        Lecture.objects.filter(course_id=course_id, chapter=chapter)
+        .values_list("pk", flat=True)
+        .afirst()
+    )
+    if lecture_id is None:
+        raise Http404("No lecture found with provided info.")
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get(
+        "last_event_id"
+    )
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        _discussion_events(lecture_id, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -1,3 +1,874 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from gen.testing import QueryCountTestCase, create_course, create_user
+
+from .access import get_cached_course_access
+from .analytics import ROLLUP_SOURCES, reconcile, roll_up
+from .enrollment_numbers import BlockAllocator, next_enrollment_no
+from .enrollments import bulk_enroll
+from .exports import ENROLLMENT_COLUMNS
+from .fx import rate_tables
+from .models import (
+    Course,
+    CourseDailyStats,
+    Discussion,
+    Enroll,
+    Lecture,
+    RatingHistogram,
+    Review,
+)
+from .ratings import add_rating, change_rating, remove_rating
+from .search import course_index, search_courses
+from .streams import SUBSCRIBER_QUEUE_SIZE, discussion_broker
+from .views import EnrollmentExportView
+
+
+class DisplayPriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_user("teacher", role="TR")
+
+    def setUp(self):
+        rate_tables.clear()
+
+    def create_courses(self, count):
+        for i in range(count):
+            create_course(self.teacher, title=f"Course {i}", price=10 + i)
+
+    def get(self, query):
+        response = APIClient().get(f"/api/courses/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_selected_fields_need_no_conversion(self):
+        for count in (2, 4):
+            self.create_courses(2)
+            for query in ("fields=id,title", "fields=id,title&currency=EUR"):
+                with self.subTest(count=count, query=query), self.assertNumQueries(1):
+                    results = self.get(query)
+                self.assertEqual(len(results), count)
+                self.assertEqual(set(results[0]), {"id", "title"})
+
+    def test_selected_display_price_is_converted_per_page(self):
+        for count in (2, 4):
+            self.create_courses(2)
+            with self.subTest(count=count), self.assertNumQueries(1):
+                results = self.get("fields=id,display_price&currency=EUR")
+            self.assertEqual(len(results), count)
+            self.assertEqual(results[0]["display_price"]["currency"], "EUR")
+
+    def test_prices_keep_their_currency_by_default(self):
+        self.create_courses(1)
+        results = self.get("fields=display_price")
+        self.assertEqual(
+            results[0]["display_price"], {"amount": "10.00", "currency": "INR"}
+        )
+
+    def test_unknown_currency_is_rejected(self):
+        self.create_courses(1)
+        response = APIClient().get("/api/courses/?fields=display_price&currency=XYZ")
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = create_user("teacher", role="TR")
+        self.course = create_course(self.teacher)
+        self.url = f"/api/course/{self.course.pk}/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_enrollments_and_reviews_change_the_etag(self):
+        student = create_user("student")
+        etags = [self.client.get(self.url)["ETag"]]
+
+        Enroll.objects.create(student=student, course=self.course)
+        etags.append(self.client.get(self.url)["ETag"])
+
+        Review.objects.create(review="Good", rating=4, owner=student, course=self.course)
+        add_rating(self.course.pk, 4)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["course"]["totalRatings"], 1)
+        etags.append(response["ETag"])
+
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_enrolled_students_get_their_own_etag(self):
+        student = create_user("student")
+        Enroll.objects.create(student=student, course=self.course)
+        etag = self.client.get(self.url)["ETag"]
+
+        client = APIClient()
+        client.force_authenticate(student)
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data["enrollment"])
+
+    def test_fields_and_expand_change_the_etag(self):
+        responses = {
+            query: self.client.get(f"{self.url}{query}")
+            for query in ("", "?fields=id,title", "?fields=id", "?expand=owner")
+        }
+        self.assertEqual(len({response["ETag"] for response in responses.values()}), 4)
+        self.assertEqual(set(responses["?fields=id,title"].data["course"]), {"id", "title"})
+
+        # Each shape is cached apart from the others
+        response = self.client.get(f"{self.url}?fields=id")
+        self.assertEqual(response.data["course"], {"id": self.course.pk})
+        self.assertEqual(response["ETag"], responses["?fields=id"]["ETag"])
+
+    def test_corrected_rates_change_the_etag(self):
+        with open(settings.FX_RATES_FILE) as f:
+            rates = json.load(f)
+        path = os.path.join(tempfile.mkdtemp(), "fx_rates.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        self.addCleanup(rate_tables.clear)
+
+        def get(**headers):
+            # Read again as once FX_RATES_TTL has passed
+            rate_tables.clear()
+            with open(path, "w") as f:
+                json.dump(rates, f)
+            with override_settings(FX_RATES_FILE=path):
+                return self.client.get(f"{self.url}?currency=EUR", **headers)
+
+        before = get()
+        etag = before["ETag"]
+        self.assertEqual(get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Corrected under the same as_of date
+        rates["rates"]["EUR"] = str(Decimal(rates["rates"]["EUR"]) * 2)
+        after = get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], etag)
+        self.assertEqual(
+            [r.data["course"]["display_price"]["amount"] for r in (before, after)],
+            ["0.10", "0.19"],
+        )
+
+    def test_patch_with_selected_fields_saves_the_whole_row(self):
+        updated_at = self.course.updated_at
+        before = self.client.get(self.url)
+        response = self.client.patch(
+            f"{self.url}?fields=title", {"title": "Django"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"title": "Django"})
+
+        self.course.refresh_from_db()
+        self.assertGreater(self.course.updated_at, updated_at)
+        after = self.client.get(self.url)
+        self.assertEqual(after.data["course"]["title"], "Django")
+        self.assertNotEqual(after["ETag"], before["ETag"])
+
+    def test_profile_edits_reach_the_cached_payload(self):
+        instructor = create_user("instructor", role="TR")
+        self.course.instructors.add(instructor)
+        before = self.client.get(self.url)
+
+        for user in (self.teacher, instructor):
+            user.bio = f"{user.first_name} bio"
+            user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(response.status_code, 200)
+        course = response.data["course"]
+        self.assertEqual(course["owner"]["bio"], "teacher bio")
+        self.assertEqual(course["instructors"][0]["bio"], "instructor bio")
+
+    def test_only_the_etag_validates(self):
+        response = self.client.get(self.url)
+        self.assertNotIn("Last-Modified", response)
+
+        # A date can't tell a rating change apart, the body is sent again
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class RatingHistogramTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.students = [create_user(f"student{i}") for i in range(3)]
+
+    def review(self, student, stars):
+        return Review.objects.create(
+            review="Good", rating=stars, owner=student, course=self.course
+        )
+
+    def histogram(self):
+        histogram = RatingHistogram.objects.get(course=self.course)
+        return [getattr(histogram, f"stars_{n}") for n in range(1, 6)]
+
+    def test_reviews_shift_the_histogram(self):
+        first = self.review(self.students[0], 5)
+        add_rating(self.course.pk, 5)
+        self.review(self.students[1], 3)
+        add_rating(self.course.pk, 3)
+        first.rating = 4
+        first.save()
+        change_rating(self.course.pk, 5, 4)
+        self.assertEqual(self.histogram(), [0, 0, 1, 1, 0])
+
+    def test_missing_histogram_is_counted_from_reviews(self):
+        # Reviews written before histograms were kept
+        self.review(self.students[0], 5)
+        self.review(self.students[1], 5)
+        removed = self.review(self.students[2], 2)
+
+        removed.delete()
+        remove_rating(self.course.pk, 2)
+        self.assertEqual(self.histogram(), [0, 0, 0, 0, 2])
+
+    def test_missing_histogram_counts_a_changed_review_once(self):
+        review = self.review(self.students[0], 5)
+        review.rating = 1
+        review.save()
+        change_rating(self.course.pk, 5, 1)
+        self.assertEqual(self.histogram(), [1, 0, 0, 0, 0])
+
+
+class ReviewApiTests(TestCase):
+    def setUp(self):
+        teacher = create_user("teacher", role="TR")
+        self.course = create_course(teacher)
+        self.other = create_course(teacher, title="Django")
+        self.student = create_user("student")
+        for course in (self.course, self.other):
+            Enroll.objects.create(student=self.student, course=course)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def ratings(self, course):
+        course.refresh_from_db()
+        return course.rating, course.totalRatings
+
+    def test_course_comes_from_the_url(self):
+        response = self.client.post(
+            f"/api/course/{self.course.pk}/reviews/",
+            {"review": "Good", "rating": 4, "course": self.other.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["course"], self.course.pk)
+        self.assertEqual(self.ratings(self.course), (4.0, 1))
+        self.assertEqual(self.ratings(self.other), (0.0, 0))
+
+    def test_reviews_cant_move_to_another_course(self):
+        review = Review.objects.create(
+            review="Good", rating=4, owner=self.student, course=self.course
+        )
+        add_rating(self.course.pk, 4)
+
+        response = self.client.patch(
+            f"/api/course/review/{review.pk}/",
+            {"rating": 2, "course": self.other.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        review.refresh_from_db()
+        self.assertEqual((review.course_id, review.rating), (self.course.pk, 2))
+        self.assertEqual(self.ratings(self.course), (2.0, 1))
+        self.assertEqual(self.ratings(self.other), (0.0, 0))
+        self.assertEqual(self.course.rating_histogram.stars_2, 1)
+        self.assertFalse(RatingHistogram.objects.filter(course=self.other).exists())
+
+
+class BulkEnrollTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.students = [create_user(f"student{i}") for i in range(3)]
+
+    def pairs(self):
+        return [(student.pk, self.course.pk) for student in self.students]
+
+    def test_enrolls_missing_pairs(self):
+        Enroll.objects.create(student=self.students[0], course=self.course)
+        enrollments, created = bulk_enroll(self.pairs())
+
+        self.assertEqual(set(enrollments), set(self.pairs()))
+        self.assertEqual(len(created), 2)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 3)
+
+    def test_concurrent_enrollment_is_skipped(self):
+        racer = []
+
+        def enroll_concurrently():
+            # Another request enrolls a student after bulk_enroll read the
+            # existing rows, and before it inserts its own
+            if not racer:
+                racer.append(
+                    Enroll.objects.create(student=self.students[1], course=self.course)
+                )
+            return next_enrollment_no()
+
+        with mock.patch("course.enrollments.next_enrollment_no", enroll_concurrently):
+            enrollments, created = bulk_enroll(self.pairs())
+
+        self.assertEqual(enrollments[self.pairs()[1]], racer[0])
+        self.assertEqual(
+            {(e.student_id, e.course_id) for e in created},
+            {self.pairs()[0], self.pairs()[2]},
+        )
+        self.assertEqual(Enroll.objects.filter(course=self.course).count(), 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 3)
+
+
+class EnrollmentNumberTests(TestCase):
+    def test_blocks_are_kept_only_when_durable(self):
+        reserve = mock.Mock(side_effect=lambda size: reserve.call_count * 1000)
+        allocator = BlockAllocator(reserve, block_size=3, is_durable=lambda: True)
+        self.assertEqual([allocator() for _ in range(4)], [1000, 1001, 1002, 2000])
+        self.assertEqual(reserve.call_args_list, [mock.call(3), mock.call(3)])
+
+        allocator = BlockAllocator(reserve, block_size=3, is_durable=lambda: False)
+        self.assertEqual([allocator() for _ in range(2)], [3000, 4000])
+        self.assertEqual(reserve.call_args_list[2:], [mock.call(1), mock.call(1)])
+
+    def test_rolled_back_reservation_is_not_handed_out_again(self):
+        first, second = BlockAllocator(), BlockAllocator()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                first()
+                raise IntegrityError
+
+        # Another process reserving after the rollback
+        values = [first() for _ in range(3)] + [second() for _ in range(3)]
+        self.assertEqual(len(set(values)), 6)
+
+
+class EnrollmentExportTests(TestCase):
+    url = "/api/course/enroll/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_user("teacher", role="TR")
+        cls.instructor = create_user("instructor", role="TR")
+        cls.course = create_course(cls.teacher)
+        cls.course.instructors.add(cls.instructor)
+        cls.other_course = create_course(create_user("other", role="TR"))
+        cls.students = [create_user(f"student{i}") for i in range(4)]
+
+        for day, (student, course) in enumerate(
+            [
+                (cls.students[0], cls.course),
+                (cls.students[1], cls.course),
+                (cls.students[2], cls.course),
+                (cls.students[3], cls.other_course),
+            ],
+            start=1,
+        ):
+            enrollment = Enroll.objects.create(student=student, course=course)
+            Enroll.objects.filter(pk=enrollment.pk).update(
+                enrolled_at=timezone.make_aware(datetime(2026, 1, day, 12))
+            )
+
+    def export(self, user, query=""):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(f"{self.url}{query}")
+
+    def emails(self, user, query=""):
+        response = self.export(user, query)
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        if "output=ndjson" in query:
+            return [json.loads(line)["student_email"] for line in lines]
+        header, *rows = csv.reader(lines)
+        self.assertEqual(header, [name for name, _ in ENROLLMENT_COLUMNS])
+        return [row[header.index("student_email")] for row in rows]
+
+    def test_teachers_export_the_courses_they_teach(self):
+        expected = [f"student{i}@example.com" for i in range(3)]
+        self.assertEqual(self.emails(self.teacher), expected)
+        self.assertEqual(self.emails(self.instructor, "?output=ndjson"), expected)
+
+    def test_filters(self):
+        cases = {
+            "?since=2026-01-02": ["student1@example.com", "student2@example.com"],
+            "?until=2026-01-01": ["student0@example.com"],
+            "?since=2026-01-02T13:00:00Z": ["student2@example.com"],
+            f"?course={self.other_course.pk}": [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.emails(self.teacher, query), expected)
+
+    def test_streams_in_chunks(self):
+        with mock.patch.object(EnrollmentExportView, "chunk_size", 2):
+            chunks = list(self.export(self.teacher).streaming_content)
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [1, 2, 1])
+
+    def test_permissions(self):
+        self.assertEqual(self.export(None).status_code, 401)
+        self.assertEqual(self.export(self.students[0]).status_code, 403)
+
+
+class CourseAccessInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.student = create_user("student")
+
+    def setUp(self):
+        cache.clear()
+
+    def access(self):
+        return get_cached_course_access(self.student, self.course.pk)
+
+    def assertInvalidatedOnCommit(self, change, **flags):
+        self.access()
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+            # Until the commit the cached map is kept, a concurrent request
+            # would only cache the old rows again
+            self.assertNotEqual(
+                {name: getattr(self.access(), name) for name in flags}, flags
+            )
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertEqual({name: getattr(self.access(), name) for name in flags}, flags)
+
+    def test_enrollment(self):
+        self.assertInvalidatedOnCommit(
+            lambda: Enroll.objects.create(student=self.student, course=self.course),
+            is_enrolled=True,
+        )
+
+    def test_unenrollment(self):
+        enroll = Enroll.objects.create(student=self.student, course=self.course)
+        self.assertInvalidatedOnCommit(enroll.delete, is_enrolled=False)
+
+    def test_instructors(self):
+        self.assertInvalidatedOnCommit(
+            lambda: self.course.instructors.add(self.student), is_instructor=True
+        )
+        self.assertInvalidatedOnCommit(
+            lambda: self.student.course_instructors.clear(), is_instructor=False
+        )
+
+    def test_owner_change(self):
+        def change_owner():
+            self.course.owner = self.student
+            self.course.save()
+
+        self.assertInvalidatedOnCommit(change_owner, is_owner=True)
+
+
+class AnalyticsRollupTests(TestCase):
+    source = next(source for source in ROLLUP_SOURCES if source.name == "enrollments")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.students = [create_user(f"student{i}") for i in range(3)]
+
+    def enroll(self, student, age):
+        enroll = Enroll.objects.create(student=student, course=self.course)
+        Enroll.objects.filter(pk=enroll.pk).update(
+            enrolled_at=timezone.now() - timedelta(seconds=age)
+        )
+        return enroll
+
+    def counted(self):
+        return sum(
+            CourseDailyStats.objects.filter(course=self.course).values_list(
+                "enrollments", flat=True
+            )
+        )
+
+    def test_watermark_stops_below_unsettled_rows(self):
+        self.enroll(self.students[0], age=0)
+        self.enroll(self.students[1], age=3600)
+        self.assertEqual(roll_up(self.source), 0)
+
+        Enroll.objects.update(enrolled_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(roll_up(self.source), 2)
+        self.assertEqual(self.counted(), 2)
+
+    def test_reconcile_counts_rows_committed_late(self):
+        self.enroll(self.students[0], age=3600)
+        late = self.enroll(self.students[1], age=3600)
+        self.enroll(self.students[2], age=3600)
+        # Not committed yet when the rollup passes it
+        late_pk = late.pk
+        late.delete()
+        self.assertEqual(roll_up(self.source), 2)
+
+        late.pk = late_pk
+        late.save()
+        Enroll.objects.filter(pk=late_pk).update(
+            enrolled_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(roll_up(self.source), 0)
+        self.assertEqual(self.counted(), 2)
+
+        self.assertEqual(reconcile(self.source), 1)
+        self.assertEqual(self.counted(), 3)
+        self.assertEqual(reconcile(self.source), 0)
+
+
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        # Built from rows that rolled back with earlier tests
+        course_index.invalidate()
+        teacher = create_user("teacher", role="TR")
+
+        def course(title, description):
+            return create_course(
+                teacher, title=title, description=description, outcomes="Code"
+            )
+
+        self.title = course("Python Projects", "Introduction")
+        self.both = course("Python Basics", "Python projects")
+        self.description = course("Django", "Web projects in python")
+        self.other = course("Calculus", "Limits")
+
+    def search(self, q):
+        return list(search_courses(Course.objects.all(), q))
+
+    def test_best_match_first(self):
+        results = self.search("python projects")
+        self.assertEqual(results, [self.title, self.both, self.description])
+        self.assertEqual([course.rank for course in results], [2.0, 1.8, 0.8])
+
+    def test_equal_scores_keep_newest_first(self):
+        self.assertEqual(
+            self.search("projects"), [self.title, self.description, self.both]
+        )
+
+    def test_misspelt_terms_match(self):
+        self.assertEqual(self.search("calculsu"), [self.other])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.search("python limits"), [])
+
+
+class CoursePaginationTests(TestCase):
+    def setUp(self):
+        self.teacher = create_user("teacher", role="TR")
+        # Runs of equal enrollment counts, told apart by the primary key
+        for i, count in enumerate([3, 3, 3, 1, 1, 1, 1, 0, 0, 0]):
+            self.add_course(f"Course {i}", count)
+
+    def add_course(self, title, enrollments):
+        course = create_course(self.teacher, title=title)
+        Course.objects.filter(pk=course.pk).update(enrollments_count=enrollments)
+        return course
+
+    def expected(self):
+        return list(
+            Course.objects.order_by("-enrollments_count", "-pk").values_list(
+                "pk", flat=True
+            )
+        )
+
+    def get(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def ids(self, page):
+        return [course["id"] for course in page["results"]]
+
+    def test_next_and_previous_across_ties(self):
+        pages = [self.get("/api/courses/")]
+        while pages[-1]["next"]:
+            pages.append(self.get(pages[-1]["next"]))
+        self.assertEqual([len(page["results"]) for page in pages], [4, 4, 2])
+        self.assertIsNone(pages[0]["previous"])
+        self.assertEqual(sum(map(self.ids, pages), []), self.expected())
+
+        back = [pages[-1]]
+        while back[-1]["previous"]:
+            back.append(self.get(back[-1]["previous"]))
+        self.assertEqual(
+            [self.ids(page) for page in back], [self.ids(page) for page in reversed(pages)]
+        )
+
+    def test_pages_stay_put_when_rows_are_inserted(self):
+        first = self.get("/api/courses/")
+        expected = self.expected()[4:8]
+
+        # Sorted before the cursor, or after it at the head of the zeros
+        self.add_course("Popular", 5)
+        self.add_course("Tied", 1)
+        self.add_course("Later", 0)
+
+        second = self.ids(self.get(first["next"]))
+        self.assertEqual(second[:3], expected[:3])
+        self.assertEqual(Course.objects.get(pk=second[3]).title, "Later")
+        self.assertFalse(set(second) & set(self.ids(first)))
+
+    def test_tampered_cursors_are_rejected(self):
+        cursor = self.get("/api/courses/")["next"].split("cursor=")[1]
+        unsigned = signing.dumps({"o": "popular", "v": ["3", "1"], "r": False})
+        other_ordering = self.get("/api/courses/?ordering=newest")["next"]
+        other_ordering = other_ordering.split("cursor=")[1].split("&")[0]
+
+        for token in (f"x{cursor}", cursor[:-2], unsigned, other_ordering, "garbage"):
+            with self.subTest(token=token):
+                response = APIClient().get(f"/api/courses/?cursor={token}")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["detail"], "Invalid cursor")
+
+
+class CourseQueryCountTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_user("teacher", role="TR")
+        cls.student = create_user("student")
+        cls.course = create_course(cls.teacher)
+        Enroll.objects.create(student=cls.student, course=cls.course)
+        cls.lecture = cls.add_lecture(cls.course)
+        cls.users = 0
+
+    @classmethod
+    def add_lecture(cls, course):
+        chapter = course.lectures.count() + 1
+        return Lecture.objects.create(
+            title=f"Lecture {chapter}",
+            lecture_url="https://example.com/lecture.mp4",
+            chapter=chapter,
+            course=course,
+        )
+
+    def new_user(self, role="ST"):
+        type(self).users += 1
+        return create_user(f"user{self.users}", role=role)
+
+    def add_courses(self, n):
+        for _ in range(n):
+            course = create_course(self.teacher)
+            course.instructors.add(self.new_user(role="TR"))
+            self.add_lecture(course)
+
+    def test_course_list(self):
+        self.assertQueriesPerRequest(1, "/api/courses/", self.add_courses)
+
+    def test_course_search(self):
+        self.assertQueriesPerRequest(
+            3, "/api/courses/search/?q=python", self.add_courses
+        )
+
+    def test_user_courses(self):
+        url = f"/api/user/{self.teacher.username}/courses/"
+        self.assertQueriesPerRequest(7, url, self.add_courses, self.teacher)
+
+    def test_course_detail(self):
+        def add_rows(n):
+            for _ in range(n):
+                self.course.instructors.add(self.new_user(role="TR"))
+                self.add_lecture(self.course)
+
+        self.assertQueriesPerRequest(
+            7, f"/api/course/{self.course.pk}/", add_rows, self.student
+        )
+
+    def test_lecture_list(self):
+        def add_rows(n):
+            for _ in range(n):
+                self.add_lecture(self.course)
+
+        self.assertQueriesPerRequest(
+            2, f"/api/course/{self.course.pk}/lectures/", add_rows, self.teacher
+        )
+
+    def test_lecture_detail(self):
+        def add_rows(n):
+            for _ in range(n):
+                Discussion.objects.create(
+                    discussion="Hi", lecture=self.lecture, student=self.new_user()
+                )
+
+        self.assertQueriesPerRequest(
+            2, f"/api/course/{self.course.pk}/lecture/1/", add_rows, self.student
+        )
+
+    def test_enrollments(self):
+        def add_rows(n):
+            for _ in range(n):
+                course = create_course(self.teacher)
+                course.instructors.add(self.new_user(role="TR"))
+                self.add_lecture(course)
+                Enroll.objects.create(student=self.student, course=course)
+
+        self.assertQueriesPerRequest(5, "/api/course/enroll/", add_rows, self.student)
+
+    def add_reviews(self, n):
+        for _ in range(n):
+            Review.objects.create(
+                review="Good", rating=4, owner=self.new_user(), course=self.course
+            )
+
+    def test_review_list(self):
+        self.assertQueriesPerRequest(
+            1, f"/api/course/{self.course.pk}/reviews/", self.add_reviews, self.student
+        )
+
+    def test_review_detail(self):
+        review = Review.objects.create(
+            review="Good", rating=4, owner=self.student, course=self.course
+        )
+        self.assertQueriesPerRequest(
+            1, f"/api/course/review/{review.pk}/", self.add_reviews, self.student
+        )
+
+    def test_discussion_list(self):
+        def add_rows(n):
+            for _ in range(n):
+                Discussion.objects.create(
+                    discussion="Hi", lecture=self.lecture, student=self.new_user()
+                )
+
+        self.assertQueriesPerRequest(
+            1, f"/api/course/{self.course.pk}/lecture/1/discussions/", add_rows
+        )
+
+    def test_discussion_thread(self):
+        post = Discussion.objects.create(
+            discussion="Hi", lecture=self.lecture, student=self.student
+        )
+
+        def add_rows(n):
+            for _ in range(n):
+                Discussion.objects.create(
+                    discussion="Re",
+                    lecture=self.lecture,
+                    student=self.new_user(),
+                    parent=post,
+                )
+
+        url = f"/api/course/{self.course.pk}/lecture/1/discussions/{post.pk}/"
+        self.assertQueriesPerRequest(1, url, add_rows)
+
+
+@override_settings(DISCUSSION_STREAM_KEEPALIVE=5, DISCUSSION_STREAM_MAX_AGE=30)
+class DiscussionStreamTests(TestCase):
+    subscribers = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        course = create_course(create_user("teacher", role="TR"))
+        cls.student = create_user("student")
+        cls.lecture = Lecture.objects.create(
+            title="Lecture 1",
+            lecture_url="https://example.com/lecture.mp4",
+            chapter=1,
+            course=course,
+        )
+        cls.url = f"/api/course/{course.pk}/lecture/1/discussions/stream/"
+
+    def setUp(self):
+        self.streams = []
+
+    async def asyncTearDown(self):
+        for stream in self.streams:
+            await stream.aclose()
+        self.assertEqual(discussion_broker.subscriber_count(self.lecture.pk), 0)
+
+    @sync_to_async
+    def post(self, text="Hi"):
+        return Discussion.objects.create(
+            discussion=text, lecture=self.lecture, student=self.student
+        )
+
+    async def subscribe(self, query="", headers=None):
+        response = await AsyncClient().get(self.url + query, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.streams.append(stream)
+        # The subscription is made when the stream starts
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+        return stream
+
+    async def event_ids(self, stream, count):
+        ids = []
+        for _ in range(count):
+            event = (await anext(stream)).decode()
+            self.assertTrue(event.startswith("id: "), event)
+            ids.append(int(event.split("\n", 1)[0][4:]))
+        return ids
+
+    async def test_events_reach_every_subscriber_in_order(self):
+        streams = [await self.subscribe() for _ in range(self.subscribers)]
+        self.assertEqual(
+            discussion_broker.subscriber_count(self.lecture.pk), self.subscribers
+        )
+
+        posts = [await self.post(f"Post {i}") for i in range(3)]
+        for post in posts:
+            discussion_broker.publish(post)
+
+        received = await asyncio.gather(*(self.event_ids(s, 3) for s in streams))
+        self.assertEqual(received, [[post.pk for post in posts]] * self.subscribers)
+
+    async def test_last_event_id_replays_missed_posts(self):
+        first, *missed = [await self.post(f"Post {i}") for i in range(3)]
+        for query, headers in (
+            ("", {"Last-Event-ID": str(first.pk)}),
+            (f"?last_event_id={first.pk}", None),
+        ):
+            with self.subTest(query=query, headers=headers):
+                stream = await self.subscribe(query, headers)
+                self.assertEqual(
+                    await self.event_ids(stream, 2), [post.pk for post in missed]
+                )
+
+    async def test_replayed_posts_are_not_sent_twice(self):
+        first = await self.post("First")
+        stream = await self.subscribe(headers={"Last-Event-ID": str(first.pk)})
+        # Published after the subscription, and found by the replay too
+        replayed = await self.post("Replayed")
+        discussion_broker.publish(replayed)
+        live = await self.post("Live")
+        discussion_broker.publish(live)
+
+        self.assertEqual(await self.event_ids(stream, 2), [replayed.pk, live.pk])
+
+    async def test_overflowing_subscriber_is_closed(self):
+        stream = await self.subscribe()
+        post = await self.post()
+        for _ in range(SUBSCRIBER_QUEUE_SIZE + 1):
+            discussion_broker.publish(post)
+
+        # Queued events are delivered, then the client has to reconnect
+        events = [event async for event in stream]
+        self.assertEqual(len(events), SUBSCRIBER_QUEUE_SIZE)
+
+    def test_wsgi_requests_are_refused(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 501)
@@ -1,13 +1,20 @@
 from django.urls import path
 from . import views
+from .streams import discussion_stream
 
 urlpatterns = [
     path("courses/", views.CourseListView.as_view(), name="course-list"),
+    path("courses/search/", views.CourseSearchView.as_view(), name="course-search"),
     path(
         "user/<str:username>/courses/",
         views.UserCourseListView.as_view(),
         name="my-courses",
     ),
+    path(
+        "user/<str:username>/analytics/",
+        views.InstructorAnalyticsView.as_view(),
+        name="instructor-analytics",
+    ),
     path("course/<int:pk>/", views.CourseDetailView.as_view()),
     path(
         "course/<int:course_id>/lectures/",
@@ -19,6 +26,16 @@ urlpatterns = [
         views.LectureDetailView.as_view(),
     ),
     path("course/enroll/", views.EnrollListView.as_view(), name="enroll"),
+    path(
+        "course/enroll/export/",
+        views.EnrollmentExportView.as_view(),
+        name="enrollments-export",
+    ),
+    path(
+        "course/<int:course_id>/enroll/bulk/",
+        views.BulkEnrollView.as_view(),
+        name="bulk-enroll",
+    ),
     path(
         "course/<int:course_id>/reviews/",
         views.ReviewListView.as_view(),
@@ -34,4 +51,14 @@ urlpatterns = [
         views.DiscussionListView.as_view(),
         name="discussion",
     ),
+    path(
+        "course/<int:course_id>/lecture/<int:chapter>/discussions/stream/",
+        discussion_stream,
+        name="discussion-stream",
+    ),
+    path(
+        "course/<int:course_id>/lecture/<int:chapter>/discussions/<int:pk>/",
+        views.DiscussionThreadView.as_view(),
+        name="discussion-thread",
+    ),
 ]
@@ -1,3 +1,8 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
 from .models import Enroll, User, Course
 from .serializers import EnrollmentNumberSerializer
 
@@ -22,3 +27,44 @@ def user_enrollment(user: User, course: Course) -> Enroll:
     except Exception as e:
         print(e)
         return None
+
+
+def course_version(course: Course, shape: str = "") -> str:
+    """
+    Returns a token that changes whenever the serialized course changes
+
+    Lecture and instructor changes touch Course.updated_at, while enrollment
+    and rating writes move the stored counters, so these four columns
+    cover every part of the payload.
+
+    Args:
+        course (Course): Accepts course object
+        shape (str): requested fields/expansions of the payload
+
+    Returns:
+        str: hex digest identifying the current course payload
+    """
+
+    raw = f"{course.pk}:{course.updated_at.isoformat()}:{course.enrollments_count}:{course.totalRatings}:{course.rating}:{shape}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_course_payload(course: Course, version: str, build) -> dict:
+    """
+    Returns the anonymous course payload, calling build() only on a cache miss
+
+    Args:
+        course (Course): Accepts course object
+        version (str): value of course_version(course)
+        build (callable): produces the serialized course
+
+    Returns:
+        dict: serialized course
+    """
+
+    key = f"course-detail:{course.pk}:{version}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, settings.COURSE_DETAIL_CACHE_TIMEOUT)
+    return payload
@@ -1,4 +1,6 @@
-from django.db.models import Count
+import csv
+from datetime import timedelta
+
 from rest_framework.generics import (
     ListCreateAPIView,
     RetrieveUpdateDestroyAPIView,
@@ -6,41 +8,89 @@ from rest_framework.generics import (
 )
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
 from rest_framework.request import Request
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import NotFound
+from django.db import transaction, IntegrityError
+from django.db.models import Subquery
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
 
 
 from gen.permissions import IsOwnerOrReadOnly, IsOwnerOnly
+from gen.exports import ExportView
+from gen.pagination import KeysetPagination, NewestFirstPagination
+from gen.prefetch import PrefetchPlanMixin
 from .permissions import (
     IsTeacherOrReadOnly,
     IsCourseOwnerOrInstructorsOnly,
     IsCourseOwnerOrInstructorsAndEnrolledStudentReadOnly,
     IsEnrolledStudentsOnly,
+    IsTeacherOrStaff,
+    IsAccountOwnerOrStaff,
 )
 from .serializers import (
     CourseSerializer,
+    CourseSummarySerializer,
     LectureSerializer,
     EnrollSerializer,
+    BulkEnrollSerializer,
     DiscussionSerializer,
     ReviewSerializer,
+    display_currency,
 )
 from .models import Course, Lecture, Enroll, Discussion, Review
 from user.models import CustomUser as User
-from rest_framework.pagination import CursorPagination
-
-from .utils import user_enrollment
+from rest_framework.pagination import LimitOffsetPagination
+
+from .utils import user_enrollment, course_version, cached_course_payload
+from .access import get_course_access, taught_courses
+from .analytics import instructor_analytics
+from .enrollments import enroll_students, read_student_csv
+from .exports import ENROLLMENT_COLUMNS, export_enrollments
+from .fx import rate_tables
+from .search import search_courses
+from .ratings import add_rating, change_rating, remove_rating
+
+DUPLICATE_CHAPTER_ERROR = (
+    "You can't have two letures with same chapter no. in a single course."
+)
 
 
-class MyCursorPagination(CursorPagination):
+class CoursePagination(KeysetPagination):
     page_size = 4
-    ordering = "enrollments"
+    orderings = {
+        "popular": ("-enrollments_count",),
+        "newest": ("-created_at",),
+        "rating": ("-rating",),
+    }
+    default_ordering = "popular"
+
+
+class LecturePagination(KeysetPagination):
+    orderings = {"chapter": ("chapter",)}
+    default_ordering = "chapter"
+
+
+class SearchPagination(LimitOffsetPagination):
+    default_limit = 12
+    max_limit = 48
 
 
-class CourseListView(ListCreateAPIView):
+class CourseListView(PrefetchPlanMixin, ListCreateAPIView):
     serializer_class = CourseSerializer
-    queryset = Course.objects.distinct("id")  # Ensure distinct courses
+    queryset = Course.objects.all()
     permission_classes = [IsTeacherOrReadOnly]
-    pagination_class = MyCursorPagination
+    pagination_class = CoursePagination
+
+    def get_serializer_class(self):
+        if self.request.method == "GET":
+            return CourseSummarySerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -48,37 +98,96 @@ class CourseListView(ListCreateAPIView):
         # filter course according to category
         category = self.request.query_params.get("category")
         if category:
-            queryset = queryset.filter(category__icontains=category)
+            queryset = queryset.filter(category=category.upper())
 
-        # search course title
+        # search course title, description, outcomes and languages
         q = self.request.query_params.get("q")
         if q:
-            queryset = queryset.filter(title__icontains=q)
+            matches = search_courses(Course.objects.all(), q).values("pk")
+            queryset = queryset.filter(pk__in=matches)
 
-        return queryset.annotate(enrollments_count=Count("enrollments")).distinct()
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
 
-class CourseDetailView(RetrieveUpdateDestroyAPIView):
+class CourseSearchView(PrefetchPlanMixin, ListAPIView):
+    """
+    Courses matching ?q=, best match first
+    """
+
+    serializer_class = CourseSummarySerializer
+    queryset = Course.objects.all()
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        category = self.request.query_params.get("category")
+        if category:
+            queryset = queryset.filter(category=category.upper())
+
+        q = self.request.query_params.get("q", "").strip()
+        if not q:
+            return queryset.none()
+
+        return search_courses(queryset, q)
+
+
+class CourseDetailView(PrefetchPlanMixin, RetrieveUpdateDestroyAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [IsOwnerOrReadOnly]
 
     def retrieve(self, request, *args, **kwargs):
-        course = self.get_object()
-        serializer = self.get_serializer(course)
+        # Only the columns needed to validate the cache, the full course
+        # is loaded when the payload has to be serialized again
+        course = get_object_or_404(
+            Course.objects.only(
+                "pk", "owner", "updated_at", "enrollments_count", "rating", "totalRatings"
+            ),
+            pk=self.kwargs["pk"],
+        )
+        self.check_object_permissions(request, course)
+
         enrollment = None
         if request.user.is_authenticated:
             enrollment = user_enrollment(request.user, course)
-        return Response(
-            {"course": serializer.data, "enrollment": enrollment},
-            status=status.HTTP_200_OK,
+
+        # ?fields=, ?expand= and ?currency= change the payload, so they are
+        # part of its version, with the exchange rates used
+        currency = display_currency({"request": request})
+        shape = "{}|{}|{}|{}".format(
+            request.query_params.get("fields", ""),
+            request.query_params.get("expand", ""),
+            currency or "",
+            rate_tables.get().version if currency else "",
         )
+        version = course_version(course, shape)
+        enrollment_no = enrollment["enrollment_no"] if enrollment else "-"
+        etag = quote_etag(f"{version}-{enrollment_no}")
+
+        # No Last-Modified: rating changes and unenrollments change the
+        # payload without a later date, only the ETag follows them
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            payload = cached_course_payload(
+                course,
+                version,
+                lambda: self.get_serializer(self.get_object()).data,
+            )
+            response = Response(
+                {"course": payload, "enrollment": enrollment},
+                status=status.HTTP_200_OK,
+            )
+
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Authorization", "Cookie"))
+        return response
 
 
-class UserCourseListView(ListAPIView):
+class UserCourseListView(PrefetchPlanMixin, ListAPIView):
     serializer_class = CourseSerializer
     permission_classes = [IsOwnerOnly]
 
@@ -99,7 +208,7 @@ class UserCourseListView(ListAPIView):
                 data={"detail": f"User doesn't exist with the username '{username}'."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        elif not queryset:
+        elif not queryset.exists():
             return Response(
                 data={
                     "detail": "Didn't find any course with the username '{username}'."
@@ -107,6 +216,7 @@ class UserCourseListView(ListAPIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        queryset = self.filter_queryset(queryset)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -116,42 +226,80 @@ class UserCourseListView(ListAPIView):
         return Response(serializer.data)
 
 
+class InstructorAnalyticsView(APIView):
+    """
+    Daily enrollments, revenue, ratings and discussions of a user's courses,
+    read from the rollups kept by the rollup_analytics command. ?since= and
+    ?until= are ISO dates, the last 30 days by default.
+    """
+
+    permission_classes = [IsAccountOwnerOrStaff]
+    max_days = 366
+
+    def get_date(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"'{value}' is not an ISO date.")
+        return day
+
+    def get(self, request, username, format=None):
+        owner = get_object_or_404(User, username=username)
+
+        try:
+            until = self.get_date("until", timezone.now().date())
+            since = self.get_date("since", until - timedelta(days=29))
+            course_id = int(request.query_params.get("course", 0))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if since > until or (until - since).days >= self.max_days:
+            return Response(
+                {"error": f"Choose a range of 1 to {self.max_days} days."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            instructor_analytics(owner, since, until, course_id),
+            status=status.HTTP_200_OK,
+        )
+
+
 class LectureListView(ListCreateAPIView):
     serializer_class = LectureSerializer
     permission_classes = [IsCourseOwnerOrInstructorsOnly]
+    pagination_class = LecturePagination
 
     def get_queryset(self):
         course_id = self.kwargs.get("course_id")
         return Lecture.objects.filter(course_id=course_id)
 
     def create(self, request, *args, **kwargs):
-        course_id = self.kwargs.get("course_id")
         chapter = request.data.get("chapter")
 
+        if int(chapter) < 0:
+            return Response(
+                {"error": "Chapter no. should be positive"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
-            if int(chapter) < 0:
-                return Response(
-                    {"error": "Chapter no. should be positive"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            if Lecture.objects.filter(course=course_id, chapter=chapter).exists():
-                return Response(
-                    {
-                        "error": "You can't have two letures with same chapter no. in a single course."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            else:
+            # The (course, chapter) unique constraint rejects duplicates
+            with transaction.atomic():
                 return super().create(request, *args, **kwargs)
-        except Lecture.DoesNotExist:
-            pass
+        except IntegrityError:
+            return Response(
+                {"error": DUPLICATE_CHAPTER_ERROR},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
     def perform_create(self, serializer):
         course_id = self.kwargs.get("course_id")
-        try:
-            course = Course.objects.get(pk=course_id)
+        course = get_course_access(self.request, course_id).course
+        if course:
             serializer.save(course=course)
-        except Course.DoesNotExist:
+        else:
             return Response(
                 {"error": f"No Course Associated with id {course_id}"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -169,8 +317,18 @@ class LectureDetailView(RetrieveUpdateDestroyAPIView):
         course_id = self.kwargs.get("course_id")
         return Lecture.objects.filter(course=course_id, chapter=chapter).first()
 
+    def update(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except IntegrityError:
+            return Response(
+                {"error": DUPLICATE_CHAPTER_ERROR},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
 
-class EnrollListView(ListCreateAPIView):
+class EnrollListView(PrefetchPlanMixin, ListCreateAPIView):
     serializer_class = EnrollSerializer
     permission_classes = [IsAuthenticated]
 
@@ -180,71 +338,182 @@ class EnrollListView(ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         pk = request.data.get("course")
         try:
-            course = Course.objects.get(pk=pk)
-            if Enroll.objects.get(student=self.request.user, course=course):
-                return Response(
-                    {"error": "Already Enrolled in this course."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        except Course.DoesNotExist:
+            self.course = Course.objects.get(pk=pk)
+            # The (student, course) unique constraint rejects duplicates
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except (Course.DoesNotExist, ValueError):
             return Response(
                 {"error": f"No course is associated with id {pk}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        except Enroll.DoesNotExist:
-            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            return Response(
+                {"error": "Already Enrolled in this course."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
     def perform_create(self, serializer):
-        pk = self.request.data.get("course")
-        course = Course.objects.get(pk=pk)
-        serializer.save(student=self.request.user, course=course)
+        serializer.save(student=self.request.user, course=self.course)
+
+
+class BulkEnrollView(APIView):
+    """
+    Enroll a cohort of students into a course from a CSV or a list of emails
+    """
+
+    permission_classes = [IsCourseOwnerOrInstructorsOnly]
+
+    def post(self, request, course_id, format=None):
+        serializer = BulkEnrollSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        emails = list(serializer.validated_data.get("students", []))
+        file = serializer.validated_data.get("file")
+        if file:
+            try:
+                emails += read_student_csv(file)
+            except (UnicodeDecodeError, csv.Error) as e:
+                return Response(
+                    {"error": f"Couldn't read the CSV file: {e}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        course = get_course_access(request, course_id).course
+        return Response(enroll_students(course, emails), status=status.HTTP_200_OK)
+
 
+class EnrollmentExportView(ExportView):
+    """
+    Streams enrollments as CSV or NDJSON. Staff export every enrollment,
+    teachers the enrollments of the courses they own or instruct.
+    """
+
+    permission_classes = [IsTeacherOrStaff]
+    columns = ENROLLMENT_COLUMNS
+    filename = "enrollments"
+    filters = ("course",)
+
+    def get_queryset(self, **filters):
+        queryset = export_enrollments(**filters)
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(course__in=taught_courses(self.request.user))
+        return queryset
+
+
+class ThreadPagination(KeysetPagination):
+    page_size = 100
+    orderings = {"thread": ("path",)}
+    default_ordering = "thread"
+
+
+def lecture_discussions(course_id, chapter):
+    """
+    Discussions of a lecture, matched through the lecture's (course, chapter)
+    key in the same query instead of looking the lecture up first
+    """
+
+    return Discussion.objects.filter(
+        lecture__course_id=course_id, lecture__chapter=chapter
+    )
+
+
+class DiscussionListView(PrefetchPlanMixin, ListCreateAPIView):
+    """
+    First posts of the lecture's threads, newest first. POST with a
+    ``parent`` to reply to a post.
+    """
 
-class DiscussionListView(ListCreateAPIView):
     serializer_class = DiscussionSerializer
     queryset = Discussion.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = NewestFirstPagination
 
     def get_queryset(self):
-        course_id = self.kwargs.get("course_id")
-        chapter = self.kwargs.get("chapter")
-        lecture = Lecture.objects.filter(course_id=course_id, chapter=chapter).first()
-        return Discussion.objects.filter(lecture=lecture)
+        return lecture_discussions(
+            self.kwargs.get("course_id"), self.kwargs.get("chapter")
+        ).filter(parent__isnull=True)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if not kwargs.get("many"):
+            # Replies answer a post under the same lecture
+            serializer.fields["parent"].queryset = lecture_discussions(
+                self.kwargs.get("course_id"), self.kwargs.get("chapter")
+            ).only("pk", "lecture_id", "thread_id", "path", "depth")
+        return serializer
 
     def perform_create(self, serializer):
-        course_id = self.kwargs.get("course_id")
-        chapter = self.kwargs.get("chapter")
-        lecture = Lecture.objects.filter(course_id=course_id, chapter=chapter).first()
-        if lecture:
-            serializer.save(lecture=lecture, student=self.request.user)
+        parent = serializer.validated_data.get("parent")
+        if parent is not None:
+            lecture_id = parent.lecture_id
+        else:
+            lecture_id = (
+                Lecture.objects.filter(
+                    course_id=self.kwargs.get("course_id"),
+                    chapter=self.kwargs.get("chapter"),
+                )
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if lecture_id is None:
+                raise NotFound("No data found with provided info.")
+
+        serializer.save(lecture_id=lecture_id, student=self.request.user)
 
-        return Response(
-            data={"error": "No data found with provided info."},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
 
+class DiscussionThreadView(PrefetchPlanMixin, ListAPIView):
+    """
+    The whole thread of a discussion in one query on the (thread, path)
+    index, every reply right after the post it answers
+    """
+
+    serializer_class = DiscussionSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ThreadPagination
 
-class ReviewListView(ListCreateAPIView):
+    def get_queryset(self):
+        thread = Discussion.objects.filter(pk=self.kwargs.get("pk")).values("thread_id")
+        return lecture_discussions(
+            self.kwargs.get("course_id"), self.kwargs.get("chapter")
+        ).filter(thread_id=Subquery(thread[:1]))
+
+
+class ReviewListView(PrefetchPlanMixin, ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [IsEnrolledStudentsOnly]
+    pagination_class = NewestFirstPagination
 
     def get_queryset(self):
         course = self.kwargs.get("course_id")
-        return Review.objects.filter(course=course).order_by("-created_at")
+        return Review.objects.filter(course=course)
 
     def perform_create(self, serializer):
         course_id = self.kwargs.get("course_id")
-        try:
-            course = Course.objects.get(pk=course_id)
-            serializer.save(course=course, owner=self.request.user)
-        except Course.DoesNotExist:
+        course = get_course_access(self.request, course_id).course
+        if course:
+            with transaction.atomic():
+                review = serializer.save(course=course, owner=self.request.user)
+                add_rating(course.pk, review.rating)
+        else:
             return Response(
                 {"error": f"No Course Associated with id {course_id}"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
 
-class ReviewDetailView(RetrieveUpdateDestroyAPIView):
+class ReviewDetailView(PrefetchPlanMixin, RetrieveUpdateDestroyAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [IsOwnerOnly]
     queryset = Review.objects.all()
+
+    def perform_update(self, serializer):
+        old_rating = serializer.instance.rating
+        with transaction.atomic():
+            review = serializer.save()
+            change_rating(review.course_id, old_rating, review.rating)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            remove_rating(instance.course_id, instance.rating)
@@ -14,6 +14,11 @@ class AccountAdapter(DefaultAccountAdapter):
         )
         return f"{frontend_domain}/verify-email/{key}/"
 
+    def populate_username(self, request, user):
+        # Leave it blank, CustomUser.save allocates a unique one without
+        # probing each candidate
+        pass
+
     def get_password_reset_url(self, request=None, **kwargs):
         # Get the frontend domain from the request or set your default domain here
         print("running...")
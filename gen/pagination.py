@@ -0,0 +1,214 @@
+from collections import OrderedDict
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks to the last row of the previous page.
+
+    Rows are ordered by the sort key of the selected ordering followed by the
+    primary key, so every row has a distinct position and a page costs one
+    index range scan however deep the client pages. Cursors are signed and
+    carry the sort values of the boundary row.
+
+    ``?ordering=`` picks one of ``orderings``, e.g.
+    ``orderings = {"newest": ("-created_at",), "rating": ("-rating",)}``.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    orderings = {"newest": ("-pk",)}
+    default_ordering = "newest"
+    invalid_cursor_message = _("Invalid cursor")
+    salt = "gen.pagination.KeysetPagination"
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering_name(self, request):
+        name = request.query_params.get(self.ordering_query_param)
+        return name if name in self.orderings else self.default_ordering
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Returns the order_by() fields of the selected ordering, ending with
+        the primary key
+        """
+
+        pk = queryset.model._meta.pk.name
+        fields = tuple(
+            field.replace("pk", pk) if field.lstrip("-") == "pk" else field
+            for field in self.orderings[self.get_ordering_name(request)]
+        )
+        if fields[-1].lstrip("-") != pk:
+            fields += (f"-{pk}" if fields[-1].startswith("-") else pk,)
+        return fields
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering_name = self.get_ordering_name(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor["reverse"]
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(_flip(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.seek(ordering, cursor["values"]))
+
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def seek(self, ordering, values):
+        """
+        Rows strictly after ``values`` in ``ordering``, i.e. the expansion of
+        the row comparison (a, b) > (x, y) into a > x OR (a = x AND b > y)
+        """
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_model_field(self, field):
+        return self.model._meta.get_field(field.lstrip("-"))
+
+    def encode_cursor(self, row, reverse):
+        values = [
+            self.get_model_field(field).value_to_string(row) for field in self.ordering
+        ]
+        payload = {"o": self.ordering_name, "v": values, "r": reverse}
+        token = signing.dumps(payload, salt=self.salt, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            payload = signing.loads(token, salt=self.salt)
+            if payload["o"] != self.ordering_name or len(payload["v"]) != len(
+                self.ordering
+            ):
+                raise ValueError
+            values = [
+                self.get_model_field(field).to_python(value)
+                for field, value in zip(self.ordering, payload["v"])
+            ]
+            return {"values": values, "reverse": bool(payload["r"])}
+        except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError):
+            raise ParseError(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.ordering_query_param,
+                "required": False,
+                "in": "query",
+                "description": "One of: " + ", ".join(self.orderings),
+                "schema": {"type": "string", "enum": list(self.orderings)},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class NewestFirstPagination(KeysetPagination):
+    """
+    Keyset pagination over ``created_at``, newest first
+    """
+
+    orderings = {"newest": ("-created_at",)}
+
+
+def _flip(field):
+    return field[1:] if field.startswith("-") else f"-{field}"
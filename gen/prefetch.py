@@ -0,0 +1,200 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class QueryPlan:
+    """
+    Related lookups and columns needed to serialize rows of a model
+    """
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+        # None once a field reads something we can't map to a column
+        self.only = []
+
+    def restrict(self, *names):
+        if self.only is not None:
+            self.only.extend(names)
+
+    def apply(self, queryset, extra_only=()):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only is not None:
+            queryset = queryset.only(*self.only, *extra_only)
+        return queryset
+
+
+def _prefixed(prefix, lookup):
+    return f"{prefix}{LOOKUP_SEP}{lookup}"
+
+
+def _forward_column_path(model, attrs):
+    """
+    Returns ``attrs`` if they follow forward relations to a plain column
+    """
+
+    for i, name in enumerate(attrs):
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        last = i == len(attrs) - 1
+        if last:
+            return None if model_field.is_relation else attrs
+        if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+            return None
+        model = model_field.related_model
+
+
+def get_query_plan(serializer, model):
+    """
+    Work out the related lookups and columns needed to serialize ``model``
+    instances with ``serializer`` without issuing a query per row.
+
+    Relations rendered as lists are prefetched with their own planned
+    querysets, so nested serializers only read the columns they render too.
+
+    Args:
+        serializer (Serializer): serializer class or instance to inspect
+        model (Model): model class the serializer reads from
+
+    Returns:
+        QueryPlan: select_related/prefetch_related lookups and only() columns
+    """
+
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    plan = QueryPlan()
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if len(field.source_attrs) > 1:
+            # e.g. source="student.username" reads a column across relations
+            path = _forward_column_path(model, field.source_attrs)
+            if path is None:
+                plan.only = None
+            else:
+                plan.select_related.append(LOOKUP_SEP.join(path[:-1]))
+                plan.restrict(*(LOOKUP_SEP.join(path[:i]) for i in range(1, len(path) + 1)))
+            continue
+
+        if getattr(field, "source_columns", None) is not None:
+            # Fields reading the whole row may name the columns they use
+            plan.restrict(*field.source_columns)
+            continue
+
+        if not field.source_attrs:
+            plan.only = None
+            continue
+
+        name = field.source_attrs[0]
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Properties, methods and SerializerMethodFields may read anything
+            plan.only = None
+            continue
+
+        if not model_field.is_relation:
+            plan.restrict(name)
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            nested = field.child
+        elif isinstance(field, serializers.BaseSerializer):
+            nested = field
+        elif isinstance(field, serializers.ManyRelatedField):
+            nested = None
+        elif isinstance(field, serializers.RelatedField):
+            # Primary keys of forward relations are read from the row itself
+            if field.use_pk_only_optimization() and model_field.concrete:
+                plan.restrict(name)
+                continue
+            nested = None
+        else:
+            plan.only = None
+            continue
+
+        related_model = model_field.related_model
+        many = model_field.many_to_many or model_field.one_to_many
+
+        if many or not model_field.concrete:
+            # Rows of the related model are matched back to ours by their
+            # foreign key, which must survive only()
+            extra_only = []
+            if model_field.one_to_many or model_field.one_to_one:
+                extra_only.append(model_field.field.name)
+
+            if nested is None:
+                related = related_model.objects.only("pk", *extra_only)
+            else:
+                related = get_query_plan(nested, related_model).apply(
+                    related_model.objects.all(), extra_only
+                )
+            plan.prefetch_related.append(Prefetch(name, queryset=related))
+            continue
+
+        plan.select_related.append(name)
+        if nested is None:
+            plan.only = None
+            continue
+
+        nested_plan = get_query_plan(nested, related_model)
+        plan.select_related.extend(
+            _prefixed(name, lookup) for lookup in nested_plan.select_related
+        )
+        plan.prefetch_related.extend(
+            Prefetch(_prefixed(name, lookup.prefetch_through), queryset=lookup.queryset)
+            for lookup in nested_plan.prefetch_related
+        )
+        if nested_plan.only is None:
+            plan.only = None
+        else:
+            plan.restrict(name, *(_prefixed(name, column) for column in nested_plan.only))
+
+    return plan
+
+
+def plan_queryset(queryset, serializer, extra_only=()):
+    """
+    Apply the select_related/prefetch_related/only calls required by
+    ``serializer``. ``extra_only`` names columns read outside the serializer,
+    e.g. pagination ordering.
+    """
+
+    return get_query_plan(serializer, queryset.model).apply(queryset, extra_only)
+
+
+class PrefetchPlanMixin:
+    """
+    Load every relation the view's serializer renders up front and, on
+    reads, only the columns it renders, so list endpoints cost a fixed number
+    of queries per page.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        paginator = self.paginator
+        if hasattr(paginator, "get_ordering"):
+            ordering = paginator.get_ordering(self.request, queryset, self)
+        else:
+            ordering = getattr(paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        extra_only = [field.lstrip("-") for field in ordering]
+
+        plan = get_query_plan(self.get_serializer(), queryset.model)
+        if self.request.method not in SAFE_METHODS:
+            # save() writes back only the columns that were loaded, auto_now
+            # ones included, so writes need the whole row
+            plan.only = None
+        return plan.apply(queryset, extra_only)
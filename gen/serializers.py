@@ -0,0 +1,67 @@
+from rest_framework import serializers
+
+
+def parse_field_tree(value):
+    """
+    Turn "a,b.c,b.d" into {"a": {}, "b": {"c": {}, "d": {}}}
+    """
+
+    tree = {}
+    for path in (value or "").split(","):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients shape a serializer's output from the query string.
+
+    ``?fields=title,owner.username`` keeps only the listed fields, dotted
+    names restrict nested serializers. ``?expand=lectures`` replaces the
+    relations listed in ``Meta.expandable_fields`` with nested serializers,
+    e.g. ``expandable_fields = {"lectures": (LectureSerializer, {"many": True})}``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._field_tree = kwargs.pop("fields", None)
+        self._expand_tree = kwargs.pop("expand", None)
+        super().__init__(*args, **kwargs)
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def _get_trees(self):
+        field_tree, expand_tree = self._field_tree, self._expand_tree
+        request = self.context.get("request")
+        if request is not None and self._is_root():
+            if field_tree is None:
+                field_tree = parse_field_tree(request.query_params.get("fields"))
+            if expand_tree is None:
+                expand_tree = parse_field_tree(request.query_params.get("expand"))
+        return field_tree or {}, expand_tree or {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        field_tree, expand_tree = self._get_trees()
+
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        for name, (serializer_class, kwargs) in expandable.items():
+            if name in expand_tree:
+                fields[name] = serializer_class(read_only=True, **kwargs)
+
+        if field_tree:
+            for name in set(fields) - set(field_tree):
+                fields.pop(name)
+
+        for name, field in fields.items():
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, DynamicFieldsMixin):
+                nested._field_tree = field_tree.get(name) or {}
+                nested._expand_tree = expand_tree.get(name) or {}
+
+        return fields
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",
+    "django.contrib.postgres",
     # APPLICATIONS
     "user",
     "course",
@@ -119,6 +120,39 @@ DATABASES = {
 #     },
 # }
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Seconds a user's owner/instructor/enrolled status for a course stays cached
+COURSE_ACCESS_CACHE_TIMEOUT = 60 * 5
+
+# Seconds a serialized course detail payload stays cached
+COURSE_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# Key of the permutation that turns enrollment sequence values into
+# enrollment numbers. Never change it once enrollments exist.
+ENROLLMENT_NUMBER_KEY = env("ENROLLMENT_NUMBER_KEY", "gen-enrollment-numbers")
+
+# Seconds a row must have existed before the analytics rollup counts it, so
+# rows of transactions still in flight are not skipped by the watermark.
+# This assumes transactions writing enrollments, payments, reviews and
+# discussions commit within the lag. Rows committed later are picked up by
+# the reconcile pass over the last ANALYTICS_RECONCILE_DAYS days, older
+# ones only by rollup_analytics --rebuild.
+ANALYTICS_ROLLUP_LAG = 60
+ANALYTICS_RECONCILE_DAYS = 2
+
+# Seconds between keep-alive comments on an idle discussion event stream,
+# and seconds after which a stream ends and the client reconnects
+DISCUSSION_STREAM_KEEPALIVE = 15
+DISCUSSION_STREAM_MAX_AGE = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -185,6 +219,7 @@ REST_AUTH = {
     "JWT_AUTH_HTTPONLY": False,
     "JWT_AUTH_RETURN_EXPIRATION": True,
     "JWT_AUTH_SAMESITE": None,
+    "JWT_TOKEN_CLAIMS_SERIALIZER": "user.serializers.TokenClaimsSerializer",
 }
 
 # CSRF_TRUSTED_ORIGINS = ["http://localhost:5173"]
@@ -208,20 +243,25 @@ EMAIL_PORT = env("EMAIL_PORT")
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "dj_rest_auth.jwt_auth.JWTCookieAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Reads the header and the cookie, no user query for tokens
+        # carrying claims
+        "user.authentication.ClaimsJWTAuthentication",
         # "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "gen.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
 }
 
 SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=21),
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenClaimsSerializer",
 }
 
+# Seconds between reads of the token revocations, see user.claims
+JWT_REVOCATION_REFRESH = 30
+
 
 CORS_ALLOW_CREDENTIALS: bool = True
 CORS_ALLOW_ALL_ORIGINS: bool = True
@@ -238,3 +278,29 @@ AUTHENTICATION_BACKENDS = [
 STRIPE_PUBLISHABLE_KEY = env("STRIPE_PUBLISHABLE_KEY")
 STRIPE_SECRET_KEY = env("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = env("STRIPE_WEBHOOK_SECRET")
+# Point at a local fake such as stripe-mock for development
+STRIPE_API_BASE = env("STRIPE_API_BASE", "https://api.stripe.com")
+
+# Stripe API client, see payments.gateway
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_READ_TIMEOUT = 10
+STRIPE_MAX_RETRIES = 2
+# Pooled connections kept alive, at least the number of worker threads
+STRIPE_POOL_SIZE = 10
+# Consecutive outages opening the circuit breaker, and seconds it stays open
+STRIPE_BREAKER_THRESHOLD = 5
+STRIPE_BREAKER_RESET = 30
+# Exchange rates for display prices, see course.fx
+FX_RATES_FILE = env("FX_RATES_FILE", BASE_DIR / "course" / "fx_rates.json")
+# Seconds the rates are kept in memory before the file is read again
+FX_RATES_TTL = 60 * 60
+
+# Open checkout sessions are reused while they have this many seconds left
+CHECKOUT_SESSION_REUSE_MARGIN = 60 * 10
+
+# Webhook inbox, see payments.inbox
+WEBHOOK_MAX_ATTEMPTS = 8
+# Seconds before the first retry, doubled on each further attempt
+WEBHOOK_RETRY_BASE_DELAY = 30
+# Seconds a worker owns a claimed event before others may take it over
+WEBHOOK_LEASE_SECONDS = 60 * 5
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from course.models import Course
+from user.models import CustomUser
+
+
+def create_user(name, role="ST"):
+    return CustomUser.objects.create_user(
+        email=f"{name}@example.com", password="password", role=role, first_name=name
+    )
+
+
+def create_course(owner, **fields):
+    fields = {
+        "title": "Python",
+        "description": "Python basics",
+        "outcomes": "Python",
+        "price": 10,
+        "cover_img": "https://example.com/cover.png",
+        "languages": "English",
+        **fields,
+    }
+    return Course.objects.create(owner=owner, **fields)
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Checks that endpoints cost a fixed number of queries, however many rows
+    they render
+    """
+
+    row_counts = (2, 5)
+
+    def assertQueriesPerRequest(self, num, url, add_rows, user=None):
+        """
+        GET ``url`` as ``user`` once ``add_rows(n)`` has added n rows to
+        reach each of ``row_counts``, and expect ``num`` queries every time.
+        Caches are cleared first, so each request is a cold one.
+        """
+
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+
+        rows = 0
+        for count in self.row_counts:
+            add_rows(count - rows)
+            rows = count
+            cache.clear()
+            with self.subTest(url=url, rows=count), self.assertNumQueries(num):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
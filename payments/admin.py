@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment
+from .models import CatalogEntry, CheckoutSession, Payment, WebhookEvent
 
 # Register your models here.
 
@@ -9,3 +9,26 @@ class PaymentsAdmin(admin.ModelAdmin):
     list_display = ("pk", "transaction_id", "enrollment", "currency", "amount")
     list_display_links = ("pk", "transaction_id")
     search_fields = ("transaction_id", "enrollment__enrollment_no")
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("pk", "event_id", "event_type", "status", "attempts", "created_at")
+    list_display_links = ("pk", "event_id")
+    list_filter = ("status", "event_type")
+    search_fields = ("event_id",)
+
+
+@admin.register(CheckoutSession)
+class CheckoutSessionAdmin(admin.ModelAdmin):
+    list_display = ("pk", "session_id", "user", "course", "status", "expires_at")
+    list_display_links = ("pk", "session_id")
+    list_filter = ("status",)
+    search_fields = ("session_id",)
+
+
+@admin.register(CatalogEntry)
+class CatalogEntryAdmin(admin.ModelAdmin):
+    list_display = ("pk", "course", "product_id", "price_id", "synced_at")
+    list_display_links = ("pk", "course")
+    search_fields = ("product_id", "price_id", "course__title")
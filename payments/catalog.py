@@ -0,0 +1,138 @@
+import hashlib
+import logging
+from decimal import ROUND_HALF_UP, Decimal
+
+from moneyed import get_currency
+
+from course.models import Course
+
+from .gateway import stripe_gateway
+from .models import CatalogEntry
+
+logger = logging.getLogger(__name__)
+
+
+def unit_amount(course) -> int:
+    """
+    Course price in the currency's smallest unit, as Stripe takes it. That
+    is cents for USD, but yen for zero-decimal currencies like JPY.
+    """
+
+    amount = course.price * get_currency(course.currency).sub_unit
+    return int(amount.to_integral_value(ROUND_HALF_UP))
+
+
+def from_unit_amount(amount, currency) -> Decimal:
+    """
+    Inverse of unit_amount, ``amount`` of a Stripe object in ``currency``
+    """
+
+    return Decimal(amount) / get_currency(currency.upper()).sub_unit
+
+
+def catalog_fingerprint(course) -> str:
+    """
+    Hash of the course fields that make up its Stripe product and price
+    """
+
+    key = f"{unit_amount(course)}|{course.currency}|{course.title}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def catalog_price_id(course):
+    """
+    Id of the Stripe price mirroring ``course``, None until the sync has
+    caught up with its last change
+    """
+
+    entry = CatalogEntry.objects.filter(course=course).first()
+    if entry is None or entry.fingerprint != catalog_fingerprint(course):
+        return None
+    return entry.price_id
+
+
+def _product_data(course):
+    return {
+        "name": course.title,
+        "description": course.description,
+        "images": [course.cover_img],
+        "metadata": {"course_id": course.pk},
+    }
+
+
+def sync_course(course, entry=None):
+    """
+    Create or update the Stripe product and price of ``course``.
+
+    Prices can't be changed on Stripe, a new price replaces the old one
+    when the amount or currency changed. Creates carry idempotency keys, so
+    a sync interrupted before saving the entry doesn't duplicate anything
+    when run again.
+
+    Returns:
+        CatalogEntry: the saved entry
+    """
+
+    fingerprint = catalog_fingerprint(course)
+    amount = unit_amount(course)
+
+    if entry is None:
+        product = stripe_gateway.create_product(
+            idempotency_key=f"catalog-product-{course.pk}", **_product_data(course)
+        )
+        entry = CatalogEntry(course=course, product_id=product["id"])
+    else:
+        stripe_gateway.update_product(entry.product_id, **_product_data(course))
+
+    if entry.pk is None or (entry.unit_amount, entry.currency) != (
+        amount,
+        course.currency,
+    ):
+        # Keyed on the replaced price too, going back to an earlier price
+        # must not get the deactivated one
+        price = stripe_gateway.create_price(
+            idempotency_key=f"catalog-price-{course.pk}-{entry.price_id}-{fingerprint}",
+            product=entry.product_id,
+            unit_amount=amount,
+            currency=course.currency,
+        )
+        if entry.pk is not None:
+            stripe_gateway.deactivate_price(entry.price_id)
+        entry.price_id = price["id"]
+        entry.unit_amount = amount
+        entry.currency = course.currency
+
+    entry.fingerprint = fingerprint
+    entry.save()
+    return entry
+
+
+def sync_catalog(course_ids=None) -> dict:
+    """
+    Sync every course whose catalog entry is missing or out of date
+
+    Args:
+        course_ids (list): only these courses
+
+    Returns:
+        dict: number of courses synced and failed
+    """
+
+    courses = Course.objects.select_related("catalog_entry")
+    if course_ids:
+        courses = courses.filter(pk__in=course_ids)
+
+    synced = failed = 0
+    for course in courses.order_by("pk").iterator(chunk_size=500):
+        entry = getattr(course, "catalog_entry", None)
+        if entry is not None and entry.fingerprint == catalog_fingerprint(course):
+            continue
+        try:
+            sync_course(course, entry)
+        except Exception as e:
+            # The next run tries again, checkout uses inline prices until then
+            logger.error(f"Failed to sync course {course.pk} to Stripe: {e}")
+            failed += 1
+        else:
+            synced += 1
+    return {"synced": synced, "failed": failed}
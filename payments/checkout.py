@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CheckoutSession, CheckoutSessionStatus
+
+
+def reusable_checkout_session(user, course):
+    """
+    Open checkout session of ``user`` for ``course`` at its current price
+    that still leaves time to pay, if there is one
+
+    Returns:
+        CheckoutSession: the session expiring last, or None
+    """
+
+    usable_until = timezone.now() + timedelta(
+        seconds=settings.CHECKOUT_SESSION_REUSE_MARGIN
+    )
+    return (
+        CheckoutSession.objects.filter(
+            user=user,
+            course=course,
+            status=CheckoutSessionStatus.OPEN,
+            expires_at__gt=usable_until,
+            amount=course.price,
+            currency=course.currency,
+        )
+        .order_by("-expires_at")
+        .first()
+    )
+
+
+def record_checkout_session(session, user, course):
+    """
+    Keep a session just created with Stripe for reuse
+
+    Args:
+        session (stripe.checkout.Session): session returned by Stripe
+    """
+
+    return CheckoutSession.objects.create(
+        session_id=session["id"],
+        user=user,
+        course=course,
+        amount=course.price,
+        currency=course.currency,
+        url=session.get("url") or "",
+        expires_at=datetime.fromtimestamp(session["expires_at"], tz=dt_timezone.utc),
+    )
+
+
+def set_checkout_sessions_status(session_ids, status):
+    CheckoutSession.objects.filter(session_id__in=session_ids).update(status=status)
@@ -0,0 +1,42 @@
+from .models import Payment
+
+PAYMENT_COLUMNS = (
+    ("id", "pk"),
+    ("transaction_id", "transaction_id"),
+    ("session_id", "session_id"),
+    ("status", "payment_status"),
+    ("amount", "amount"),
+    ("currency", "currency"),
+    ("created_at", "created_at"),
+    ("user_id", "user_id"),
+    ("user_email", "user__email"),
+    ("course_id", "course_id"),
+    ("course_title", "course__title"),
+    ("enrollment_no", "enrollment__enrollment_no"),
+)
+
+
+def export_payments(course=None, status=None, since=None, until=None):
+    """
+    Payments to export, oldest first
+
+    Args:
+        course (int): only payments for this course
+        status (str): only payments with this payment_status
+        since (datetime): only payments made at or after this moment
+        until (datetime): only payments made before this moment
+
+    Returns:
+        QuerySet: payments to be read with PAYMENT_COLUMNS
+    """
+
+    queryset = Payment.objects.all()
+    if course:
+        queryset = queryset.filter(course_id=int(course))
+    if status:
+        queryset = queryset.filter(payment_status=status)
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset.order_by("pk")
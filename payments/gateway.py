@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning Stripe is unreachable or failing, as opposed to Stripe
+# answering that the request itself is wrong
+OUTAGE_ERRORS = (stripe.error.APIConnectionError, stripe.error.APIError)
+
+# Seconds to wait for the answer to a read only call, the client can simply
+# ask again
+LOOKUP_READ_TIMEOUT = 5
+
+
+class GatewayUnavailable(stripe.error.APIConnectionError):
+    """
+    Raised without calling Stripe while the circuit breaker is open
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Payments are temporarily unavailable, try again shortly.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops calling Stripe after ``failure_threshold`` outages in a row.
+
+    Once open, calls fail fast with GatewayUnavailable for ``reset_timeout``
+    seconds, then a single call is let through as a probe: its success
+    closes the breaker, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+                retry_after = self.reset_timeout
+                if state == self.OPEN:
+                    retry_after -= time.monotonic() - self._opened_at
+                raise GatewayUnavailable(max(1, round(retry_after)))
+            self._probing = state == self.HALF_OPEN
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        f"Stripe circuit opened after {self._failures} failures"
+                    )
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def call(self, function, *args, **kwargs):
+        self.before_call()
+        try:
+            result = function(*args, **kwargs)
+        except OUTAGE_ERRORS:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Stripe answered, or the error is ours
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+class GatewayHTTPClient(stripe.http_client.RequestsClient):
+    """
+    Stripe HTTP client sharing one pooled session between threads, with a
+    timeout that can be narrowed per call and a bounded number of retries.
+
+    Retries cover connection errors, 409 and 5xx answers. POST requests
+    carry an idempotency key, so a retried create is never applied twice.
+    """
+
+    def __init__(self, timeout, max_retries, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        super().__init__(timeout=timeout, session=session)
+        self.max_retries = max_retries
+
+    @property
+    def _timeout(self):
+        return getattr(self._thread_local, "timeout", None) or self.default_timeout
+
+    @_timeout.setter
+    def _timeout(self, value):
+        self.default_timeout = value
+
+    @contextmanager
+    def timeout(self, value):
+        """
+        Use ``value`` as the (connect, read) timeout of every attempt made by
+        the current thread within the block
+        """
+
+        previous = getattr(self._thread_local, "timeout", None)
+        self._thread_local.timeout = value
+        try:
+            yield
+        finally:
+            self._thread_local.timeout = previous
+
+    def _max_network_retries(self):
+        return self.max_retries
+
+
+class StripeGateway:
+    """
+    The Stripe API calls made by the payments app.
+
+    Each operation has its own timeout and goes through the circuit
+    breaker, so a slow or failing Stripe ties worker threads up for a
+    bounded time and then not at all until it recovers.
+    """
+
+    def __init__(self, http_client=None, breaker=None):
+        self.http_client = http_client or GatewayHTTPClient(
+            timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+            max_retries=settings.STRIPE_MAX_RETRIES,
+            pool_size=settings.STRIPE_POOL_SIZE,
+        )
+        self.breaker = breaker or CircuitBreaker(
+            settings.STRIPE_BREAKER_THRESHOLD, settings.STRIPE_BREAKER_RESET
+        )
+        # The SDK's resources send every request through the default client
+        stripe.default_http_client = self.http_client
+        stripe.api_base = settings.STRIPE_API_BASE
+        stripe.api_key = settings.STRIPE_SECRET_KEY
+
+    def call(self, function, *args, read_timeout=None, **kwargs):
+        timeout = None
+        if read_timeout is not None:
+            timeout = (settings.STRIPE_CONNECT_TIMEOUT, read_timeout)
+        with self.http_client.timeout(timeout):
+            return self.breaker.call(function, *args, **kwargs)
+
+    def create_checkout_session(self, **params):
+        return self.call(
+            stripe.checkout.Session.create,
+            read_timeout=settings.STRIPE_READ_TIMEOUT,
+            **params,
+        )
+
+    def list_line_items(self, session_id):
+        return self.call(
+            stripe.checkout.Session.list_line_items,
+            session_id,
+            read_timeout=LOOKUP_READ_TIMEOUT,
+        )
+
+    def create_product(self, **params):
+        return self.call(stripe.Product.create, **params)
+
+    def update_product(self, product_id, **params):
+        return self.call(stripe.Product.modify, product_id, **params)
+
+    def create_price(self, **params):
+        return self.call(stripe.Price.create, **params)
+
+    def deactivate_price(self, price_id):
+        return self.call(stripe.Price.modify, price_id, active=False)
+
+
+stripe_gateway = StripeGateway()
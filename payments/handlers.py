@@ -0,0 +1,213 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from course.models import Course
+from course.models import Enroll
+from course.enrollments import bulk_enroll
+
+from .catalog import from_unit_amount
+from .checkout import set_checkout_sessions_status
+from .models import CheckoutSessionStatus, Payment
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+def handle_payment_failed(payment_intent):
+    transaction_id = payment_intent.id
+    session_id = payment_intent.metadata.get("session_id", "")
+    currency = payment_intent.currency.upper()
+    amount = from_unit_amount(payment_intent.amount, currency)
+    course_id = payment_intent.metadata.get("course_id")
+    user_id = payment_intent.metadata.get("user_id")
+
+    user = User.objects.filter(pk=user_id).first()
+    course = Course.objects.filter(pk=course_id).first()
+
+    if course and user:
+        Payment.objects.create(
+            transaction_id=transaction_id,
+            session_id=session_id,
+            amount=amount,
+            currency=currency,
+            payment_status="failed",
+            course=course,
+            user=user,
+        )
+    else:
+        logger.error("Failed to create payment record: Course or user not found")
+
+
+def handle_checkout_session_completed(session):
+    transaction_id = session.get("payment_intent")
+    session_id = session.get("id")
+    currency = session.get("currency").upper()
+    amount = from_unit_amount(session.get("amount_total"), currency)
+    payment_status = session.get("payment_status")
+    course_id = session.metadata.get("course_id")
+    user_id = session.metadata.get("user_id")
+
+    if course_id and user_id:
+        course = Course.objects.filter(pk=course_id).first()
+        user = User.objects.filter(pk=user_id).first()
+
+        if course and user:
+            # Enrollment, its counters and the payment commit together
+            with transaction.atomic():
+                # A student who already paid keeps their enrollment
+                new_enrollment, _ = Enroll.objects.get_or_create(
+                    student=user,
+                    course=course,
+                )
+                Payment.objects.create(
+                    transaction_id=transaction_id,
+                    session_id=session_id,
+                    currency=currency,
+                    amount=amount,
+                    payment_status=payment_status,
+                    enrollment=new_enrollment,
+                    user=user,
+                    course=course,
+                )
+                set_checkout_sessions_status(
+                    [session_id], CheckoutSessionStatus.COMPLETE
+                )
+        else:
+            logger.error(
+                "Failed to create enrollment or payment record: Course or user not found"
+            )
+    else:
+        logger.error("Course ID or User ID missing from session metadata")
+
+
+def _existing(model, ids):
+    ids = {pk for pk in ids if pk}
+    return set(model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+
+def _metadata_ids(stripe_object):
+    """
+    (user id, course id) from the metadata of a Stripe object, None if
+    either is missing or not a number
+    """
+
+    try:
+        metadata = stripe_object.metadata
+        return int(metadata["user_id"]), int(metadata["course_id"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_metadata(stripe_objects):
+    """
+    Pair Stripe objects with their metadata ids, logging and leaving out
+    the malformed ones so they don't fail the rest of a batch
+    """
+
+    parsed = []
+    for stripe_object in stripe_objects:
+        pair = _metadata_ids(stripe_object)
+        if pair is None:
+            logger.error(
+                f"Skipping {stripe_object.get('id')}: user or course id missing or malformed in metadata"
+            )
+        else:
+            parsed.append((pair, stripe_object))
+    return parsed
+
+
+def handle_checkout_sessions_completed_bulk(sessions):
+    """
+    Bulk variant of handle_checkout_session_completed, enrollments and
+    payments of all sessions are written with one bulk_create each
+    """
+
+    sessions = list(sessions)
+    parsed = _parse_metadata(sessions)
+    user_ids = _existing(User, (pair[0] for pair, _ in parsed))
+    course_ids = _existing(Course, (pair[1] for pair, _ in parsed))
+
+    valid = []
+    for pair, session in parsed:
+        if pair[0] in user_ids and pair[1] in course_ids:
+            valid.append((pair, session))
+        else:
+            logger.error(
+                f"Failed to create enrollment or payment record for {session.get('id')}: Course or user not found"
+            )
+
+    with transaction.atomic():
+        enrollments, _ = bulk_enroll(pair for pair, _ in valid)
+        Payment.objects.bulk_create(
+            Payment(
+                transaction_id=session.get("payment_intent"),
+                session_id=session.get("id"),
+                currency=session.get("currency").upper(),
+                amount=from_unit_amount(
+                    session.get("amount_total"), session.get("currency")
+                ),
+                payment_status=session.get("payment_status"),
+                enrollment=enrollments[pair],
+                user_id=pair[0],
+                course_id=pair[1],
+            )
+            for pair, session in valid
+        )
+        set_checkout_sessions_status(
+            [session.get("id") for session in sessions],
+            CheckoutSessionStatus.COMPLETE,
+        )
+
+
+def handle_checkout_session_expired(session):
+    set_checkout_sessions_status([session.get("id")], CheckoutSessionStatus.EXPIRED)
+
+
+def handle_checkout_sessions_expired_bulk(sessions):
+    set_checkout_sessions_status(
+        [session.get("id") for session in sessions], CheckoutSessionStatus.EXPIRED
+    )
+
+
+def handle_payments_failed_bulk(payment_intents):
+    """
+    Bulk variant of handle_payment_failed
+    """
+
+    parsed = _parse_metadata(payment_intents)
+    user_ids = _existing(User, (pair[0] for pair, _ in parsed))
+    course_ids = _existing(Course, (pair[1] for pair, _ in parsed))
+
+    payments = []
+    for (user_id, course_id), payment_intent in parsed:
+        if course_id not in course_ids or user_id not in user_ids:
+            logger.error("Failed to create payment record: Course or user not found")
+            continue
+        payments.append(
+            Payment(
+                transaction_id=payment_intent.id,
+                session_id=payment_intent.metadata.get("session_id", ""),
+                amount=from_unit_amount(payment_intent.amount, payment_intent.currency),
+                currency=payment_intent.currency.upper(),
+                payment_status="failed",
+                course_id=course_id,
+                user_id=user_id,
+            )
+        )
+    Payment.objects.bulk_create(payments)
+
+
+EVENT_HANDLERS = {
+    "payment_intent.payment_failed": handle_payment_failed,
+    "checkout.session.completed": handle_checkout_session_completed,
+    "checkout.session.expired": handle_checkout_session_expired,
+}
+
+BULK_EVENT_HANDLERS = {
+    "payment_intent.payment_failed": handle_payments_failed_bulk,
+    "checkout.session.completed": handle_checkout_sessions_completed_bulk,
+    "checkout.session.expired": handle_checkout_sessions_expired_bulk,
+}
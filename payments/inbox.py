@@ -0,0 +1,239 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .handlers import BULK_EVENT_HANDLERS, EVENT_HANDLERS
+from .models import WebhookEvent, WebhookEventStatus
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_event(event) -> bool:
+    """
+    Store a verified Stripe event for the workers
+
+    Args:
+        event (stripe.Event): event returned by stripe.Webhook.construct_event
+
+    Returns:
+        bool: False if the event had already been received
+    """
+
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                event_id=event["id"],
+                event_type=event["type"],
+                payload=event.to_dict_recursive(),
+            )
+    except IntegrityError:
+        logger.info(f"Ignoring redelivered event: {event['id']}")
+        return False
+    return True
+
+
+def claim_events(limit):
+    """
+    Mark up to ``limit`` due events as being processed by the caller
+
+    Events left in processing by a crashed worker are claimable again once
+    their lease runs out.
+
+    Returns:
+        list: (event, claim token) pairs owned by the caller
+    """
+
+    now = timezone.now()
+    due = Q(status=WebhookEventStatus.PENDING, next_attempt_at__lte=now) | Q(
+        status=WebhookEventStatus.PROCESSING, locked_until__lt=now
+    )
+    candidates = WebhookEvent.objects.filter(due).order_by("next_attempt_at", "pk")
+
+    claimed = []
+    for event in candidates[:limit]:
+        token = uuid.uuid4()
+        # Only one worker wins the conditional update of a given row
+        won = (
+            WebhookEvent.objects.filter(pk=event.pk)
+            .filter(due)
+            .update(
+                status=WebhookEventStatus.PROCESSING,
+                claim_token=token,
+                locked_until=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS),
+            )
+        )
+        if won:
+            claimed.append((event, token))
+    return claimed
+
+
+def process_event(event, token):
+    """
+    Run the handler of a claimed event. The handler's writes and the
+    succeeded mark commit together, so an event takes effect exactly once.
+    """
+
+    handler = EVENT_HANDLERS.get(event.event_type)
+    try:
+        with transaction.atomic():
+            owned = WebhookEvent.objects.filter(
+                pk=event.pk,
+                claim_token=token,
+                status=WebhookEventStatus.PROCESSING,
+            ).update(
+                status=WebhookEventStatus.SUCCEEDED,
+                processed_at=timezone.now(),
+                attempts=event.attempts + 1,
+                last_error="",
+            )
+            if not owned:
+                # Lease expired and another worker took over
+                return
+            if handler is None:
+                logger.warning(f"Unhandled event type: {event.event_type}")
+            else:
+                stripe_event = stripe.Event.construct_from(event.payload, stripe.api_key)
+                handler(stripe_event.data.object)
+    except Exception as e:
+        logger.exception(f"Failed to process event {event.event_id}")
+        schedule_retry(event, token, e)
+
+
+def schedule_retry(event, token, error):
+    attempts = event.attempts + 1
+    if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+        status = WebhookEventStatus.FAILED
+        logger.error(f"Giving up on event {event.event_id} after {attempts} attempts")
+    else:
+        status = WebhookEventStatus.PENDING
+
+    delay = settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    WebhookEvent.objects.filter(pk=event.pk, claim_token=token).update(
+        status=status,
+        attempts=attempts,
+        next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        claim_token=None,
+        locked_until=None,
+        last_error=str(error),
+    )
+
+
+def process_due_events(limit=10) -> int:
+    """
+    Claim and process one batch of due events
+
+    Returns:
+        int: number of events claimed
+    """
+
+    claimed = claim_events(limit)
+    for event, token in claimed:
+        process_event(event, token)
+    return len(claimed)
+
+
+class WebhookWorkerPool:
+    """
+    Threads draining the webhook inbox. The database is the queue, so any
+    number of pools in any number of processes can run side by side.
+    """
+
+    def __init__(self, workers=4, batch_size=10, poll_interval=1.0):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _run(self, drain):
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                if process_due_events(self.batch_size):
+                    continue
+                if drain:
+                    break
+                self._stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def start(self, drain=False):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, args=(drain,), name=f"webhook-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+def replay_events(events):
+    """
+    Run a batch of Stripe events through the bulk handlers in one
+    transaction. Events already in the inbox are skipped, replayed ones are
+    recorded as succeeded so they are never applied twice.
+
+    Args:
+        events (list): stripe.Event objects
+
+    Returns:
+        dict: received, duplicates, unhandled and processed counts
+    """
+
+    unique = {}
+    for event in events:
+        unique.setdefault(event["id"], event)
+
+    with transaction.atomic():
+        seen = set(
+            WebhookEvent.objects.filter(event_id__in=unique).values_list(
+                "event_id", flat=True
+            )
+        )
+        fresh = [event for event_id, event in unique.items() if event_id not in seen]
+
+        objects_by_type = defaultdict(list)
+        for event in fresh:
+            objects_by_type[event["type"]].append(event.data.object)
+
+        unhandled = 0
+        for event_type, objects in objects_by_type.items():
+            handler = BULK_EVENT_HANDLERS.get(event_type)
+            if handler is None:
+                unhandled += len(objects)
+            else:
+                handler(objects)
+
+        now = timezone.now()
+        WebhookEvent.objects.bulk_create(
+            WebhookEvent(
+                event_id=event["id"],
+                event_type=event["type"],
+                payload=event.to_dict_recursive(),
+                status=WebhookEventStatus.SUCCEEDED,
+                attempts=1,
+                processed_at=now,
+            )
+            for event in fresh
+        )
+
+    return {
+        "received": len(events),
+        "duplicates": len(events) - len(fresh),
+        "unhandled": unhandled,
+        "processed": len(fresh) - unhandled,
+    }
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from payments.inbox import WebhookWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Process stored Stripe webhook events with a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds an idle worker waits before polling again",
+        )
+        parser.add_argument(
+            "--drain",
+            action="store_true",
+            help="Exit once no event is due instead of polling forever",
+        )
+
+    def handle(self, *args, **options):
+        pool = WebhookWorkerPool(
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+        pool.start(drain=options["drain"])
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            pool.stop()
+            pool.join()
@@ -0,0 +1,76 @@
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import stripe
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection
+
+from payments.inbox import replay_events
+
+
+class Command(BaseCommand):
+    help = "Replay a JSONL export of Stripe events through the bulk webhook handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file with one Stripe event per line, - for stdin")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=4)
+
+    def read_batches(self, stream, batch_size):
+        batch = []
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                raise CommandError(f"Line {line_no} is not valid JSON: {e}")
+            batch.append(stripe.Event.construct_from(data, stripe.api_key))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def replay(self, batch):
+        try:
+            try:
+                return replay_events(batch)
+            except IntegrityError:
+                # Another worker stored one of these events first, the
+                # retry sees it and skips it
+                return replay_events(batch)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        stream = sys.stdin if options["path"] == "-" else open(options["path"])
+        workers = options["workers"]
+        totals = Counter()
+        started = time.monotonic()
+
+        with stream, ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for batch in self.read_batches(stream, options["batch_size"]):
+                # Bound the batches held in memory
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        totals.update(future.result())
+                pending.add(executor.submit(self.replay, batch))
+            for future in pending:
+                totals.update(future.result())
+
+        elapsed = time.monotonic() - started
+        rate = totals["received"] / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {totals['received']} events in {elapsed:.2f}s ({rate:.0f} events/s): "
+                f"{totals['processed']} processed, {totals['duplicates']} duplicates, "
+                f"{totals['unhandled']} unhandled."
+            )
+        )
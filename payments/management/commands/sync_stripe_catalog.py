@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from payments.catalog import sync_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update the Stripe product and price of every course whose "
+        "title, price or currency changed since the last run. Meant to run on "
+        "a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=int,
+            action="append",
+            dest="course_ids",
+            help="Only sync this course, may be repeated",
+        )
+
+    def handle(self, *args, **options):
+        result = sync_catalog(options["course_ids"])
+        message = f"Synced {result['synced']} courses to Stripe."
+        if result["failed"]:
+            self.stdout.write(
+                self.style.WARNING(f"{message} {result['failed']} failed, see the log.")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
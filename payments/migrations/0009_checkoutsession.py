@@ -0,0 +1,36 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0030_backfill_discussion_threads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0008_payment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=255, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('currency', models.CharField(choices=[('USD', 'United States Dollar'), ('INR', 'Indian Rupee'), ('EUR', 'EURO'), ('RUB', 'Russian Ruble'), ('JPY', 'Japanese Yen'), ('AUD', 'Australian Dollar'), ('CNY', 'Chinese Yuan'), ('GBP', 'British Pound Sterling')], max_length=3)),
+                ('url', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('complete', 'Complete'), ('expired', 'Expired')], default='open', max_length=8)),
+                ('expires_at', models.DateTimeField()),
+                ('line_items', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_sessions', to='course.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkout_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'course', 'status', '-expires_at'], name='checkout_session_reuse_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0030_backfill_discussion_threads'),
+        ('payments', '0009_checkoutsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=255)),
+                ('price_id', models.CharField(max_length=255)),
+                ('unit_amount', models.PositiveIntegerField()),
+                ('currency', models.CharField(choices=[('USD', 'United States Dollar'), ('INR', 'Indian Rupee'), ('EUR', 'EURO'), ('RUB', 'Russian Ruble'), ('JPY', 'Japanese Yen'), ('AUD', 'Australian Dollar'), ('CNY', 'Chinese Yuan'), ('GBP', 'British Pound Sterling')], max_length=3)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_entry', to='course.course')),
+            ],
+        ),
+    ]
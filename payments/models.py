@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from course.models import Enroll, Course, AvailableCurrency
 from django.contrib.auth import get_user_model
@@ -16,7 +17,11 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=7, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     enrollment = models.ForeignKey(
-        Enroll, on_delete=models.CASCADE, related_name="payment_enrollment", blank=True
+        Enroll,
+        on_delete=models.CASCADE,
+        related_name="payment_enrollment",
+        blank=True,
+        null=True,
     )
     user = models.ForeignKey(
         User,
@@ -29,5 +34,113 @@ class Payment(models.Model):
         related_name="payment_course",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="payment_user_recent_idx"),
+            models.Index(fields=["transaction_id"], name="payment_transaction_idx"),
+        ]
+
     def __str__(self):
         return self.transaction_id
+
+
+class CheckoutSessionStatus(models.TextChoices):
+    OPEN = "open", _("Open")
+    COMPLETE = "complete", _("Complete")
+    EXPIRED = "expired", _("Expired")
+
+
+class CheckoutSession(models.Model):
+    """
+    Stripe checkout session created for a user and course, kept so an open
+    session can be handed out again and its line items served without
+    asking Stripe
+    """
+
+    session_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="checkout_sessions"
+    )
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name="checkout_sessions"
+    )
+    amount = models.DecimalField(max_digits=7, decimal_places=2)
+    currency = models.CharField(max_length=3, choices=AvailableCurrency.choices)
+    url = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=8,
+        choices=CheckoutSessionStatus.choices,
+        default=CheckoutSessionStatus.OPEN,
+    )
+    expires_at = models.DateTimeField()
+    # list_line_items response, fetched once
+    line_items = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "course", "status", "-expires_at"],
+                name="checkout_session_reuse_idx",
+            )
+        ]
+
+    def __str__(self):
+        return self.session_id
+
+
+class CatalogEntry(models.Model):
+    """
+    Stripe product and price mirroring a course, checkout refers to the
+    price by id while ``fingerprint`` matches the course
+    """
+
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, related_name="catalog_entry"
+    )
+    product_id = models.CharField(max_length=255)
+    price_id = models.CharField(max_length=255)
+    # Amount and currency of price_id, Stripe prices can't be changed
+    unit_amount = models.PositiveIntegerField()
+    currency = models.CharField(max_length=3, choices=AvailableCurrency.choices)
+    fingerprint = models.CharField(max_length=64)
+    synced_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.price_id
+
+
+class WebhookEventStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    PROCESSING = "processing", _("Processing")
+    SUCCEEDED = "succeeded", _("Succeeded")
+    FAILED = "failed", _("Failed")
+
+
+class WebhookEvent(models.Model):
+    """
+    Verified Stripe event waiting for, or done with, processing.
+    Stored once per Stripe event id, so redeliveries are ignored.
+    """
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=64)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=12,
+        choices=WebhookEventStatus.choices,
+        default=WebhookEventStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id}"
@@ -1,10 +1,11 @@
 from .models import Payment
 from rest_framework import serializers
+from gen.serializers import DynamicFieldsMixin
 from course.serializers import CourseSerializer, EnrollSerializer
 from user.serializers import UserDetailsSerializer
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserDetailsSerializer(read_only=True)
     enrollment = EnrollSerializer(read_only=True)
     course = CourseSerializer(read_only=True)
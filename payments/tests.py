@@ -1,3 +1,860 @@
-from django.test import TestCase
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qsl
 
-# Create your tests here.
+import stripe
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from course.models import Course, Enroll
+from gen.testing import QueryCountTestCase, create_course, create_user
+
+from .catalog import catalog_price_id, from_unit_amount, sync_catalog, unit_amount
+from .checkout import set_checkout_sessions_status
+from .exports import PAYMENT_COLUMNS
+from .gateway import CircuitBreaker, GatewayUnavailable, StripeGateway
+from .handlers import EVENT_HANDLERS, handle_checkout_session_expired
+from .inbox import (
+    WebhookWorkerPool,
+    claim_events,
+    enqueue_event,
+    process_due_events,
+    process_event,
+    replay_events,
+)
+from .models import (
+    CatalogEntry,
+    CheckoutSession,
+    CheckoutSessionStatus,
+    Payment,
+    WebhookEvent,
+    WebhookEventStatus,
+)
+from .views import PaymentExportView
+
+
+def stripe_event(event_id, event_type, data):
+    return stripe.Event.construct_from(
+        {"id": event_id, "object": "event", "type": event_type, "data": {"object": data}},
+        "sk_test_fake",
+    )
+
+
+def completed_session(session_id, user, course, **metadata):
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "payment_intent": f"pi_{session_id}",
+        "currency": "inr",
+        "amount_total": 1050,
+        "payment_status": "paid",
+        "metadata": {"course_id": str(course.pk), "user_id": str(user.pk), **metadata},
+    }
+
+
+class FakeStripe(ThreadingHTTPServer):
+    """
+    Local stand-in for the Stripe API. Creates answer with a new id per
+    call, updates echo the id of the path, checkout sessions expire in a
+    day, and every request is recorded along with the client port of its
+    connection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeStripeHandler)
+        self.url = f"http://127.0.0.1:{self.server_port}"
+        self.requests = []
+        self.created = 0
+        self.status = 200
+        self.delay = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out have closed their connection
+        pass
+
+    def record(self, request):
+        with self._lock:
+            self.requests.append(request)
+            self.created += 1
+            return self.created
+
+    def calls(self, method=None, path=None):
+        return [
+            request
+            for request in self.requests
+            if method in (None, request["method"]) and path in (None, request["path"])
+        ]
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, params):
+        server = self.server
+        number = server.record(
+            {
+                "method": self.command,
+                "path": self.path.split("?")[0],
+                "params": params,
+                "idempotency_key": self.headers.get("Idempotency-Key"),
+                "port": self.client_address[1],
+            }
+        )
+        if server.delay:
+            time.sleep(server.delay)
+        if server.status != 200:
+            return self.reply(
+                server.status, {"error": {"message": "Failed", "type": "api_error"}}
+            )
+
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if parts[1:] == ["checkout", "sessions"]:
+            session_id = f"cs_test_{number}"
+            return self.reply(
+                200,
+                {
+                    **params,
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "url": f"{server.url}/pay/{session_id}",
+                    "expires_at": int(time.time()) + 24 * 60 * 60,
+                },
+            )
+        if self.command == "GET":
+            return self.reply(200, {"object": "list", "data": [], "has_more": False})
+        if len(parts) == 2:
+            # POST /v1/prices creates price_<n>
+            return self.reply(200, {"id": f"{parts[1][:-1]}_{number}", **params})
+        return self.reply(200, {"id": parts[2], **params})
+
+    def do_GET(self):
+        self.handle_request({})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"] or 0)).decode()
+        self.handle_request(dict(parse_qsl(body)))
+
+
+class FakeStripeMixin:
+    """
+    Points a fresh StripeGateway at a FakeStripe server, with retries
+    backing off for milliseconds instead of seconds
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stripe = FakeStripe()
+        cls.stripe.start()
+        cls.addClassCleanup(cls.stripe.stop)
+
+    def setUp(self):
+        super().setUp()
+        self.stripe.requests.clear()
+        self.stripe.status = 200
+        self.stripe.delay = 0
+        for name in ("default_http_client", "api_base", "api_key"):
+            patcher = mock.patch.object(stripe, name, getattr(stripe, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ("INITIAL_DELAY", "MAX_DELAY"):
+            patcher = mock.patch.object(stripe.http_client.HTTPClient, name, 0.01)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_gateway(self, **settings):
+        settings = {
+            "STRIPE_API_BASE": self.stripe.url,
+            "STRIPE_SECRET_KEY": "sk_test_fake",
+            "STRIPE_READ_TIMEOUT": 2,
+            "STRIPE_MAX_RETRIES": 2,
+            "STRIPE_POOL_SIZE": 4,
+            "STRIPE_BREAKER_THRESHOLD": 2,
+            "STRIPE_BREAKER_RESET": 0.2,
+            **settings,
+        }
+        override = override_settings(**settings)
+        override.enable()
+        self.addCleanup(override.disable)
+        return StripeGateway()
+
+
+class PaymentDetailViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user("student")
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.payment = Payment.objects.create(
+            transaction_id="pi_1",
+            session_id="cs_1",
+            payment_status="paid",
+            amount=10,
+            user=cls.student,
+            course=cls.course,
+        )
+
+    def get(self, user, transaction_id="pi_1"):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        return client.get(f"/api/payments/transaction/{transaction_id}")
+
+    def test_owner_gets_payment(self):
+        response = self.get(self.student)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["transaction_id"], "pi_1")
+
+    def test_other_users_get_404(self):
+        self.assertEqual(self.get(create_user("other")).status_code, 404)
+
+    def test_anonymous_is_rejected(self):
+        self.assertEqual(self.get(None).status_code, 401)
+
+    def test_unknown_transaction_is_404(self):
+        self.assertEqual(self.get(self.student, "pi_unknown").status_code, 404)
+
+    def test_latest_of_shared_transaction(self):
+        Payment.objects.create(
+            transaction_id="pi_1",
+            session_id="cs_1",
+            payment_status="failed",
+            amount=10,
+            user=self.student,
+            course=self.course,
+        )
+        response = self.get(self.student)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["payment_status"], "failed")
+
+
+class PaymentExportTests(TestCase):
+    url = "/api/payments/transactions/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = create_user("teacher", role="TR")
+        cls.course = create_course(cls.teacher)
+        cls.other_course = create_course(create_user("other", role="TR"))
+        cls.student = create_user("student")
+        cls.staff = create_user("staff", role="TR")
+        cls.staff.is_staff = True
+        cls.staff.save()
+
+        rows = [
+            (cls.course, "paid", 1),
+            (cls.course, "failed", 2),
+            (cls.course, "paid", 2),
+            (cls.course, "paid", 3),
+            (cls.other_course, "paid", 3),
+        ]
+        for i, (course, payment_status, day) in enumerate(rows):
+            payment = Payment.objects.create(
+                transaction_id=f"pi_{i}",
+                session_id=f"cs_{i}",
+                payment_status=payment_status,
+                amount=Decimal("10.50"),
+                user=cls.student,
+                course=course,
+            )
+            Payment.objects.filter(pk=payment.pk).update(
+                created_at=timezone.make_aware(datetime(2026, 1, day, 12))
+            )
+
+    def export(self, user, query=""):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client.get(f"{self.url}{query}")
+
+    def rows(self, user, query=""):
+        response = self.export(user, query)
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        if "output=ndjson" in query:
+            return [json.loads(line) for line in lines]
+        header, *rows = csv.reader(lines)
+        return [dict(zip(header, row)) for row in rows]
+
+    def transaction_ids(self, user, query=""):
+        return [row["transaction_id"] for row in self.rows(user, query)]
+
+    def test_csv(self):
+        response = self.export(self.teacher)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="payments.csv"'
+        )
+
+        rows = self.rows(self.teacher)
+        self.assertEqual(list(rows[0]), [header for header, _ in PAYMENT_COLUMNS])
+        self.assertEqual(
+            [row["transaction_id"] for row in rows], ["pi_0", "pi_1", "pi_2", "pi_3"]
+        )
+        self.assertEqual(rows[0]["amount"], "10.50")
+        self.assertEqual(rows[0]["user_email"], "student@example.com")
+        self.assertEqual(rows[0]["created_at"], "2026-01-01T12:00:00Z")
+
+    def test_ndjson(self):
+        response = self.export(self.staff, "?output=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        rows = self.rows(self.staff, "?output=ndjson")
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1]["status"], "failed")
+        self.assertEqual(rows[1]["amount"], "10.50")
+        self.assertEqual(rows[4]["course_id"], self.other_course.pk)
+
+    def test_filters(self):
+        cases = {
+            "?status=failed": ["pi_1"],
+            "?since=2026-01-02": ["pi_1", "pi_2", "pi_3"],
+            "?until=2026-01-02": ["pi_0", "pi_1", "pi_2"],
+            "?since=2026-01-02&until=2026-01-02&status=paid": ["pi_2"],
+            "?since=2026-01-02T13:00:00Z": ["pi_3"],
+            f"?course={self.other_course.pk}": [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.transaction_ids(self.teacher, query), expected)
+
+        query = f"?course={self.other_course.pk}"
+        self.assertEqual(self.transaction_ids(self.staff, query), ["pi_4"])
+
+    def test_bad_parameters_are_rejected(self):
+        for query in ("?since=yesterday", "?output=xml", "?course=abc"):
+            with self.subTest(query=query):
+                self.assertEqual(self.export(self.teacher, query).status_code, 400)
+
+    def test_streams_in_chunks(self):
+        with mock.patch.object(PaymentExportView, "chunk_size", 2):
+            response = self.export(self.staff)
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        # The header, then rows two at a time
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [1, 2, 2, 1])
+
+    def test_permissions(self):
+        self.assertEqual(self.export(None).status_code, 401)
+        self.assertEqual(self.export(self.student).status_code, 403)
+        # Teachers only see the payments of their own courses
+        self.assertEqual(self.transaction_ids(create_user("new", role="TR")), [])
+
+
+class PaymentQueryCountTests(QueryCountTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user("student")
+        cls.course = create_course(create_user("teacher", role="TR"))
+        cls.payments = 0
+
+    def add_payments(self, n, transaction_id=None):
+        for _ in range(n):
+            type(self).payments += 1
+            Payment.objects.create(
+                transaction_id=transaction_id or f"pi_{self.payments}",
+                session_id=f"cs_{self.payments}",
+                payment_status="paid",
+                amount=10,
+                user=self.student,
+                course=self.course,
+            )
+
+    def test_payment_list(self):
+        self.assertQueriesPerRequest(
+            5, "/api/payments/transactions/", self.add_payments, self.student
+        )
+
+    def test_payment_detail(self):
+        self.assertQueriesPerRequest(
+            5,
+            "/api/payments/transaction/pi_shared",
+            lambda n: self.add_payments(n, "pi_shared"),
+            self.student,
+        )
+
+
+@override_settings(WEBHOOK_MAX_ATTEMPTS=3, WEBHOOK_RETRY_BASE_DELAY=30)
+class WebhookInboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user("student")
+        cls.course = create_course(create_user("teacher", role="TR"))
+
+    def enqueue(self, event_id="evt_1"):
+        session = completed_session(f"cs_{event_id}", self.student, self.course)
+        return enqueue_event(
+            stripe_event(event_id, "checkout.session.completed", session)
+        )
+
+    def stored(self, event_id="evt_1"):
+        return WebhookEvent.objects.get(event_id=event_id)
+
+    def make_due(self, event_id="evt_1"):
+        WebhookEvent.objects.filter(event_id=event_id).update(
+            next_attempt_at=timezone.now()
+        )
+
+    @contextmanager
+    def failing(self):
+        handler = mock.Mock(side_effect=ValueError("boom"))
+        with mock.patch.dict(EVENT_HANDLERS, {"checkout.session.completed": handler}):
+            with self.assertLogs("payments.inbox", "ERROR"):
+                yield
+
+    def test_redelivered_event_is_handled_once(self):
+        self.assertTrue(self.enqueue())
+        self.assertFalse(self.enqueue())
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        self.assertEqual(process_due_events(), 1)
+        self.assertEqual(process_due_events(), 0)
+        self.assertFalse(self.enqueue())
+        self.assertEqual(process_due_events(), 0)
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.amount, Decimal("10.50"))
+        self.assertEqual(Enroll.objects.filter(student=self.student).count(), 1)
+        event = self.stored()
+        self.assertEqual((event.status, event.attempts), (WebhookEventStatus.SUCCEEDED, 1))
+
+    def test_failing_handler_backs_off(self):
+        self.enqueue()
+        for attempt, delay in ((1, 30), (2, 60)):
+            with self.failing():
+                start = timezone.now()
+                self.assertEqual(process_due_events(), 1)
+            event = self.stored()
+            self.assertEqual(event.status, WebhookEventStatus.PENDING)
+            self.assertEqual(event.attempts, attempt)
+            self.assertEqual(event.last_error, "boom")
+            self.assertIsNone(event.claim_token)
+            wait = (event.next_attempt_at - start).total_seconds()
+            self.assertAlmostEqual(wait, delay, delta=5)
+            # Not due again before its delay
+            self.assertEqual(process_due_events(), 0)
+            self.make_due()
+
+        self.assertEqual(process_due_events(), 1)
+        event = self.stored()
+        self.assertEqual((event.status, event.attempts), (WebhookEventStatus.SUCCEEDED, 3))
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.enqueue()
+        with self.failing():
+            for _ in range(3):
+                self.make_due()
+                process_due_events()
+        event = self.stored()
+        self.assertEqual((event.status, event.attempts), (WebhookEventStatus.FAILED, 3))
+
+        self.make_due()
+        self.assertEqual(process_due_events(), 0)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_expired_lease_is_taken_over(self):
+        self.enqueue()
+        [(event, first_token)] = claim_events(10)
+        # Still leased to the first worker
+        self.assertEqual(claim_events(10), [])
+
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        [(event, second_token)] = claim_events(10)
+        self.assertNotEqual(first_token, second_token)
+
+        # The first worker comes back too late and leaves the event alone
+        process_event(event, first_token)
+        self.assertFalse(Payment.objects.exists())
+        self.assertEqual(self.stored().status, WebhookEventStatus.PROCESSING)
+
+        process_event(event, second_token)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(self.stored().status, WebhookEventStatus.SUCCEEDED)
+
+
+class ReplayEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user("student")
+        teacher = create_user("teacher", role="TR")
+        cls.courses = [create_course(teacher), create_course(teacher)]
+
+    def failed_intent(self, intent_id, **metadata):
+        return {
+            "id": intent_id,
+            "object": "payment_intent",
+            "currency": "inr",
+            "amount": 1050,
+            "metadata": {
+                "course_id": str(self.courses[0].pk),
+                "user_id": str(self.student.pk),
+                **metadata,
+            },
+        }
+
+    def completed(self, number, course, **metadata):
+        session = completed_session(f"cs_{number}", self.student, course, **metadata)
+        return stripe_event(f"evt_{number}", "checkout.session.completed", session)
+
+    def batch(self):
+        failed = "payment_intent.payment_failed"
+        return [
+            self.completed(1, self.courses[0]),
+            self.completed(2, self.courses[1], course_id="abc"),
+            self.completed(3, self.courses[1]),
+            stripe_event("evt_4", failed, self.failed_intent("pi_4")),
+            stripe_event("evt_5", failed, self.failed_intent("pi_5", user_id="")),
+            # Redelivered within the batch
+            self.completed(1, self.courses[0]),
+        ]
+
+    def test_malformed_events_dont_fail_the_batch(self):
+        CheckoutSession.objects.create(
+            session_id="cs_1",
+            user=self.student,
+            course=self.courses[0],
+            amount=10,
+            currency="INR",
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        with self.assertLogs("payments.handlers", "ERROR") as logs:
+            counts = replay_events(self.batch())
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(
+            counts, {"received": 6, "duplicates": 1, "unhandled": 0, "processed": 5}
+        )
+
+        self.assertEqual(
+            sorted(Payment.objects.values_list("transaction_id", "payment_status")),
+            [("pi_4", "failed"), ("pi_cs_1", "paid"), ("pi_cs_3", "paid")],
+        )
+        enrolled = Enroll.objects.filter(student=self.student).values_list(
+            "course", flat=True
+        )
+        self.assertEqual(set(enrolled), {course.pk for course in self.courses})
+        self.assertEqual(
+            CheckoutSession.objects.get(session_id="cs_1").status,
+            CheckoutSessionStatus.COMPLETE,
+        )
+        self.assertEqual(WebhookEvent.objects.count(), 5)
+
+    def test_replayed_again_changes_nothing(self):
+        with self.assertLogs("payments.handlers", "ERROR"):
+            replay_events(self.batch())
+        counts = replay_events(self.batch())
+        self.assertEqual(
+            counts, {"received": 6, "duplicates": 6, "unhandled": 0, "processed": 0}
+        )
+        self.assertEqual(Payment.objects.count(), 3)
+        self.assertEqual(Enroll.objects.count(), 2)
+
+
+class WebhookWorkerPoolTests(TransactionTestCase):
+    def test_workers_drain_the_inbox_once(self):
+        student = create_user("student")
+        courses = [create_course(create_user(f"teacher{i}", role="TR")) for i in range(2)]
+        for i in range(20):
+            session = completed_session(f"cs_{i}", student, courses[i % 2])
+            enqueue_event(stripe_event(f"evt_{i}", "checkout.session.completed", session))
+
+        # The in-memory SQLite test database fails concurrent writers
+        # instead of making them wait
+        workers = 4 if connection.vendor == "postgresql" else 1
+        pool = WebhookWorkerPool(workers=workers, batch_size=3)
+        pool.start(drain=True)
+        pool.join()
+
+        self.assertEqual(
+            WebhookEvent.objects.filter(status=WebhookEventStatus.SUCCEEDED).count(), 20
+        )
+        self.assertEqual(Payment.objects.count(), 20)
+        self.assertEqual(Enroll.objects.filter(student=student).count(), 2)
+
+
+class StripeGatewayTests(FakeStripeMixin, SimpleTestCase):
+    def test_connections_are_pooled(self):
+        gateway = self.create_gateway()
+        for _ in range(10):
+            gateway.create_product(name="Python")
+        self.assertEqual(len({request["port"] for request in self.stripe.requests}), 1)
+
+        self.stripe.requests.clear()
+        with ThreadPoolExecutor(8) as executor:
+            executor.map(lambda _: gateway.create_product(name="Python"), range(80))
+        self.assertEqual(len(self.stripe.requests), 80)
+        # Connections are kept for later calls: at most one per thread, and
+        # the one pooled by the calls above
+        ports = {request["port"] for request in self.stripe.requests}
+        self.assertLessEqual(len(ports), 8 + 1)
+
+    def test_retries_are_bounded(self):
+        gateway = self.create_gateway()
+        self.stripe.status = 500
+        with self.assertRaises(stripe.error.APIError):
+            gateway.create_product(name="Python", idempotency_key="product-1")
+
+        self.assertEqual(len(self.stripe.requests), 3)
+        # A retried create can't be applied twice
+        self.assertEqual(
+            {request["idempotency_key"] for request in self.stripe.requests},
+            {"product-1"},
+        )
+
+    def test_client_errors_are_not_retried(self):
+        gateway = self.create_gateway()
+        self.stripe.status = 400
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            gateway.create_product(name="Python")
+        self.assertEqual(len(self.stripe.requests), 1)
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_timeout_per_call(self):
+        gateway = self.create_gateway(STRIPE_READ_TIMEOUT=0.2)
+        self.stripe.delay = 0.5
+
+        started = time.monotonic()
+        with self.assertRaises(stripe.error.APIConnectionError):
+            gateway.create_checkout_session(mode="payment")
+        # Three attempts cut short at the checkout's read timeout
+        self.assertLess(time.monotonic() - started, 1.4)
+        self.assertEqual(len(self.stripe.requests), 3)
+
+        # Calls without their own timeout keep the default one
+        self.assertEqual(gateway.http_client._timeout, (3, 0.2))
+        self.stripe.delay = 0.3
+        gateway.breaker.record_success()
+        self.assertEqual(
+            gateway.call(stripe.Product.create, name="Python", read_timeout=1)["name"],
+            "Python",
+        )
+
+    def test_breaker_opens_and_recovers(self):
+        gateway = self.create_gateway(STRIPE_MAX_RETRIES=0)
+        self.stripe.status = 500
+        for _ in range(2):
+            with self.assertRaises(stripe.error.APIError):
+                gateway.create_product(name="Python")
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.OPEN)
+
+        # Open, calls fail without reaching Stripe
+        with self.assertRaises(GatewayUnavailable):
+            gateway.create_product(name="Python")
+        self.assertEqual(len(self.stripe.requests), 2)
+
+        # Half open, a failing probe opens it again
+        time.sleep(0.25)
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(stripe.error.APIError):
+            gateway.create_product(name="Python")
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.OPEN)
+
+        # A succeeding probe closes it
+        time.sleep(0.25)
+        self.stripe.status = 200
+        gateway.create_product(name="Python")
+        self.assertEqual(gateway.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(len(self.stripe.requests), 4)
+
+    def test_half_open_breaker_lets_one_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+        time.sleep(0.15)
+
+        breaker.before_call()
+        with self.assertRaises(GatewayUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class CheckoutSessionReuseTests(FakeStripeMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = create_user("student")
+        cls.course = create_course(create_user("teacher", role="TR"), price=10)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("payments.views.stripe_gateway", self.create_gateway())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def checkout(self):
+        response = self.client.post(
+            "/api/payments/create-checkout-session/",
+            {"course_id": self.course.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["sessionId"]
+
+    def created(self):
+        return self.stripe.calls("POST", "/v1/checkout/sessions")
+
+    def test_open_session_is_reused(self):
+        session_id = self.checkout()
+        self.assertEqual(self.checkout(), session_id)
+        self.assertEqual(len(self.created()), 1)
+        self.assertEqual(
+            self.created()[0]["params"]["metadata[user_id]"], str(self.student.pk)
+        )
+
+        # Another student gets their own
+        self.client.force_authenticate(create_user("other"))
+        self.assertNotEqual(self.checkout(), session_id)
+        self.assertEqual(len(self.created()), 2)
+
+    def test_closed_sessions_are_replaced(self):
+        first = self.checkout()
+        handle_checkout_session_expired({"id": first})
+        second = self.checkout()
+        self.assertNotEqual(second, first)
+
+        set_checkout_sessions_status([second], CheckoutSessionStatus.COMPLETE)
+        third = self.checkout()
+        self.assertNotIn(third, (first, second))
+
+        # Too close to its expiry to finish paying
+        CheckoutSession.objects.filter(session_id=third).update(
+            expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        self.assertNotIn(self.checkout(), (first, second, third))
+        self.assertEqual(len(self.created()), 4)
+
+    def test_price_change_gets_a_new_session(self):
+        first = self.checkout()
+        Course.objects.filter(pk=self.course.pk).update(price=12)
+        self.assertNotEqual(self.checkout(), first)
+
+    def test_line_items_are_fetched_once(self):
+        session_id = self.checkout()
+        url = f"/api/payments/checkout/session/{session_id}/line-items/"
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["object"], "list")
+        self.assertEqual(len(self.stripe.calls("GET")), 1)
+
+        # Sessions of other users aren't served from, or kept for, them
+        self.client.force_authenticate(create_user("other"))
+        self.client.get(url)
+        self.assertEqual(len(self.stripe.calls("GET")), 2)
+
+
+class CatalogSyncTests(FakeStripeMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = create_course(create_user("teacher", role="TR"), price=10)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("payments.catalog.stripe_gateway", self.create_gateway())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self):
+        self.stripe.requests.clear()
+        result = sync_catalog()
+        self.course.refresh_from_db()
+        return result
+
+    def test_first_sync_creates_product_and_price(self):
+        self.assertEqual(self.sync(), {"synced": 1, "failed": 0})
+
+        product, price = self.stripe.requests
+        self.assertEqual(product["path"], "/v1/products")
+        self.assertEqual(product["params"]["name"], "Python")
+        self.assertEqual(price["path"], "/v1/prices")
+        self.assertEqual(price["params"]["unit_amount"], "1000")
+        # Creates are keyed, an interrupted sync run again doesn't duplicate them
+        self.assertTrue(product["idempotency_key"] and price["idempotency_key"])
+
+        entry = CatalogEntry.objects.get(course=self.course)
+        self.assertEqual(price["params"]["product"], entry.product_id)
+        self.assertEqual(catalog_price_id(self.course), entry.price_id)
+
+    def test_second_run_calls_nothing(self):
+        self.sync()
+        self.assertEqual(self.sync(), {"synced": 0, "failed": 0})
+        self.assertEqual(self.stripe.requests, [])
+
+    def test_title_change_only_updates_the_product(self):
+        self.sync()
+        entry = CatalogEntry.objects.get(course=self.course)
+        Course.objects.filter(pk=self.course.pk).update(title="Django")
+        self.assertIsNone(catalog_price_id(Course.objects.get(pk=self.course.pk)))
+
+        self.assertEqual(self.sync(), {"synced": 1, "failed": 0})
+        (update,) = self.stripe.requests
+        self.assertEqual(update["path"], f"/v1/products/{entry.product_id}")
+        self.assertEqual(update["params"]["name"], "Django")
+        self.assertEqual(catalog_price_id(self.course), entry.price_id)
+
+    def test_price_change_replaces_the_price(self):
+        self.sync()
+        old_price_id = CatalogEntry.objects.get(course=self.course).price_id
+        Course.objects.filter(pk=self.course.pk).update(price=12)
+
+        self.assertEqual(self.sync(), {"synced": 1, "failed": 0})
+        product, price, deactivation = self.stripe.requests
+        self.assertEqual(price["path"], "/v1/prices")
+        self.assertEqual(price["params"]["unit_amount"], "1200")
+        self.assertEqual(deactivation["path"], f"/v1/prices/{old_price_id}")
+        self.assertEqual(deactivation["params"], {"active": "False"})
+
+        entry = CatalogEntry.objects.get(course=self.course)
+        self.assertNotEqual(entry.price_id, old_price_id)
+        self.assertEqual(catalog_price_id(self.course), entry.price_id)
+
+    def test_failed_sync_is_retried_next_run(self):
+        self.stripe.status = 400
+        self.assertEqual(self.sync(), {"synced": 0, "failed": 1})
+        self.stripe.status = 200
+        self.assertEqual(self.sync(), {"synced": 1, "failed": 0})
+
+    def test_zero_decimal_currencies(self):
+        self.course.currency = "JPY"
+        self.course.price = Decimal(1500)
+        self.assertEqual(unit_amount(self.course), 1500)
+        self.course.currency = "USD"
+        self.course.price = Decimal("10.99")
+        self.assertEqual(unit_amount(self.course), 1099)
+
+        # Webhook amounts are read back the same way
+        self.assertEqual(from_unit_amount(1500, "jpy"), 1500)
+        self.assertEqual(from_unit_amount(1099, "usd"), Decimal("10.99"))
@@ -18,6 +18,11 @@ urlpatterns = [
         "available-currencies/", views.Currency.as_view(), name="available_currencies"
     ),
     path("transactions/", views.PaymentsView.as_view(), name="user-payments"),
+    path(
+        "transactions/export/",
+        views.PaymentExportView.as_view(),
+        name="payments-export",
+    ),
     path(
         "transaction/<str:transaction_id>",
         views.PaymentDetailView.as_view(),
@@ -1,10 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 import stripe.error
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.permissions import IsAuthenticated
-from gen.permissions import IsOwnerOnly
+from gen.exports import ExportView
+from gen.pagination import NewestFirstPagination
+from gen.prefetch import PrefetchPlanMixin
 from rest_framework.response import Response
 from django.conf import settings
 from rest_framework import status
@@ -14,16 +16,41 @@ import logging
 from course.models import Course
 from course.models import Enroll
 from course.models import AvailableCurrency
+from course.access import taught_courses
+from course.permissions import IsTeacherOrStaff
 
-from .models import Payment
+from .models import CheckoutSession, Payment
 from .serializers import PaymentSerializer
+from .exports import PAYMENT_COLUMNS, export_payments
+from .handlers import EVENT_HANDLERS
+from .inbox import enqueue_event
+from .catalog import catalog_price_id, unit_amount
+from .checkout import record_checkout_session, reusable_checkout_session
+from .gateway import OUTAGE_ERRORS, GatewayUnavailable, stripe_gateway
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
 User = get_user_model()
 
 logger = logging.getLogger(__name__)
 
 
+def gateway_unavailable(error):
+    """
+    503 for a Stripe that failed or could not be reached, with Retry-After
+    while the circuit breaker is open
+    """
+
+    headers = {}
+    if isinstance(error, GatewayUnavailable):
+        headers["Retry-After"] = str(error.retry_after)
+    else:
+        logger.error(f"Stripe unavailable: {error}")
+    return Response(
+        data={"error": "Payments are temporarily unavailable, try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers=headers,
+    )
+
+
 class Currency(APIView):
     def get(self, request, format=None):
         currencies = []
@@ -51,41 +78,57 @@ class CreateCheckoutSession(APIView):
                 data={"error": "Data not found."}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        if Enroll.objects.filter(course=course, student=request.user).first():
+        # Index-only lookup on the (student, course) unique constraint
+        if Enroll.objects.filter(course=course, student=request.user).exists():
             return Response(
                 {"error": f"Already Enrolled in the course."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # Clicking "buy" again resumes the checkout already started
+        checkout = reusable_checkout_session(request.user, course)
+        if checkout:
+            return Response(
+                data={"sessionId": checkout.session_id, "sessionUrl": checkout.url}
+            )
+
         domain_url = settings.FRONTEND_DOMAIN or "http://localhost:5173"
 
         info_query = f"course_name={course.title}&course_id={course.pk}&amount={course.price}&currency={course.currency}"
 
+        price_id = catalog_price_id(course)
+        if price_id:
+            line_item = {"price": price_id, "quantity": 1}
+        else:
+            # Not synced to the Stripe catalog yet, see sync_stripe_catalog
+            line_item = {
+                "price_data": {
+                    "currency": course.currency,
+                    "product_data": {
+                        "name": course.title,
+                        "description": course.description,
+                        "images": [course.cover_img],
+                    },
+                    "unit_amount": unit_amount(course),
+                },
+                "quantity": 1,
+            }
+
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = stripe_gateway.create_checkout_session(
                 payment_method_types=["card"],
                 mode="payment",
-                line_items=[
-                    {
-                        "price_data": {
-                            "currency": course.currency,
-                            "product_data": {
-                                "name": course.title,
-                                "description": course.description,
-                                "images": [course.cover_img],
-                            },
-                            "unit_amount": int(course.price * 100),
-                        },
-                        "quantity": 1,
-                    }
-                ],
+                line_items=[line_item],
                 metadata={"course_id": course.pk, "user_id": request.user.pk},
                 success_url=domain_url + "/payment/success/{CHECKOUT_SESSION_ID}/"+str(course_id)+"/",
                 cancel_url=domain_url + "/payment/failed/"+str(course_id)+"/",
             )
+        except OUTAGE_ERRORS as e:
+            return gateway_unavailable(e)
         except Exception as e:
             return Response(data={"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         else:
+            record_checkout_session(checkout_session, request.user, course)
             # return HttpResponseRedirect(checkout_session.url)
             return Response(
                 data={
@@ -129,110 +172,85 @@ class WebhookView(APIView):
         # Log the received event
         logger.info(f"Received event: {event['type']}")
 
-        # Handle different event types
-        event_type = event["type"]
-
-        if event_type == "payment_intent.payment_failed":
-            payment_intent = event.data.object
-            handle_payment_failed(payment_intent)
-        elif event_type == "checkout.session.completed":
-            session = event.data.object
-            handle_checkout_session_completed(session)
+        # Handled by the workers of process_webhook_events, Stripe only
+        # waits for the event to be stored
+        if event["type"] in EVENT_HANDLERS:
+            enqueue_event(event)
         else:
-            logger.warning(f"Unhandled event type: {event_type}")
+            logger.warning(f"Unhandled event type: {event['type']}")
 
         return Response(status=status.HTTP_200_OK)
 
 
-def handle_payment_failed(payment_intent):
-    transaction_id = payment_intent.id
-    session_id = payment_intent.metadata.get("session_id")
-    amount = payment_intent.amount / 100  # Convert from cents to currency
-    currency = payment_intent.currency
-    course_id = payment_intent.metadata.get("course_id")
-    user_id = payment_intent.metadata.get("user_id")
-
-    user = User.objects.filter(pk=user_id).first()
-    course = Course.objects.filter(pk=course_id).first()
-
-    if course and user:
-        Payment.objects.create(
-            transaction_id=transaction_id,
-            session_id=session_id,
-            amount=amount,
-            currency=currency,
-            status="failed",
-            course=course,
-            user=user,
-        )
-    else:
-        logger.error("Failed to create payment record: Course or user not found")
-
-
-def handle_checkout_session_completed(session):
-    transaction_id = session.get("payment_intent")
-    session_id = session.get("id")
-    currency = session.get("currency").upper()
-    amount = session.get("amount_total") / 100
-    payment_status = session.get("payment_status")
-    course_id = session.metadata.get("course_id")
-    user_id = session.metadata.get("user_id")
-
-    if course_id and user_id:
-        course = Course.objects.filter(pk=course_id).first()
-        user = User.objects.filter(pk=user_id).first()
-
-        if course and user:
-            new_enrollment = Enroll.objects.create(
-                student=user,
-                course=course,
-            )
-            Payment.objects.create(
-                transaction_id=transaction_id,
-                session_id=session_id,
-                currency=currency,
-                amount=amount,
-                payment_status=payment_status,
-                enrollment=new_enrollment,
-                user=user,
-                course=course,
-            )
-        else:
-            logger.error(
-                "Failed to create enrollment or payment record: Course or user not found"
-            )
-    else:
-        logger.error("Course ID or User ID missing from session metadata")
-
-
 class CheckoutSessionInfo(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, session_id, format=None):
+        # Line items never change, Stripe is asked once per session
+        checkout = CheckoutSession.objects.filter(
+            session_id=session_id, user=request.user
+        ).first()
+        if checkout and checkout.line_items is not None:
+            return Response(data=checkout.line_items, status=status.HTTP_200_OK)
+
         try:
-            session = stripe.checkout.Session.list_line_items(session_id)
-            return Response(data=session, status=status.HTTP_200_OK)
+            session = stripe_gateway.list_line_items(session_id)
+            line_items = session.to_dict_recursive()
+            if checkout:
+                CheckoutSession.objects.filter(pk=checkout.pk).update(
+                    line_items=line_items
+                )
+            return Response(data=line_items, status=status.HTTP_200_OK)
+        except OUTAGE_ERRORS as e:
+            return gateway_unavailable(e)
         except stripe.error.StripeError as e:
             return Response(data={"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PaymentsView(ListAPIView):
+class PaymentsView(PrefetchPlanMixin, ListAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = NewestFirstPagination
 
     def get_queryset(self):
         return Payment.objects.filter(user=self.request.user)
 
 
-class PaymentDetailView(RetrieveAPIView):
+class PaymentExportView(ExportView):
+    """
+    Streams payments as CSV or NDJSON. Staff export every payment, teachers
+    the payments for the courses they own or instruct.
+    """
+
+    permission_classes = [IsTeacherOrStaff]
+    columns = PAYMENT_COLUMNS
+    filename = "payments"
+    filters = ("course", "status")
+
+    def get_queryset(self, **filters):
+        queryset = export_payments(**filters)
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(course__in=taught_courses(self.request.user))
+        return queryset
+
+
+class PaymentDetailView(PrefetchPlanMixin, RetrieveAPIView):
     serializer_class = PaymentSerializer
-    permission_classes = [IsOwnerOnly]
-    queryset = Payment.objects.all
+    permission_classes = [IsAuthenticated]
     lookup_field = "transaction_id"
 
-    def get_object(self):
-        transaction_id = self.kwargs.get("transaction_id")
-        return Payment.objects.filter(transaction_id=transaction_id).filter()
+    def get_queryset(self):
+        return Payment.objects.filter(user=self.request.user)
 
-    def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(request, *args, **kwargs)
+    def get_object(self):
+        # A failed attempt and the successful one may share the payment
+        # intent, the latest is shown
+        payment = (
+            self.filter_queryset(self.get_queryset())
+            .filter(transaction_id=self.kwargs["transaction_id"])
+            .order_by("-created_at")
+            .first()
+        )
+        if payment is None:
+            raise Http404("No payment found with provided info.")
+        return payment
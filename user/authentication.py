@@ -0,0 +1,57 @@
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .claims import CLAIMED_FIELDS, token_revocations
+from .models import ClaimsUser, CustomUser
+
+
+def user_from_claims(validated_token):
+    """
+    Build the user from the claims of a token without a query
+
+    Returns:
+        ClaimsUser: None if the token lacks the claims, or they went stale
+    """
+
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        auth_time = validated_token["auth_time"]
+        claims = {name: validated_token[name] for name in CLAIMED_FIELDS}
+    except KeyError:
+        return None
+
+    if token_revocations.is_stale(user_id, auth_time):
+        return None
+    return ClaimsUser.from_claims(user_id, claims)
+
+
+def check_token_user(validated_token):
+    """
+    Reject a token whose user was deleted or deactivated. Tokens with
+    trusted claims pass without a query.
+
+    Raises:
+        InvalidToken: if the user may no longer use the token
+    """
+
+    if user_from_claims(validated_token) is not None:
+        return
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    if not CustomUser.objects.filter(pk=user_id, is_active=True).exists():
+        raise InvalidToken(_("User not found or inactive"))
+
+
+class ClaimsJWTAuthentication(JWTCookieAuthentication):
+    """
+    JWT from the Authorization header or the auth cookie, resolved to a user
+    built from its signed claims. Tokens without the claims, or whose claims
+    went stale, load the user from the database as before.
+    """
+
+    def get_user(self, validated_token):
+        user = user_from_claims(validated_token)
+        if user is None:
+            return super().get_user(validated_token)
+        return user
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TokenRevocation
+
+# User columns carried by access tokens, see TokenClaimsSerializer
+CLAIMED_FIELDS = ("username", "role", "is_staff")
+
+
+class RevocationList:
+    """
+    When the claims of each user's tokens went stale, read from
+    TokenRevocation at most every JWT_REVOCATION_REFRESH seconds.
+
+    Revocations made by this process apply at once, those of other
+    processes once the list is read again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._loaded_at = None
+
+    def _load(self):
+        # Older revocations predate every token still accepted
+        since = timezone.now() - settings.SIMPLE_JWT["REFRESH_TOKEN_LIFETIME"]
+        return dict(
+            TokenRevocation.objects.filter(revoked_before__gte=since).values_list(
+                "user_id", "revoked_before"
+            )
+        )
+
+    def revoked_before(self, user_id):
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._loaded_at is None
+                or now - self._loaded_at >= settings.JWT_REVOCATION_REFRESH
+            ):
+                self._revoked = self._load()
+                self._loaded_at = now
+            return self._revoked.get(user_id)
+
+    def is_stale(self, user_id, auth_time) -> bool:
+        """
+        Whether the claims of a token of ``user_id`` obtained at
+        ``auth_time``, a timestamp, can no longer be trusted
+        """
+
+        revoked_before = self.revoked_before(user_id)
+        return revoked_before is not None and auth_time <= revoked_before.timestamp()
+
+    def add(self, user_id, revoked_before):
+        with self._lock:
+            self._revoked[user_id] = revoked_before
+
+    def clear(self):
+        with self._lock:
+            self._revoked = {}
+            self._loaded_at = None
+
+
+token_revocations = RevocationList()
+
+
+def revoke_claims(user_id):
+    """
+    Stop trusting the claims of the tokens issued to a user so far
+    """
+
+    now = timezone.now()
+    TokenRevocation.objects.update_or_create(
+        user_id=user_id, defaults={"revoked_before": now}
+    )
+    transaction.on_commit(lambda: token_revocations.add(user_id, now))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from user.authentication import ClaimsJWTAuthentication
+from user.models import CustomUser
+from user.serializers import TokenClaimsSerializer
+
+# Authentication classes configured before the claims fast path
+BEFORE = (JWTCookieAuthentication, JWTAuthentication, TokenAuthentication)
+AFTER = (ClaimsJWTAuthentication,)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time and queries spent authenticating a request with an "
+        "access token, with the previous and the current authentication classes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = CustomUser.objects.create_user(
+                email="benchmark@benchmark.local",
+                password="!",
+                first_name="Benchmark",
+                role="TR",
+            )
+            token = TokenClaimsSerializer.get_token(user).access_token
+            request = RequestFactory().get(
+                "/", HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+
+            for label, classes in (("before", BEFORE), ("after", AFTER)):
+                elapsed, queries = self.measure(request, classes, options["requests"])
+                self.stdout.write(
+                    f"{label}: {elapsed * 10**6:.1f} us and {queries:.2f} queries "
+                    "per request"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def measure(self, request, classes, repeat):
+        authenticators = [cls() for cls in classes]
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                user = Request(request, authenticators=authenticators).user
+                # Views read the role, e.g. IsTeacherOrReadOnly
+                user.role
+            elapsed = time.perf_counter() - start
+        return elapsed / repeat, len(queries) / repeat
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from user.models import CustomUser, UsernameCounter
+from user.usernames import username_base
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test username allocation: register thousands of users with the "
+        "same name in a throwaway test database, one after another and from "
+        "concurrent threads, and check every one got a unique username"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--first-name", default="Alex")
+        parser.add_argument("--last-name", default="Smith")
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite":
+            # Threads would share an in-memory database whose locks fail
+            # instead of waiting, a file makes concurrent writers queue up
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                tempfile.gettempdir(), "benchmark_registrations.sqlite3"
+            )
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(**options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def register(self, i, first_name, last_name):
+        return CustomUser.objects.create_user(
+            email=f"user{i}@benchmark.local",
+            # No password, hashing would dwarf the allocation
+            password=None,
+            role="ST",
+            first_name=first_name,
+            last_name=last_name,
+        )
+
+    def run(self, users, threads, first_name, last_name, **options):
+        base = username_base(first_name, last_name, "")
+        # Usernames taken before the counter existed, each costs a retry
+        legacy = [base, f"{base}3", f"{base}{users // 2}"]
+        CustomUser.objects.bulk_create(
+            CustomUser(email=f"{username}@legacy.local", username=username)
+            for username in legacy
+        )
+
+        sequential = users // 2
+        samples = []
+        start = time.perf_counter()
+        for i in range(sequential):
+            if i < 100 or i >= sequential - 100:
+                # The log keeps the last 9000 queries only
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.register(i, first_name, last_name)
+                samples.append(len(queries))
+            else:
+                self.register(i, first_name, last_name)
+        elapsed = time.perf_counter() - start
+        self.report(
+            f"{sequential} registrations in a row",
+            f"{elapsed / sequential * 1000:.3f} ms each, "
+            f"{sum(samples[:100]) / 100:.2f} queries per registration for the "
+            f"first 100 and {sum(samples[-100:]) / 100:.2f} for the last 100",
+        )
+
+        def register_concurrently(i):
+            try:
+                return self.register(i, first_name, last_name)
+            finally:
+                connection.close()
+
+        concurrent = users - sequential
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            futures = [
+                executor.submit(register_concurrently, i)
+                for i in range(sequential, users)
+            ]
+        elapsed = time.perf_counter() - start
+        errors = [future.exception() for future in futures if future.exception()]
+        self.report(
+            f"{concurrent} registrations from {threads} threads",
+            f"{elapsed / concurrent * 1000:.3f} ms each, {len(errors)} failed"
+            + (f", first error: {errors[0]!r}" if errors else ""),
+        )
+
+        registered = CustomUser.objects.filter(email__endswith="@benchmark.local")
+        usernames = list(registered.values_list("username", flat=True))
+        # Suffixes handed out but given up on after an IntegrityError
+        handed_out = UsernameCounter.objects.get(base=base).last_suffix + 1
+        self.report(
+            "Usernames",
+            f"{len(usernames)} registered, {len(set(usernames))} unique, "
+            f"{handed_out - len(usernames)} retried past a legacy username, "
+            f"longest {max(usernames, key=len)!r}",
+        )
+
+    def report(self, label, text):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f"  {text}")
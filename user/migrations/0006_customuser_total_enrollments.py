@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_alter_customuser_first_name_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='total_enrollments',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Enrollments across all owned courses'),
+        ),
+    ]
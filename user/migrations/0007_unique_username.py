@@ -0,0 +1,51 @@
+# Generated by Django 4.2.2 on 2026-10-18 09:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def deduplicate_usernames(apps, schema_editor):
+    # Races in the old probing code could hand out the same username twice,
+    # give every copy after the first a pk based suffix before adding UNIQUE
+    User = apps.get_model("user", "CustomUser")
+    duplicates = (
+        User.objects.values("username")
+        .annotate(copies=Count("pk"))
+        .filter(copies__gt=1)
+        .values_list("username", flat=True)
+    )
+    taken = set(User.objects.values_list("username", flat=True))
+    for username in list(duplicates):
+        users = User.objects.filter(username=username).order_by("pk")
+        for user in users[1:]:
+            suffix = str(user.pk)
+            candidate = f"{(username or 'user')[:16 - len(suffix)]}{suffix}"
+            while candidate in taken:
+                suffix += "0"
+                candidate = f"{(username or 'user')[:16 - len(suffix)]}{suffix}"
+            taken.add(candidate)
+            User.objects.filter(pk=user.pk).update(username=candidate)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_customuser_total_enrollments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsernameCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=16, unique=True)),
+                ('last_suffix', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(deduplicate_usernames, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='username',
+            field=models.CharField(blank=True, max_length=16, unique=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+
+def copy_user_ids(apps, schema_editor):
+    TokenRevocation = apps.get_model("user", "TokenRevocation")
+    TokenRevocation.objects.update(revoked_user_id=models.F("user_id"))
+
+
+class Migration(migrations.Migration):
+    """
+    Revocations keep a plain user id, so deleting a user no longer deletes
+    the revocation of their tokens
+    """
+
+    dependencies = [
+        ("user", "0008_token_claims"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tokenrevocation",
+            name="revoked_user_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(copy_user_ids, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="tokenrevocation",
+            name="user",
+        ),
+        migrations.RenameField(
+            model_name="tokenrevocation",
+            old_name="revoked_user_id",
+            new_name="user_id",
+        ),
+        migrations.AlterField(
+            model_name="tokenrevocation",
+            name="user_id",
+            field=models.BigIntegerField(unique=True),
+        ),
+    ]
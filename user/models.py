@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from .managers import CustomUserManager
+from .usernames import USERNAME_MAX_LENGTH, allocate_username, username_base
+
+# Attempts at a generated username before giving up on an IntegrityError
+USERNAME_ATTEMPTS = 10
 
 # Create your models here.
 
@@ -12,7 +16,7 @@ class RoleChoices(models.TextChoices):
 
 
 class CustomUser(AbstractUser):
-    username = models.CharField(blank=True, max_length=16)
+    username = models.CharField(blank=True, max_length=USERNAME_MAX_LENGTH, unique=True)
     first_name = models.CharField(max_length=64)
     last_name = models.CharField(blank=True, max_length=64)
     email = models.EmailField(_("email address"), unique=True)
@@ -23,6 +27,9 @@ class CustomUser(AbstractUser):
     image_url = models.URLField(blank=True)
     bio = models.CharField(blank=True, max_length=108)
     qualifications = models.CharField(blank=True, max_length=108)
+    total_enrollments = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Enrollments across all owned courses"
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["role", "first_name"]
@@ -34,19 +41,76 @@ class CustomUser(AbstractUser):
 
     def save(self, *args, **kwargs):
         # Check if the username is empty or not provided
-        if not self.username:
-            # Create a username using the first_name and last_name
-            if self.first_name and self.last_name:
-                username = f"{self.first_name.lower()}.{self.last_name.lower()}"
-            else:
-                username = self.email.split("@")[0]
-
-            # Check if the generated username is unique
-            i = 1
-            while CustomUser.objects.filter(username=username).exists():
-                username = f"{username}{i}"
-                i += 1
-
-            self.username = username
-
-        super().save(*args, **kwargs)
+        if self.username:
+            return super().save(*args, **kwargs)
+
+        # Create a username using the first_name and last_name
+        base = username_base(self.first_name, self.last_name, self.email)
+        for attempt in range(USERNAME_ATTEMPTS):
+            self.username = allocate_username(base)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Taken by a user created before the counter existed, or the
+                # error is about another column
+                taken = CustomUser.objects.filter(username=self.username).exists()
+                if not taken or attempt == USERNAME_ATTEMPTS - 1:
+                    self.username = ""
+                    raise
+
+
+class UsernameCounter(models.Model):
+    """
+    Last numeric suffix handed out for a username base
+    """
+
+    base = models.CharField(max_length=USERNAME_MAX_LENGTH, unique=True)
+    last_suffix = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.base} ({self.last_suffix})"
+
+
+class ClaimsUser(CustomUser):
+    """
+    User built from the claims of an access token, see user.authentication.
+    Columns the token doesn't carry are loaded together on first access.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        # is_active isn't claimed, tokens are only issued to active users
+        # and deactivation makes the claims of earlier tokens stale
+        values = {"id": user_id, "is_active": True, **claims}
+        names = [f.attname for f in cls._meta.concrete_fields if f.attname in values]
+        return cls.from_db("default", names, [values[name] for name in names])
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            # A deferred column was read, fetch the rest of the row with it
+            fields = deferred
+        return super().refresh_from_db(using, fields)
+
+
+class TokenRevocation(models.Model):
+    """
+    The claims of a user's tokens issued before ``revoked_before`` are
+    stale, such requests load the user from the database again.
+
+    Keyed by a plain user id, not a foreign key, so the revocation of a
+    deleted user outlives them.
+    """
+
+    user_id = models.BigIntegerField(unique=True)
+    revoked_before = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} before {self.revoked_before}"
+
+
+from .signals import revoke_stale_claims
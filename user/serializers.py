@@ -2,6 +2,12 @@ from dj_rest_auth.registration.serializers import RegisterSerializer
 from dj_rest_auth.serializers import UserDetailsSerializer
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from dj_rest_auth.jwt_auth import CookieTokenRefreshSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from gen.serializers import DynamicFieldsMixin
+from .authentication import check_token_user
+from .claims import CLAIMED_FIELDS
 from .models import CustomUser, RoleChoices
 
 
@@ -25,7 +31,7 @@ class CustomUserRegisterSerializer(RegisterSerializer):
         user.save()
 
 
-class CustomUserDetailsSerializer(UserDetailsSerializer):
+class CustomUserDetailsSerializer(DynamicFieldsMixin, UserDetailsSerializer):
     class Meta:
         model = CustomUser
         exclude = (
@@ -42,5 +48,33 @@ class CustomUserDetailsSerializer(UserDetailsSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data["role"] = instance.get_role_display()
+        if "role" in data:
+            data["role"] = instance.get_role_display()
+        return data
+
+
+class TokenClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Issues tokens carrying the claims read by user.authentication
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for name in CLAIMED_FIELDS:
+            token[name] = getattr(user, name)
+        # Copied into every access token refreshed from this one, tells
+        # which claims predate a change of the user
+        token["auth_time"] = token["iat"]
+        return token
+
+
+class TokenClaimsRefreshSerializer(CookieTokenRefreshSerializer):
+    """
+    Refuses to refresh the tokens of deleted or deactivated users
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        check_token_user(RefreshToken(attrs["refresh"]))
         return data
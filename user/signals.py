@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .claims import CLAIMED_FIELDS, revoke_claims
+from .models import ClaimsUser, CustomUser
+
+# Changes after which tokens issued earlier must not be trusted blindly
+WATCHED_FIELDS = CLAIMED_FIELDS + ("is_active", "password")
+
+
+@receiver(pre_save, sender=CustomUser)
+@receiver(pre_save, sender=ClaimsUser)
+def detect_claims_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._claims_changed = False
+    if raw or instance._state.adding:
+        return
+
+    deferred = instance.get_deferred_fields()
+    fields = [
+        name
+        for name in WATCHED_FIELDS
+        if name not in deferred and (update_fields is None or name in update_fields)
+    ]
+    if not fields:
+        return
+
+    stored = CustomUser.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._claims_changed = stored is not None and any(
+        stored[name] != getattr(instance, name) for name in fields
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=ClaimsUser)
+def revoke_stale_claims(sender, instance, created, raw=False, **kwargs):
+    if not raw and getattr(instance, "_claims_changed", False):
+        revoke_claims(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=ClaimsUser)
+def revoke_deleted_user(sender, instance, **kwargs):
+    # Their tokens fall back to the database lookup, which rejects them
+    revoke_claims(instance.pk)
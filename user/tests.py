@@ -1,3 +1,143 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from gen.testing import QueryCountTestCase, create_course, create_user
+
+from .authentication import ClaimsJWTAuthentication
+from .claims import token_revocations
+from .models import ClaimsUser, CustomUser, TokenRevocation
+from .serializers import TokenClaimsSerializer
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        # The revocation list outlives the rolled back test transactions
+        token_revocations.clear()
+        self.user = CustomUser.objects.create_user(
+            email="student@example.com",
+            password="password",
+            role="ST",
+            first_name="Student",
+        )
+        self.refresh = TokenClaimsSerializer.get_token(self.user)
+        self.access = str(self.refresh.access_token)
+        # Loaded once per JWT_REVOCATION_REFRESH, not per request
+        token_revocations.revoked_before(self.user.pk)
+
+    def authenticate(self, token):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return Request(request, authenticators=[ClaimsJWTAuthentication()]).user
+
+    def get(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client.get("/api/payments/transactions/")
+
+    def refresh_token(self):
+        return APIClient().post(
+            "/api/auth/token/refresh/", {"refresh": str(self.refresh)}, format="json"
+        )
+
+    def change(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.user, name, value)
+            self.user.save()
+
+    def test_claims_need_no_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.access)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.role, user.username), (
+            self.user.pk, "ST", self.user.username
+        ))
+        self.assertEqual(user, self.user)
+
+    def test_other_columns_load_together(self):
+        user = self.authenticate(self.access)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "student@example.com")
+            self.assertEqual(user.first_name, "Student")
+
+    def test_tokens_without_claims_load_the_user(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        with self.assertNumQueries(1):
+            user = self.authenticate(token)
+        self.assertNotIsInstance(user, ClaimsUser)
+
+    def test_unrelated_change_keeps_claims(self):
+        self.change(bio="Hello")
+        self.assertIsInstance(self.authenticate(self.access), ClaimsUser)
+
+    def test_revoked_claims_load_the_user(self):
+        self.change(role="TR")
+        user = self.authenticate(self.access)
+        self.assertNotIsInstance(user, ClaimsUser)
+        self.assertEqual(user.role, "TR")
+        self.assertEqual(self.get(self.access).status_code, 200)
+
+    def test_revocations_reach_other_processes(self):
+        self.change(role="TR")
+        # Another process reads the revocation from the database
+        token_revocations.clear()
+        self.assertNotIsInstance(self.authenticate(self.access), ClaimsUser)
+
+    def test_deactivated_user_is_rejected(self):
+        self.change(is_active=False)
+        self.assertEqual(self.get(self.access).status_code, 401)
+        self.assertEqual(self.refresh_token().status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        user_id = self.user.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertTrue(TokenRevocation.objects.filter(user_id=user_id).exists())
+
+        self.assertEqual(self.get(self.access).status_code, 401)
+        self.assertEqual(self.refresh_token().status_code, 401)
+        token_revocations.clear()
+        self.assertEqual(self.get(self.access).status_code, 401)
+
+    def test_refresh_keeps_claims(self):
+        response = self.refresh_token()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(self.authenticate(response.data["access"]), ClaimsUser)
+
+
+class UserQueryCountTests(QueryCountTestCase):
+    def test_user_profile(self):
+        teacher = create_user("teacher", role="TR")
+
+        def add_courses(n):
+            for _ in range(n):
+                create_course(teacher)
+
+        url = f"/api/auth/user/{teacher.username}/"
+        self.assertQueriesPerRequest(1, url, add_courses)
+
+
+class UsernameAllocationTests(TestCase):
+    def register(self, i):
+        return CustomUser.objects.create_user(
+            email=f"user{i}@example.com",
+            password=None,
+            role="ST",
+            first_name="Alex",
+            last_name="Smith",
+        )
+
+    def test_same_name_registrations_get_unique_usernames(self):
+        # Taken before the counter existed
+        for username in ("alex.smith", "alex.smith3"):
+            CustomUser.objects.create(email=f"{username}@legacy.com", username=username)
+
+        usernames = [self.register(i).username for i in range(300)]
+        self.assertEqual(len(set(usernames)), 300)
+        self.assertEqual(usernames[:3], ["alex.smith1", "alex.smith2", "alex.smith4"])
+
+        # The counter upsert and the insert in its savepoint, however many
+        # users share the name
+        with self.assertNumQueries(4):
+            self.register(300)
@@ -23,6 +23,7 @@ urlpatterns = [
         name="password_reset_confirm",
     ),
     # login and registration
+    path("token/refresh/", views.TokenRefreshView.as_view(), name="token_refresh"),
     path("", include("dj_rest_auth.urls")),
     path("registration/", include("dj_rest_auth.registration.urls")),
     # UserProfile
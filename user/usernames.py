@@ -0,0 +1,50 @@
+import re
+
+from django.apps import apps
+from django.db import connection
+
+USERNAME_MAX_LENGTH = 16
+
+
+def username_base(first_name: str, last_name: str, email: str) -> str:
+    """
+    Returns the preferred username for a user, before de-duplication
+    """
+
+    if first_name and last_name:
+        base = f"{first_name.lower()}.{last_name.lower()}"
+    else:
+        base = email.split("@")[0].lower()
+
+    base = re.sub(r"\s+", "", base)
+    return base[:USERNAME_MAX_LENGTH] or "user"
+
+
+def allocate_username(base: str) -> str:
+    """
+    Returns the next unused username for base: base, base1, base2, ...
+
+    The per-base counter is bumped with a single upsert, so concurrent
+    sign-ups with the same name get different suffixes without probing.
+
+    Args:
+        base (str): value of username_base()
+
+    Returns:
+        str: base with a numeric suffix, cut to fit USERNAME_MAX_LENGTH
+    """
+
+    table = apps.get_model("user", "UsernameCounter")._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (base, last_suffix) VALUES (%s, 0) "
+            f"ON CONFLICT (base) DO UPDATE SET last_suffix = {table}.last_suffix + 1 "
+            "RETURNING last_suffix",
+            [base],
+        )
+        suffix = cursor.fetchone()[0]
+
+    if not suffix:
+        return base
+    suffix = str(suffix)
+    return f"{base[:USERNAME_MAX_LENGTH - len(suffix)]}{suffix}"
@@ -12,11 +12,12 @@ from dj_rest_auth.serializers import (
     PasswordResetSerializer,
     PasswordResetConfirmSerializer,
 )
+from dj_rest_auth.jwt_auth import get_refresh_view
 from dj_rest_auth.views import PasswordResetConfirmView, PasswordResetView
 from django.core.mail import send_mail
 from django.conf import settings
 
-from .serializers import CustomUserDetailsSerializer
+from .serializers import CustomUserDetailsSerializer, TokenClaimsRefreshSerializer
 from gen.permissions import IsOwnerOrReadOnly
 
 User = get_user_model()
@@ -87,3 +88,7 @@ class UserProfileView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
     queryset = User.objects.all()
     lookup_field = "username"
+
+
+class TokenRefreshView(get_refresh_view()):
+    serializer_class = TokenClaimsRefreshSerializer